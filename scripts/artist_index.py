@@ -0,0 +1,267 @@
+"""
+Normalized artist table and artist -> track index.
+
+The `artists` column holds one Python-list literal per track
+(`"['A', 'B']"`), so `value_counts()` over it counts a collaboration as an
+artist of its own, and any per-artist question is a substring scan over
+every row. The index parses the column once per store version into:
+
+- a sorted, dictionary-encoded artist table (one string per distinct
+  artist);
+- a CSR index: the store row ids of artist `a` are
+  `rows[offsets[a]:offsets[a + 1]]`, ascending.
+
+Both live in `data/store/artists.arrow` as an Arrow table of `artist` and
+`tracks` (a `list<int32>` column, whose offsets and values buffers are the
+CSR arrays), memory-mapped on open. Track counts are `np.diff(offsets)`, a
+track list is a slice, and per-artist feature aggregates are one gather plus
+`np.add.reduceat` over the feature column. A refresh patches the index
+(`patch_artist_index`) instead of re-parsing the whole column.
+
+    python -m scripts.artist_index                  # build for the store and report memory
+    python -m scripts.artist_index --scale 1.2M     # index vs pandas string scans on synthetic rows
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from scripts.track_lookup import split_artists
+from scripts.track_store import STORE_DIR, TrackStore, read_manifest
+
+INDEX_NAME = "artists.arrow"
+
+
+def build_artist_index(artists):
+    """Arrow table of distinct artists (sorted) and the ascending row ids of their tracks."""
+    names, rows = split_artists(artists)
+    encoded = names.dictionary_encode()
+    by_name = pc.sort_indices(encoded.dictionary).to_numpy()
+    code = np.empty(len(by_name), dtype=np.int64)
+    code[by_name] = np.arange(len(by_name))
+    codes = code[encoded.indices.to_numpy(zero_copy_only=False)]
+
+    # Stable sort by artist keeps each artist's rows in store order.
+    rows = rows.astype(np.int32)[np.argsort(codes, kind="stable")]
+    offsets = np.zeros(len(by_name) + 1, dtype=np.int32)
+    np.cumsum(np.bincount(codes, minlength=len(by_name)), out=offsets[1:])
+    return pa.table({
+        "artist": encoded.dictionary.take(pa.array(by_name)),
+        "tracks": pa.ListArray.from_arrays(pa.array(offsets), pa.array(rows)),
+    })
+
+
+def patch_artist_index(table, removed, artists, start):
+    """
+    The index `table` after a refresh, parsing only the delta: the sorted row
+    ids `removed` are dropped and the ids after them shift down; the tracks
+    whose `artists` strings are given become rows `start`, `start + 1`, ...
+    Artists left without tracks are dropped, as a rebuild would.
+    """
+    tracks = table["tracks"].combine_chunks()
+    offsets, rows = tracks.offsets.to_numpy(), tracks.values.to_numpy().astype(np.int64)
+    codes = np.repeat(np.arange(len(offsets) - 1), np.diff(offsets))
+    # Row ids of the old store run up to `start + len(removed)`: a mask and its running count do the shift.
+    gone = np.zeros(start + len(removed), dtype=bool)
+    gone[removed] = True
+    keep = ~gone[rows]
+    rows, codes = rows[keep] - np.cumsum(gone)[rows[keep]], codes[keep]
+
+    names, added = split_artists(artists)
+    known = table["artist"].combine_chunks()
+    distinct = pc.unique(names)
+    merged = pa.concat_arrays([known, distinct.filter(pc.invert(pc.is_in(distinct, value_set=known)))])
+    by_name = pc.sort_indices(merged).to_numpy()
+    rank = np.empty(len(by_name), dtype=np.int64)
+    rank[by_name] = np.arange(len(by_name))
+    codes = np.concatenate([rank[codes], rank[pc.index_in(names, value_set=merged).to_numpy()]])
+    rows = np.concatenate([rows, added + start])
+
+    counts = np.bincount(codes, minlength=len(by_name))
+    used = counts > 0
+    codes = (np.cumsum(used) - 1)[codes]
+    # Stable sort by artist: each artist's kept rows are ascending and all precede the added ones.
+    rows = rows.astype(np.int32)[np.argsort(codes, kind="stable")]
+    offsets = np.zeros(int(used.sum()) + 1, dtype=np.int32)
+    np.cumsum(counts[used], out=offsets[1:])
+    return pa.table({
+        "artist": merged.take(pa.array(by_name[used])),
+        "tracks": pa.ListArray.from_arrays(pa.array(offsets), pa.array(rows)),
+    })
+
+
+def build(store_dir=STORE_DIR):
+    """Write the artist index of the store and return it."""
+    version = read_manifest(store_dir)["version"]
+    return save(build_artist_index(TrackStore(store_dir).table["artists"]), version, store_dir)
+
+
+def patch(store_dir, version, removed, artists, start):
+    """
+    Patch the saved index of store version `version` after a refresh (see
+    `patch_artist_index`) and save it for the store's new version; rebuilt if
+    the saved one is missing or of another version.
+    """
+    try:
+        table = _read(store_dir)
+    except FileNotFoundError:
+        table = None
+    if table is None or (table.schema.metadata or {}).get(b"version") != version.encode():
+        return build(store_dir)
+    table = patch_artist_index(table, removed, artists, start)
+    return save(table, read_manifest(store_dir)["version"], store_dir)
+
+
+def _read(store_dir):
+    return pa.ipc.open_file(pa.memory_map(os.path.join(store_dir, INDEX_NAME), "r")).read_all()
+
+
+def save(table, version, store_dir=STORE_DIR):
+    """Write `table` as the artist index of store version `version` and return it."""
+    table = table.replace_schema_metadata({"version": version})
+    path = os.path.join(store_dir, INDEX_NAME)
+    # Write-then-rename: sessions may have the previous index mapped.
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+    return ArtistIndex(table)
+
+
+def load_artist_index(store_dir=STORE_DIR):
+    """The artist index of the current store, rebuilt if missing or stale."""
+    version = read_manifest(store_dir)["version"]
+    try:
+        table = _read(store_dir)
+        if table.schema.metadata and table.schema.metadata.get(b"version") == version.encode():
+            return ArtistIndex(table)
+    except FileNotFoundError:
+        pass
+    return build(store_dir)
+
+
+class ArtistIndex:
+    """Artist names, CSR offsets and row ids over an artist index table (zero-copy when memory-mapped)."""
+
+    def __init__(self, table):
+        tracks = table["tracks"].combine_chunks()
+        self.names = table["artist"].combine_chunks()
+        self.offsets = tracks.offsets.to_numpy()
+        self.rows = tracks.values.to_numpy()
+        self._sorted = self.names.to_numpy(zero_copy_only=False)
+
+    def __len__(self):
+        return len(self.names)
+
+    @property
+    def nbytes(self):
+        return self.names.nbytes + self.offsets.nbytes + self.rows.nbytes
+
+    def code(self, artist):
+        """Position of `artist` in the artist table; KeyError if unknown."""
+        i = np.searchsorted(self._sorted, artist)
+        if i == len(self._sorted) or self._sorted[i] != artist:
+            raise KeyError(artist)
+        return int(i)
+
+    def counts(self):
+        """Number of tracks per artist, in artist-table order."""
+        return np.diff(self.offsets)
+
+    def top(self, k=10):
+        """(artists, track counts) of the `k` artists with most tracks, ties broken by name."""
+        counts = self.counts()
+        order = np.lexsort((np.arange(len(counts)), -counts))[:k]
+        return self._sorted[order].tolist(), counts[order].tolist()
+
+    def tracks(self, artist):
+        """Store row ids of the tracks of `artist`, ascending."""
+        a = self.code(artist)
+        return self.rows[self.offsets[a]:self.offsets[a + 1]]
+
+    def aggregate(self, values, how="mean"):
+        """
+        Per-artist sum or mean of a per-row array (e.g. a feature column),
+        in artist-table order.
+        """
+        sums = np.add.reduceat(np.asarray(values, dtype=np.float64)[self.rows], self.offsets[:-1])
+        return sums if how == "sum" else sums / self.counts()
+
+    def feature_means(self, store, features):
+        """DataFrame of track count and mean `features` per artist, indexed by artist."""
+        import pandas as pd
+
+        frame = pd.DataFrame({f: self.aggregate(store.table[f].to_numpy()) for f in features},
+                             index=pd.Index(self._sorted, name="artist"))
+        frame.insert(0, "tracks", self.counts())
+        return frame
+
+
+def memory_report(artists, index):
+    """Bytes of the raw `artists` column as pandas objects and as Arrow strings vs the index."""
+    objects = artists.to_pandas().astype(object)
+    return {
+        "object column": int(objects.memory_usage(deep=True)),
+        "arrow column": artists.nbytes,
+        "index": index.nbytes,
+    }
+
+
+def benchmark(table):
+    start = time.perf_counter()
+    index = ArtistIndex(build_artist_index(table["artists"]))
+    print(f"{table.num_rows:,} tracks, {len(index):,} artists: index built in {time.perf_counter() - start:.2f}s")
+
+    df = table.select(["artists", "energy"]).to_pandas()
+    df["artists"] = df["artists"].astype(object)
+    artist = index.top(1)[0][0]
+    quoted = f"'{artist}'"
+
+    def report(label, fn, repeat=5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        print(f"  {label:46s} {(time.perf_counter() - start) / repeat * 1000:9.3f} ms")
+
+    report("pandas: artists.value_counts() top 10", lambda: df["artists"].value_counts().nlargest(10))
+    report("index: top 10 artists", lambda: index.top(10), repeat=100)
+    report("pandas: tracks of one artist (substring scan)",
+           lambda: df.index[df["artists"].str.contains(quoted, regex=False)])
+    report("index: tracks of one artist", lambda: index.tracks(artist), repeat=1000)
+    energy = table["energy"].to_numpy()
+    report("pandas: mean energy per artist (parse + explode)", lambda: df.assign(
+        artist=df["artists"].str[2:-2].str.split(r"['\"], ['\"]", regex=True)).explode("artist")
+        .groupby("artist")["energy"].mean(), repeat=1)
+    report("index: mean energy per artist", lambda: index.aggregate(energy))
+
+    raw_top = df["artists"].value_counts().nlargest(10)
+    names, counts = index.top(10)
+    print(f"Top artist: {names[0]} on {counts[0]:,} tracks "
+          f"(value_counts on the raw strings: {raw_top.get(f'[{quoted}]', 0):,})")
+    memory = memory_report(table["artists"], index)
+    print(f"Memory: object column {memory['object column'] / 2**20:.1f} MB, "
+          f"Arrow strings {memory['arrow column'] / 2**20:.1f} MB, index {memory['index'] / 2**20:.1f} MB "
+          f"({memory['object column'] / memory['index']:.0f}x smaller than the object column)")
+
+
+if __name__ == "__main__":
+    from scripts.synthetic_tracks import SCALE_FACTORS
+
+    parser = argparse.ArgumentParser(description="Build the artist table and artist -> track index.")
+    parser.add_argument("--store", default=STORE_DIR, help="store directory")
+    parser.add_argument("--scale", choices=list(SCALE_FACTORS), help="benchmark on synthetic rows instead")
+    args = parser.parse_args()
+
+    if args.scale:
+        from scripts.synthetic_tracks import synthetic_tracks
+
+        benchmark(synthetic_tracks(SCALE_FACTORS[args.scale], with_derived=False))
+    else:
+        start = time.perf_counter()
+        build(args.store)
+        print(f"Artist index written ({time.perf_counter() - start:.2f}s)")
+        benchmark(TrackStore(args.store).table)
@@ -0,0 +1,148 @@
+"""
+Batch scoring of the whole catalogue with the promotion model.
+
+Instead of calling `predict_proba` on one reshaped row per page rerun, every
+track in the store is scored once: features are read column-wise from the
+memory-mapped store in large chunks, stacked into a float32 matrix (the
+precision XGBoost predicts in anyway) and passed to `Booster.inplace_predict`,
+which skips DMatrix construction and spreads each chunk across all cores.
+The probabilities land in the `promotion_scores` sidecar, keyed by track id,
+so pages only do lookups and top-N queries.
+
+    python -m scripts.batch_scoring                        # score the store
+    python -m scripts.batch_scoring --benchmark            # rows/s per strategy
+    python -m scripts.batch_scoring --benchmark --scale 1.2M
+"""
+
+import argparse
+import json
+import os
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from scripts.memory_usage import PeakMemory
+from scripts.track_store import MODEL_FEATURES, PROJECT_ROOT, STORE_DIR, file_sha256, open_store, write_sidecar
+
+# Native artifact from `python -m scripts.train_promotion`; the notebook's pickle is the fallback.
+MODEL_PATH = os.path.join(PROJECT_ROOT, "models", "promotion_model.ubj")
+LEGACY_MODEL_PATH = os.path.join(PROJECT_ROOT, "models", "xgb_promotion_model.pkl")
+SCORE_SIDECAR = "promotion_scores"
+SCORE_COLUMN = "promotion_score"
+CHUNK_ROWS = 262_144
+
+
+def default_model_path():
+    return MODEL_PATH if os.path.exists(MODEL_PATH) else LEGACY_MODEL_PATH
+
+
+def load_model(path=None, n_jobs=None):
+    """The trained XGBClassifier, with its booster set to predict on `n_jobs` threads (all cores by default)."""
+    path = path or default_model_path()
+    if path.endswith(".pkl"):
+        import joblib
+
+        model = joblib.load(path)
+    else:
+        from xgboost import XGBClassifier
+
+        model = XGBClassifier()
+        model.load_model(path)
+    model.get_booster().set_param({"nthread": n_jobs or os.cpu_count()})
+    return model
+
+
+def model_info(model):
+    """(metrics, training) dicts stored by `scripts.train_promotion`; (None, None) for the notebook's pickle."""
+    booster = model.get_booster() if hasattr(model, "get_booster") else model
+    metrics, training = booster.attr("metrics"), booster.attr("training")
+    return (json.loads(metrics) if metrics else None), (json.loads(training) if training else None)
+
+
+def feature_matrix(table):
+    """Stack MODEL_FEATURES of an Arrow table into a C-contiguous float32 matrix."""
+    matrix = np.empty((table.num_rows, len(MODEL_FEATURES)), dtype=np.float32)
+    for i, feature in enumerate(MODEL_FEATURES):
+        matrix[:, i] = table.column(feature).to_numpy()
+    return matrix
+
+
+def score_table(booster, table, chunk_rows=CHUNK_ROWS):
+    """Promotion probability for every row of `table`, as float32, scored `chunk_rows` at a time."""
+    scores = np.empty(table.num_rows, dtype=np.float32)
+    for start in range(0, table.num_rows, chunk_rows):
+        chunk = feature_matrix(table.slice(start, chunk_rows))
+        scores[start:start + len(chunk)] = booster.inplace_predict(chunk)
+    return scores
+
+
+def score_store(store_dir=STORE_DIR, model_path=None, chunk_rows=CHUNK_ROWS):
+    """Score every track in the store and write the `promotion_scores` sidecar; returns its metadata."""
+    model_path = model_path or default_model_path()
+    table = open_store(["id"] + MODEL_FEATURES, store_dir=store_dir)
+    booster = load_model(model_path).get_booster()
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        scores = score_table(booster, table, chunk_rows)
+        elapsed = time.perf_counter() - start
+    sidecar = pa.table({"id": table["id"], SCORE_COLUMN: scores})
+    return write_sidecar(SCORE_SIDECAR, sidecar, store_dir, meta={
+        "model": os.path.relpath(model_path, PROJECT_ROOT),
+        "model_sha256": file_sha256(model_path),
+        "scoring_s": round(elapsed, 3),
+        "rows_per_s": round(table.num_rows / elapsed),
+        "peak_mem_mb": round(memory.peak_delta_mb, 1),
+    })
+
+
+def _rate(rows, seconds):
+    return f"{rows / seconds:>12,.0f} rows/s  ({seconds * 1000:9.1f} ms for {rows:,} rows)"
+
+
+def benchmark(table, model_path=None, single_rows=500):
+    """Print rows/s of per-row predict_proba (the page's old path) vs chunked inplace_predict."""
+    model = load_model(model_path)
+    booster = model.get_booster()
+    sample = table.slice(0, single_rows).select(MODEL_FEATURES).to_pandas()
+
+    start = time.perf_counter()
+    single = [model.predict_proba(sample.iloc[[i]].values)[0, 1] for i in range(len(sample))]
+    print(f"predict_proba, 1 row/call      : {_rate(len(sample), time.perf_counter() - start)}")
+
+    start = time.perf_counter()
+    frame = table.select(MODEL_FEATURES).to_pandas()
+    full = model.predict_proba(frame)[:, 1]
+    print(f"predict_proba, whole frame     : {_rate(table.num_rows, time.perf_counter() - start)}")
+    del frame
+
+    for chunk_rows in (16_384, 65_536, CHUNK_ROWS, 1_048_576):
+        start = time.perf_counter()
+        scores = score_table(booster, table, chunk_rows)
+        print(f"inplace_predict, {chunk_rows:>9,} rows : {_rate(table.num_rows, time.perf_counter() - start)}")
+
+    np.testing.assert_allclose(scores, full, rtol=1e-5, atol=1e-6)
+    np.testing.assert_allclose(scores[:len(single)], single, rtol=1e-5, atol=1e-6)
+    print(f"{os.cpu_count()} cores; all strategies agree")
+
+
+if __name__ == "__main__":
+    from scripts.synthetic_tracks import SCALE_FACTORS, synthetic_tracks
+
+    parser = argparse.ArgumentParser(description="Score every track with the promotion model.")
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--model", help=f"model file (default: {os.path.relpath(MODEL_PATH, PROJECT_ROOT)} if trained, "
+                        f"else {os.path.relpath(LEGACY_MODEL_PATH, PROJECT_ROOT)})")
+    parser.add_argument("--chunk-rows", type=int, default=CHUNK_ROWS)
+    parser.add_argument("--benchmark", action="store_true", help="compare scoring strategies instead of writing")
+    parser.add_argument("--scale", choices=SCALE_FACTORS, help="benchmark on a synthetic catalogue")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        table = (synthetic_tracks(SCALE_FACTORS[args.scale], with_derived=False) if args.scale
+                 else open_store(MODEL_FEATURES, store_dir=args.store))
+        benchmark(table, args.model)
+    else:
+        info = score_store(args.store, args.model, args.chunk_rows)
+        print(f"Scored {info['rows']:,} tracks in {info['scoring_s']:.2f}s ({info['rows_per_s']:,} rows/s, "
+              f"peak +{info['peak_mem_mb']} MB) -> sidecars/{SCORE_SIDECAR}")
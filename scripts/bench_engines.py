@@ -0,0 +1,267 @@
+"""
+Engine adapters and workloads for the benchmark harness.
+
+Every engine loads the same Arrow table as `spotify_tracks` and runs named
+workloads:
+
+- the SELECT statements of `scripts/query_optimization/*.sql` (SQL engines
+  also run each file's CREATE INDEX / TEMP TABLE setup first; dataframe
+  engines have hand-written equivalents of the raw queries), and
+- the Global Dashboard's aggregations (yearly means, top artists/albums,
+  hero metrics, histogram bins) plus the Track Explorer filter.
+
+PostgreSQL is only used when a DSN is given (`--pg-dsn` or `SIL_PG_DSN`);
+its tables live in a throwaway schema that is dropped on close.
+"""
+
+import glob
+import io
+import math
+import os
+import re
+import sqlite3
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+SQL_DIR = os.path.join(os.path.dirname(__file__), "query_optimization")
+TABLE = "spotify_tracks"
+PG_SCHEMA = "sil_bench"
+
+
+# --- SQL workloads
+def split_statements(sql):
+    """Split a SQL script into statements, dropping `--` comments."""
+    sql = re.sub(r"--[^\n]*", "", sql)
+    return [s.strip() for s in sql.split(";") if s.strip()]
+
+
+def sql_file_workloads(sql_dir=SQL_DIR):
+    """Yield (file_stem, setup_statements, [(workload_name, select)]) per SQL file, in file order."""
+    for path in sorted(glob.glob(os.path.join(sql_dir, "*.sql"))):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(path) as f:
+            statements = split_statements(f.read())
+        setup = [s for s in statements if not s.upper().startswith("SELECT")]
+        selects = [s for s in statements if s.upper().startswith("SELECT")]
+        yield stem, setup, [(f"{stem}#{i}", s) for i, s in enumerate(selects, 1)]
+
+
+DASHBOARD_SQL = {
+    "dashboard:yearly_means": f"SELECT year, AVG(tempo), AVG(valence), AVG(energy) FROM {TABLE} GROUP BY year ORDER BY year",
+    "dashboard:top_artists": f"SELECT artists, COUNT(*) AS n FROM {TABLE} GROUP BY artists ORDER BY n DESC LIMIT 10",
+    "dashboard:top_albums": f"SELECT album, COUNT(*) AS n FROM {TABLE} GROUP BY album ORDER BY n DESC LIMIT 10",
+    "dashboard:hero_metrics": f"SELECT COUNT(*), AVG(CAST(explicit AS INTEGER)), AVG(duration_min) FROM {TABLE}",
+    "dashboard:histogram": (
+        f"SELECT CAST(danceability * 30 AS INTEGER) AS bin, COUNT(*) FROM {TABLE} GROUP BY bin ORDER BY bin"
+    ),
+    "explorer:filter": (
+        f"SELECT COUNT(*) FROM {TABLE} WHERE year BETWEEN 2010 AND 2020 AND danceability >= 0.5 "
+        "AND energy >= 0.5 AND tempo BETWEEN 80 AND 180"
+    ),
+}
+
+
+# --- Dataframe workloads (same results as the raw SQL / dashboard SQL above)
+def _pandas_workloads():
+    def energetic_explicit(df):
+        sub = df[df["explicit"] & (df["energy"] > 0.85) & (df["year"] >= 2020)]
+        return sub.nlargest(20, "energy")[["name", "artists", "energy", "valence", "year"]]
+
+    def dance_tempo(df):
+        sub = df[(df["danceability"] > 0.8) & (df["tempo"] > 120)]
+        return sub.nlargest(30, "tempo")[["name", "artists", "danceability", "tempo"]]
+
+    def count_per_year(df):
+        return df.groupby("year").size()
+
+    def valence_by_loudness(df):
+        group = (df["loudness"] // 5) * 5
+        return df.groupby(group)["valence"].agg(["mean", "count"])
+
+    return {
+        "01_raw_queries#1": energetic_explicit,
+        "01_raw_queries#2": dance_tempo,
+        "01_raw_queries#3": count_per_year,
+        "01_raw_queries#4": valence_by_loudness,
+        "dashboard:yearly_means": lambda df: df.groupby("year")[["tempo", "valence", "energy"]].mean(),
+        "dashboard:top_artists": lambda df: df["artists"].value_counts().nlargest(10),
+        "dashboard:top_albums": lambda df: df["album"].value_counts().nlargest(10),
+        "dashboard:hero_metrics": lambda df: (len(df), df["explicit"].mean(), df["duration_min"].mean()),
+        "dashboard:histogram": lambda df: (df["danceability"] * 30).astype("int64").value_counts().sort_index(),
+        "explorer:filter": lambda df: int((
+            df["year"].between(2010, 2020) & (df["danceability"] >= 0.5)
+            & (df["energy"] >= 0.5) & df["tempo"].between(80, 180)
+        ).sum()),
+    }
+
+
+def _polars_workloads():
+    import polars as pl
+
+    c = pl.col
+    return {
+        "01_raw_queries#1": lambda df: df.filter(c("explicit") & (c("energy") > 0.85) & (c("year") >= 2020))
+        .sort("energy", descending=True).head(20).select("name", "artists", "energy", "valence", "year"),
+        "01_raw_queries#2": lambda df: df.filter((c("danceability") > 0.8) & (c("tempo") > 120))
+        .sort("tempo", descending=True).head(30).select("name", "artists", "danceability", "tempo"),
+        "01_raw_queries#3": lambda df: df.group_by("year").len().sort("year"),
+        "01_raw_queries#4": lambda df: df.group_by(((c("loudness") / 5).floor() * 5).alias("loudness_group"))
+        .agg(c("valence").mean(), pl.len()).sort("loudness_group"),
+        "dashboard:yearly_means": lambda df: df.group_by("year").agg(c("tempo", "valence", "energy").mean()).sort("year"),
+        "dashboard:top_artists": lambda df: df["artists"].value_counts(sort=True).head(10),
+        "dashboard:top_albums": lambda df: df["album"].value_counts(sort=True).head(10),
+        "dashboard:hero_metrics": lambda df: df.select(pl.len(), c("explicit").mean(), c("duration_min").mean()),
+        "dashboard:histogram": lambda df: df.group_by((c("danceability") * 30).cast(pl.Int64).alias("bin"))
+        .len().sort("bin"),
+        "explorer:filter": lambda df: df.filter(
+            c("year").is_between(2010, 2020) & (c("danceability") >= 0.5)
+            & (c("energy") >= 0.5) & c("tempo").is_between(80, 180)
+        ).height,
+    }
+
+
+# --- Engines
+class DataFrameEngine:
+    sql = False
+
+    def __init__(self, name, convert, workloads):
+        self.name = name
+        self._convert = convert
+        self.workloads = workloads
+        self.frame = None
+
+    def load(self, table):
+        self.frame = self._convert(table)
+
+    def run(self, workload):
+        return self.workloads[workload](self.frame)
+
+    def close(self):
+        self.frame = None
+
+
+class SQLEngine:
+    sql = True
+
+    def __init__(self, name):
+        self.name = name
+        self.con = None
+
+    def execute(self, statement):
+        cur = self.con.cursor()
+        cur.execute(statement)
+        return cur
+
+    def setup(self, statements):
+        for statement in statements:
+            self.execute(statement)
+
+    def query(self, statement):
+        return self.execute(statement).fetchall()
+
+    def close(self):
+        if self.con is not None:
+            self.con.close()
+            self.con = None
+
+
+class DuckDBEngine(SQLEngine):
+    def __init__(self):
+        super().__init__("duckdb")
+
+    def load(self, table):
+        import duckdb
+
+        self.con = duckdb.connect()
+        self.con.register("source_table", table)
+        self.con.execute(f"CREATE TABLE {TABLE} AS SELECT * FROM source_table")
+        self.con.unregister("source_table")
+
+    def execute(self, statement):
+        return self.con.execute(statement)
+
+
+class SQLiteEngine(SQLEngine):
+    def __init__(self):
+        super().__init__("sqlite")
+
+    def load(self, table):
+        self.con = sqlite3.connect(":memory:", check_same_thread=False)
+        try:
+            self.con.execute("SELECT FLOOR(1.5)")
+        except sqlite3.OperationalError:
+            # Math functions are optional before SQLite 3.35.
+            self.con.create_function("FLOOR", 1, math.floor, deterministic=True)
+        self.con.execute(create_table_sql(table.schema))
+        placeholders = ", ".join("?" * table.num_columns)
+        table = table.set_column(
+            table.schema.get_field_index("release_date"), "release_date", table["release_date"].cast(pa.string())
+        )
+        for batch in table.to_batches(max_chunksize=100_000):
+            columns = [column.to_pylist() for column in batch.columns]
+            self.con.executemany(f"INSERT INTO {TABLE} VALUES ({placeholders})", zip(*columns))
+        self.con.commit()
+
+
+class PostgresEngine(SQLEngine):
+    def __init__(self, dsn):
+        super().__init__("postgres")
+        self.dsn = dsn
+
+    def load(self, table):
+        import psycopg2
+
+        self.con = psycopg2.connect(self.dsn)
+        self.con.autocommit = True
+        self.execute(f"DROP SCHEMA IF EXISTS {PG_SCHEMA} CASCADE")
+        self.execute(f"CREATE SCHEMA {PG_SCHEMA}")
+        self.execute(f"SET search_path TO {PG_SCHEMA}")
+        self.execute(create_table_sql(table.schema, postgres=True))
+        cur = self.con.cursor()
+        for batch in table.to_batches(max_chunksize=200_000):
+            buffer = io.BytesIO()
+            pacsv.write_csv(batch, buffer, pacsv.WriteOptions(include_header=False))
+            buffer.seek(0)
+            cur.copy_expert(f"COPY {TABLE} FROM STDIN WITH (FORMAT csv)", buffer)
+        self.execute(f"ANALYZE {TABLE}")
+
+    def close(self):
+        if self.con is not None:
+            self.execute(f"DROP SCHEMA IF EXISTS {PG_SCHEMA} CASCADE")
+        super().close()
+
+
+_SQL_TYPES = {
+    pa.string(): ("TEXT", "TEXT"),
+    pa.bool_(): ("INTEGER", "BOOLEAN"),
+    pa.float64(): ("REAL", "DOUBLE PRECISION"),
+    pa.float32(): ("REAL", "REAL"),
+    pa.int8(): ("INTEGER", "SMALLINT"),
+    pa.int16(): ("INTEGER", "SMALLINT"),
+    pa.date32(): ("TEXT", "DATE"),
+}
+
+
+def create_table_sql(schema, postgres=False):
+    columns = ", ".join(f"{field.name} {_SQL_TYPES[field.type][postgres]}" for field in schema)
+    return f"CREATE TABLE {TABLE} ({columns})"
+
+
+def available_engines(pg_dsn=None):
+    """Engine factories keyed by name; PostgreSQL only when a DSN is configured."""
+    engines = {
+        "pandas": lambda: DataFrameEngine("pandas", lambda t: t.to_pandas(), _pandas_workloads()),
+        "duckdb": DuckDBEngine,
+        "sqlite": SQLiteEngine,
+    }
+    try:
+        import polars as pl
+
+        engines["polars"] = lambda: DataFrameEngine("polars", pl.from_arrow, _polars_workloads())
+    except ImportError:
+        pass
+    pg_dsn = pg_dsn or os.environ.get("SIL_PG_DSN")
+    if pg_dsn:
+        engines["postgres"] = lambda: PostgresEngine(pg_dsn)
+    return engines
@@ -0,0 +1,79 @@
+import argparse
+import time
+
+import numpy as np
+
+from scripts.synthetic_tracks import SCALE_FACTORS, synthetic_tracks
+from scripts.track_filter import FILTER_COLUMNS, TrackFilterIndex
+from scripts.track_store import STORE_DIR, TrackStore
+
+# Micro-benchmark: Track Explorer slider drags answered by TrackFilterIndex vs
+# the page's original four pandas boolean masks.
+#   python -m scripts.bench_track_filter              # current store
+#   python -m scripts.bench_track_filter --scale 1.2M # synthetic catalogue
+
+
+def random_drags(rng, n):
+    """Slider positions as a user would produce them (same steps as the page)."""
+    for _ in range(n):
+        y0 = int(rng.integers(1950, 2020))
+        t0 = int(rng.integers(40, 160))
+        yield {
+            "year": (y0, int(rng.integers(y0, 2021))),
+            "danceability": (round(float(rng.integers(0, 21)) * 0.05, 2), None),
+            "energy": (round(float(rng.integers(0, 21)) * 0.05, 2), None),
+            "tempo": (t0, int(rng.integers(t0, 250))),
+        }
+
+
+def pandas_masks(df, q, page_size):
+    filtered = df[
+        (df["year"].between(*q["year"])) &
+        (df["danceability"] >= q["danceability"][0]) &
+        (df["energy"] >= q["energy"][0]) &
+        (df["tempo"].between(*q["tempo"]))
+    ]
+    return len(filtered), filtered.index[:page_size]
+
+
+def percentiles(samples):
+    ms = np.array(samples) * 1000
+    return f"p50 {np.percentile(ms, 50):6.2f} ms  p95 {np.percentile(ms, 95):6.2f} ms  max {ms.max():6.2f} ms"
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--scale", choices=SCALE_FACTORS, help="use a synthetic catalogue instead of the store")
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--page-size", type=int, default=100)
+    args = parser.parse_args()
+
+    if args.scale:
+        table = synthetic_tracks(SCALE_FACTORS[args.scale]).select(FILTER_COLUMNS)
+        # Same physical layout as the real store: rows grouped by year.
+        df = table.take(np.argsort(table["year"].to_numpy(), kind="stable")).to_pandas()
+    else:
+        df = TrackStore(args.store).frame(FILTER_COLUMNS)
+    print(f"{len(df):,} rows")
+
+    start = time.perf_counter()
+    index = TrackFilterIndex.from_frame(df)
+    print(f"index build: {(time.perf_counter() - start) * 1000:.0f} ms")
+
+    queries = list(random_drags(np.random.default_rng(27), args.queries))
+    engine, baseline, plans = [], [], {}
+    for q in queries:
+        start = time.perf_counter()
+        result = index.query(q, limit=args.page_size)
+        engine.append(time.perf_counter() - start)
+        plans[result.plan.split(":")[0]] = plans.get(result.plan.split(":")[0], 0) + 1
+
+        start = time.perf_counter()
+        count, rows = pandas_masks(df, q, args.page_size)
+        baseline.append(time.perf_counter() - start)
+        assert count == result.count and np.array_equal(rows, result.rows), q
+
+    print(f"pandas masks : {percentiles(baseline)}")
+    print(f"filter index : {percentiles(engine)}")
+    print(f"speed-up (p50): {np.median(baseline) / np.median(engine):.1f}x   plans used: {plans}")
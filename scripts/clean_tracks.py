@@ -0,0 +1,170 @@
+"""
+Streaming cleaning pipeline: raw `tracks_features.csv` -> typed track store.
+
+Reproduces the cleaning steps of `notebooks/01_eda_tracks.ipynb` without
+loading the raw CSV at once:
+
+- drop rows with a missing track name or album,
+- drop rows with `year == 0` or `tempo <= 0`,
+- derive `duration_min` from `duration_ms`,
+- normalise `release_date` ("2001" -> 2001-01-01, "2001-05" -> 2001-05-01,
+  unparseable -> null) with vectorised Arrow kernels instead of a per-row
+  regex `.apply`,
+- keep the store columns, typed (int16 year, date32 release_date).
+
+The CSV is parsed block by block and every cleaned block is appended to the
+per-year store parts, so peak memory depends on `--block-mb`, not on the
+input size.
+
+    python -m scripts.clean_tracks                         # data/tracks_features.csv -> data/store/
+    python -m scripts.clean_tracks --cleaned-csv data/spotify_tracks_cleaned.csv
+"""
+
+import argparse
+import os
+import time
+
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+
+from scripts.memory_usage import PeakMemory
+from scripts.track_store import AUDIO_FEATURES, BASE_SCHEMA, DATA_DIR, STORE_DIR, StoreBuilder
+
+RAW_CSV = os.path.join(DATA_DIR, "tracks_features.csv")
+BLOCK_MB = 16
+
+RAW_TYPES = {
+    "id": pa.string(),
+    "name": pa.string(),
+    "album": pa.string(),
+    "artists": pa.string(),
+    "explicit": pa.bool_(),
+    **{feature: pa.float64() for feature in AUDIO_FEATURES},
+    "duration_ms": pa.float64(),
+    "year": pa.int32(),
+    "release_date": pa.string(),
+}
+# Same markers pandas.read_csv treats as missing, so the filters match the notebook.
+NA_VALUES = ["", "#N/A", "#N/A N/A", "#NA", "-1.#IND", "-1.#QNAN", "-NaN", "-nan", "1.#IND", "1.#QNAN",
+             "<NA>", "N/A", "NA", "NULL", "NaN", "None", "n/a", "nan", "null"]
+
+
+def read_raw_csv(path, block_mb=BLOCK_MB):
+    """
+    Yield the raw CSV as Arrow tables of roughly `block_mb` MB of text each, limited to RAW_TYPES columns.
+
+    Blocks are cut at record boundaries and parsed independently, so only one
+    block of text is held at a time. (Arrow's streaming CSV reader buffers
+    ahead of the consumer, and its footprint grows with the file.)
+    """
+    convert_options = pacsv.ConvertOptions(
+        column_types=RAW_TYPES,
+        include_columns=list(RAW_TYPES),
+        null_values=NA_VALUES,
+        strings_can_be_null=True,
+    )
+    with open(path, "rb") as f:
+        header = f.readline()
+        while True:
+            block = f.read(block_mb << 20)
+            if not block:
+                return
+            block += f.readline()
+            # An odd quote count means the cut fell inside a quoted field spanning lines.
+            quotes = block.count(b'"')
+            while quotes % 2:
+                line = f.readline()
+                if not line:
+                    break
+                block += line
+                quotes += line.count(b'"')
+            yield pacsv.read_csv(pa.py_buffer(header + block), convert_options=convert_options)
+
+
+def normalize_release_date(dates):
+    """Parse "YYYY", "YYYY-MM" and "YYYY-MM-DD" strings to date32; anything else becomes null."""
+    length = pc.utf8_length(dates)
+    padded = pc.case_when(
+        pc.make_struct(pc.equal(length, 4), pc.equal(length, 7)),
+        pc.binary_join_element_wise(dates, "-01-01", ""),
+        pc.binary_join_element_wise(dates, "-01", ""),
+        dates,
+    )
+    parsed = pc.strptime(padded, format="%Y-%m-%d", unit="s", error_is_null=True)
+    return parsed.cast(pa.date32())
+
+
+def clean_batch(batch):
+    """Apply the notebook's filters and derivations to one raw block; returns a table with BASE_SCHEMA."""
+    keep = pc.and_(
+        pc.and_(pc.is_valid(batch["name"]), pc.is_valid(batch["album"])),
+        pc.and_(pc.not_equal(batch["year"], 0), pc.greater(batch["tempo"], 0)),
+    )
+    batch = batch.filter(pc.fill_null(keep, False))
+    columns = {name: batch[name] for name in BASE_SCHEMA.names if name in RAW_TYPES}
+    columns["duration_min"] = pc.divide(batch["duration_ms"], 60000.0)
+    columns["year"] = batch["year"].cast(pa.int16())
+    columns["release_date"] = normalize_release_date(batch["release_date"])
+    return pa.table([columns[name] for name in BASE_SCHEMA.names], schema=BASE_SCHEMA)
+
+
+def run(raw_csv=RAW_CSV, store_dir=STORE_DIR, cleaned_csv=None, block_mb=BLOCK_MB):
+    """Clean `raw_csv` into a new store; returns (manifest, per-stage stats)."""
+    seconds = {"read": 0.0, "clean": 0.0, "write": 0.0}
+    rows_in = 0
+    csv_writer = pacsv.CSVWriter(cleaned_csv, BASE_SCHEMA) if cleaned_csv else None
+    with PeakMemory() as memory:
+        with StoreBuilder(store_dir, raw_csv) as builder:
+            blocks = read_raw_csv(raw_csv, block_mb)
+            while True:
+                start = time.perf_counter()
+                batch = next(blocks, None)
+                if batch is None:
+                    break
+                seconds["read"] += time.perf_counter() - start
+                rows_in += batch.num_rows
+
+                start = time.perf_counter()
+                table = clean_batch(batch)
+                seconds["clean"] += time.perf_counter() - start
+
+                start = time.perf_counter()
+                builder.write(table)
+                if csv_writer is not None:
+                    csv_writer.write_table(table)
+                seconds["write"] += time.perf_counter() - start
+        if csv_writer is not None:
+            csv_writer.close()
+
+    rows_out = builder.manifest["rows"]
+    # Read and clean see every input row; write only the rows that survive the filters.
+    stage_rows = {"read": rows_in, "clean": rows_in, "write": rows_out}
+    stats = {
+        "rows_in": rows_in,
+        "rows_out": rows_out,
+        "stages": {
+            stage: {"seconds": round(elapsed, 3), "rows_per_s": round(stage_rows[stage] / elapsed) if elapsed else None}
+            for stage, elapsed in seconds.items()
+        },
+        "peak_mem_mb": round(memory.peak_delta_mb, 1),
+    }
+    return builder.manifest, stats
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Clean the raw tracks CSV into the typed track store.")
+    parser.add_argument("--source", default=RAW_CSV, help="raw tracks_features.csv")
+    parser.add_argument("--store", default=STORE_DIR, help="output store directory")
+    parser.add_argument("--cleaned-csv", help="also write the cleaned rows as CSV (notebook-compatible)")
+    parser.add_argument("--block-mb", type=int, default=BLOCK_MB, help="CSV block size; bounds peak memory")
+    args = parser.parse_args()
+
+    manifest, stats = run(args.source, args.store, args.cleaned_csv, args.block_mb)
+    print(f"Built store {manifest['version']}: {stats['rows_out']:,} of {stats['rows_in']:,} rows kept "
+          f"in {len(manifest['parts'])} parts")
+    for stage, stage_stats in stats["stages"].items():
+        print(f"  {stage:5s} {stage_stats['seconds']:8.2f}s  {stage_stats['rows_per_s'] or 0:>12,} rows/s")
+    print(f"  peak memory +{stats['peak_mem_mb']} MB")
+    print("Derived columns (cluster, t-SNE, promoted) are not in the raw data; "
+          "`python -m scripts.csv_to_parquet` builds them from the uplift CSV.")
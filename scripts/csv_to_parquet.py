@@ -1,24 +1,103 @@
-import pandas as pd
-import pyarrow as pa
+import argparse
+import glob
+import os
+import time
+
 import pyarrow.parquet as pq
 
-csv_path = "./data/spotify_tracks_cleaned.csv"
-parquet_path = "./data/spotify_tracks_cleaned.parquet"
-
-# dtype hints help reduce size & speed IO (optional but recommended)
-dtype = {
-    # "explicit": "boolean",  # if 0/1, convert after read
-    # put known small ints/cats here later…
-}
-
-df = pd.read_csv(csv_path, dtype=dtype)
-# Example compacting:
-if "explicit" in df.columns and df["explicit"].dtype != "bool":
-    df["explicit"] = df["explicit"].astype("bool")
-for col in df.select_dtypes(include="object").columns:
-    # Often safe to categorical-ize (review high-cardinality columns later)
-    if df[col].nunique() / len(df) < 0.9:
-        df[col] = df[col].astype("category")
-
-table = pa.Table.from_pandas(df, preserve_index=False)
-pq.write_table(table, parquet_path, compression="zstd", use_dictionary=True)
+from scripts import artist_index
+from scripts.memory_usage import PeakMemory
+from scripts.rollups import build_rollups
+from scripts.track_store import (
+    DERIVED_SCHEMA, DERIVED_SIDECARS, SIDECAR_DIR, SOURCE_CSV, STORE_DIR, TrackStore, build_store, read_manifest,
+)
+
+# Builds the typed columnar store every UI page reads from:
+#   python -m scripts.csv_to_parquet
+# Pass --parquet to also write a single zstd Parquet copy for external tools.
+# The CSV's derived columns (cluster, t-SNE, promoted) become narrow sidecars
+# instead of another copy of every base column. To compare the two layouts:
+#   python -m scripts.csv_to_parquet --footprint data/spotify_tracks_*.csv
+
+
+def footprint(csv_paths, store_dir=STORE_DIR):
+    """Disk, memory and load time of the wide CSVs, read the way the pages used to, vs the store."""
+    import pandas as pd
+
+    print(f"{'':34s} {'disk MB':>9s} {'memory MB':>10s} {'load s':>8s}")
+    total = {"disk": 0, "memory": 0, "load": 0.0}
+    derived_mb = None
+    for path in csv_paths:
+        start = time.perf_counter()
+        df = pd.read_csv(path)
+        load_s = time.perf_counter() - start
+        disk, memory = os.path.getsize(path), df.memory_usage(index=True, deep=True).sum()
+        derived = [c for c in DERIVED_SCHEMA.names if c in df.columns]
+        if derived:
+            derived_mb = df[derived].memory_usage(index=False, deep=True).sum() / 2**20
+        print(f"{os.path.basename(path):34s} {disk / 2**20:9.1f} {memory / 2**20:10.1f} {load_s:8.2f}")
+        total["disk"] += disk
+        total["memory"] += memory
+        total["load"] += load_s
+        del df
+    print(f"{'CSVs, one frame each':34s} {total['disk'] / 2**20:9.1f} {total['memory'] / 2**20:10.1f} {total['load']:8.2f}")
+
+    manifest = read_manifest(store_dir)
+    parts = sum(os.path.getsize(os.path.join(store_dir, part["path"])) for part in manifest["parts"])
+    # Only the sidecars holding the CSV's columns; scores and the like have no CSV counterpart.
+    sidecars = sum(os.path.getsize(path) for name in DERIVED_SIDECARS
+                   for path in glob.glob(os.path.join(store_dir, SIDECAR_DIR, f"{name}.arrow")))
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        store = TrackStore(store_dir)
+        open_s = time.perf_counter() - start
+        start = time.perf_counter()
+        frame = store.frame()
+        frame_s = time.perf_counter() - start
+    print(f"{'store parts + sidecars (Arrow)':34s} {(parts + sidecars) / 2**20:9.1f} "
+          f"{memory.peak_delta_mb:10.1f} {open_s + frame_s:8.2f}   "
+          f"(open {open_s * 1000:.1f} ms, every column as pandas {frame_s:.2f}s)")
+    columns = [c for c in DERIVED_SCHEMA.names if c in store.columns]
+    mapped = sum(store.table[c].nbytes for c in columns) / 2**20
+    print(f"Derived columns ({', '.join(columns)}): {sidecars / 2**20:.1f} MB of sidecar files, "
+          f"{mapped:.1f} MB mapped" + (f" vs {derived_mb:.1f} MB as CSV-parsed pandas columns" if derived_mb else ""))
+    print(f"Savings: {(1 - (parts + sidecars) / total['disk']) * 100:.0f}% disk, "
+          f"{(1 - memory.peak_delta_mb * 2**20 / total['memory']) * 100:.0f}% memory, "
+          f"{total['load'] / (open_s + frame_s):.0f}x faster to load")
+    del frame
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the typed track store from a tracks CSV.")
+    parser.add_argument("--source", default=SOURCE_CSV, help="tracks CSV to ingest")
+    parser.add_argument("--store", default=STORE_DIR, help="output store directory")
+    parser.add_argument("--parquet", help="optional path for a single Parquet copy")
+    parser.add_argument("--footprint", nargs="+", metavar="CSV",
+                        help="compare the given wide CSVs with the existing store instead of building it")
+    args = parser.parse_args()
+
+    if args.footprint:
+        footprint(args.footprint, args.store)
+        raise SystemExit
+
+    start = time.perf_counter()
+    manifest = build_store(args.source, args.store)
+    print(f"Built store {manifest['version']} with {manifest['rows']:,} rows "
+          f"in {len(manifest['parts'])} parts ({time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    build_rollups(args.store)
+    print(f"Dashboard rollups written ({time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    artists = artist_index.build(args.store)
+    print(f"Artist index of {len(artists):,} artists written ({time.perf_counter() - start:.2f}s)")
+
+    start = time.perf_counter()
+    store = TrackStore(args.store)
+    print(f"Cold open of {len(store):,} rows: {(time.perf_counter() - start) * 1000:.1f} ms")
+
+    if args.parquet:
+        os.makedirs(os.path.dirname(os.path.abspath(args.parquet)), exist_ok=True)
+        pq.write_table(store.table, args.parquet, compression="zstd", use_dictionary=True)
+        print(f"Parquet copy written to {args.parquet}")
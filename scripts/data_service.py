@@ -0,0 +1,197 @@
+"""
+Local data service: one shared, read-only copy of the store per host.
+
+Every Streamlit process opens the store itself. The parts are memory-mapped,
+but they hold one chunk per year, so `TrackStore.column` has to concatenate
+them into a private pandas copy in each process. With several replicas
+behind a load balancer, every replica holds its own copies and pays its own
+cold load.
+
+The service publishes the store once per data version into shared memory
+(`/dev/shm`, or `SIL_SHM_DIR`): the base parts and the up-to-date sidecars,
+joined and combined into a single contiguous Arrow IPC record batch. A
+process attaches by memory-mapping that file. Each column is one chunk, so
+numeric and string columns become pandas Series over the shared pages
+without a copy (strings are published as `large_string`, which pandas wraps
+as is). Every session of every replica reads
+the same physical pages, and each added process costs its own index
+structures, not another copy of the catalogue.
+
+`ui/track_data.py` attaches when a segment of the current store version
+exists, and opens the store files directly otherwise. The service process
+checks the store every few seconds. It publishes a new segment when the
+version or a sidecar changes, and unlinks the old one: processes still
+mapping it keep their pages until they reopen, just as with a rewritten
+store file.
+
+    python -m scripts.data_service                              # publish and keep the segment current
+    python -m scripts.data_service --once                       # publish the current version and exit
+    python -m scripts.data_service --benchmark --processes 1 4 8  # per-process memory: files vs segment
+"""
+
+import argparse
+import glob
+import hashlib
+import json
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+
+import pyarrow as pa
+
+from scripts.memory_usage import memory_breakdown
+from scripts.track_store import STORE_DIR, TrackStore, read_manifest, sidecars
+
+SHM_DIR = os.environ.get("SIL_SHM_DIR") or ("/dev/shm" if os.path.isdir("/dev/shm") else tempfile.gettempdir())
+POLL_SECONDS = 5
+
+
+def _store_id(store_dir):
+    return hashlib.sha256(os.path.realpath(store_dir).encode()).hexdigest()[:8]
+
+
+def segment_path(store_dir=STORE_DIR, shm_dir=SHM_DIR):
+    """Segment of the store's current version and sidecars; FileNotFoundError until the store is built."""
+    state = {"version": read_manifest(store_dir)["version"],
+             "sidecars": sorted((name, info["written_at"]) for name, info in sidecars(store_dir).items())}
+    key = hashlib.sha256(json.dumps(state).encode()).hexdigest()[:16]
+    return os.path.join(shm_dir, f"sil-{_store_id(store_dir)}-{key}.arrow")
+
+
+def publish(store_dir=STORE_DIR, shm_dir=SHM_DIR):
+    """Write the segment of the current store version (if missing); returns its path."""
+    path = segment_path(store_dir, shm_dir)
+    if os.path.exists(path):
+        return path
+    store = TrackStore(store_dir)
+    # pandas wraps large_string buffers as they are; 32-bit string offsets would be widened per process.
+    schema = pa.schema([pa.field(f.name, pa.large_string()) if f.type == pa.string() else f
+                        for f in store.table.schema])
+    table = store.table.combine_chunks().cast(schema).replace_schema_metadata({
+        "store_dir": os.path.abspath(store_dir),
+        "manifest": json.dumps(store.manifest),
+        "sidecars": json.dumps(store.sidecars),
+    })
+    # Write-then-rename, so an attaching process never maps a partial segment.
+    with pa.OSFile(path + ".tmp", "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+    os.replace(path + ".tmp", path)
+    return path
+
+
+def retire(store_dir=STORE_DIR, shm_dir=SHM_DIR, keep=None):
+    """Unlink this store's segments other than `keep`; returns the paths removed."""
+    removed = []
+    for path in glob.glob(os.path.join(shm_dir, f"sil-{_store_id(store_dir)}-*.arrow*")):
+        if path != keep:
+            os.remove(path)
+            removed.append(path)
+    return removed
+
+
+class SharedStore(TrackStore):
+    """A TrackStore over a published segment: the same interface, every column a single shared chunk."""
+
+    def __init__(self, path):
+        self.path = path
+        self.table = pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+        metadata = self.table.schema.metadata
+        self.store_dir = metadata[b"store_dir"].decode()
+        self.manifest = json.loads(metadata[b"manifest"])
+        self.sidecars = json.loads(metadata[b"sidecars"])
+        self._columns = {}
+        self._lock = threading.Lock()
+
+
+def attach(store_dir=STORE_DIR, shm_dir=SHM_DIR):
+    """SharedStore of the current store version, or None when the service has not published it."""
+    try:
+        return SharedStore(segment_path(store_dir, shm_dir))
+    except FileNotFoundError:
+        return None
+
+
+def _stop(signum, frame):
+    raise KeyboardInterrupt
+
+
+def serve(store_dir=STORE_DIR, shm_dir=SHM_DIR, poll=POLL_SECONDS):
+    """Keep the segment of the current store version published until interrupted; unlinks it on exit."""
+    signal.signal(signal.SIGTERM, _stop)
+    current = None
+    try:
+        while True:
+            try:
+                path = segment_path(store_dir, shm_dir)
+            except FileNotFoundError:
+                path = None  # the store is being rebuilt
+            if path is not None and path != current:
+                start = time.perf_counter()
+                current = publish(store_dir, shm_dir)
+                retire(store_dir, shm_dir, keep=current)
+                print(f"Published {os.path.basename(current)} "
+                      f"({os.path.getsize(current) / 2**20:.0f} MB, {time.perf_counter() - start:.2f}s)", flush=True)
+            time.sleep(poll)
+    except KeyboardInterrupt:
+        pass
+    finally:
+        retire(store_dir, shm_dir)
+
+
+# --- Benchmark: N processes each building a frame of every column, from the files vs the segment
+def _replica(mode, store_dir, results, done):
+    before = memory_breakdown()
+    start = time.perf_counter()
+    store = attach(store_dir) if mode == "segment" else TrackStore(store_dir)
+    frame = store.frame()
+    frame_s = time.perf_counter() - start
+    after = memory_breakdown()
+    results.put({key: after[key] - before[key] for key in after} | {"seconds": frame_s, "rows": len(frame)})
+    done.wait()  # hold the frame until every replica has reported, so PSS splits across all of them
+
+
+def benchmark(store_dir=STORE_DIR, processes=(1, 4, 8)):
+    existed = os.path.exists(segment_path(store_dir))
+    path = publish(store_dir)
+    print(f"Segment {path}: {os.path.getsize(path) / 2**20:.0f} MB")
+    context = multiprocessing.get_context("spawn")
+    for mode in ("files", "segment"):
+        for n in processes:
+            results, done = context.Queue(), context.Event()
+            workers = [context.Process(target=_replica, args=(mode, store_dir, results, done)) for _ in range(n)]
+            for worker in workers:
+                worker.start()
+            reports = [results.get() for _ in workers]
+            done.set()
+            for worker in workers:
+                worker.join()
+            mean = {key: sum(r[key] for r in reports) / n for key in ("rss", "pss", "uss", "seconds")}
+            print(f"  {mode:7s} x{n:<3d} per process: frame of {reports[0]['rows']:,} rows in {mean['seconds']:.2f}s, "
+                  f"+{mean['uss'] / 2**20:6.1f} MB private, +{mean['pss'] / 2**20:6.1f} MB PSS, "
+                  f"+{mean['rss'] / 2**20:6.1f} MB RSS; all processes +{mean['uss'] * n / 2**20:.0f} MB private")
+    if not existed:
+        retire(store_dir, keep=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Serve one shared copy of the track store to every local process.")
+    parser.add_argument("--store", default=STORE_DIR, help="store directory")
+    parser.add_argument("--shm-dir", default=SHM_DIR, help="shared memory directory for the segments")
+    parser.add_argument("--poll", type=float, default=POLL_SECONDS, help="seconds between store checks")
+    parser.add_argument("--once", action="store_true", help="publish the current version and exit")
+    parser.add_argument("--benchmark", action="store_true", help="compare per-process memory, files vs segment")
+    parser.add_argument("--processes", type=int, nargs="+", default=[1, 4, 8])
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.store, args.processes)
+    elif args.once:
+        path = publish(args.store, args.shm_dir)
+        retire(args.store, args.shm_dir, keep=path)
+        print(f"Published {path}")
+    else:
+        serve(args.store, args.shm_dir, args.poll)
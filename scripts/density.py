@@ -0,0 +1,151 @@
+"""
+Server-side 2-D density aggregation for large scatter plots.
+
+Instead of shipping every point to the browser, points are binned into a
+fixed grid with one count per (group, cell). Groups are e.g. mood clusters
+or promoted / not promoted. The grid is rendered as a small RGB image whose
+hue mixes the group colours and whose brightness follows the log count.
+Zooming re-bins only the points inside the viewport, so detail grows as
+the view shrinks. Below a few thousand points the raw points are cheaper
+to draw and more useful (hover), so callers fall back to a plain scatter.
+
+    python -m scripts.density --scale 1.2M    # payload / build time vs px.scatter
+"""
+
+import argparse
+import time
+from collections import namedtuple
+
+import numpy as np
+
+BINS = (240, 160)
+RAW_POINT_LIMIT = 4000
+BACKGROUND = (14, 17, 23)
+
+DensityGrid = namedtuple("DensityGrid", "x_edges y_edges counts")
+
+
+def extent(x, y):
+    """(x0, x1, y0, y1) bounding box of the points."""
+    return float(np.min(x)), float(np.max(x)), float(np.min(y)), float(np.max(y))
+
+
+def in_view(x, y, view):
+    x0, x1, y0, y1 = view
+    return (x >= x0) & (x <= x1) & (y >= y0) & (y <= y1)
+
+
+def group_codes(groups, values):
+    """
+    Position in `values` of each point's group, or -1 for nulls and groups
+    not in `values` (e.g. cluster ids, which need not be 0..k-1).
+    """
+    groups, values = np.asarray(groups), np.asarray(values)
+    order = np.argsort(values, kind="stable")
+    i = np.minimum(np.searchsorted(values, groups, sorter=order), len(values) - 1)
+    codes = order[i]
+    return np.where(values[codes] == groups, codes, -1)
+
+
+def palette(colors, n):
+    """`n` colours, cycling through `colors` as Plotly's discrete colour sequences do."""
+    return [colors[i % len(colors)] for i in range(n)]
+
+
+def bin_points(x, y, codes, n_groups, view, bins=BINS):
+    """
+    Count points per group and grid cell inside `view`.
+
+    `codes` are integers 0..n_groups-1, one per point (see `group_codes`);
+    points with a negative code are left out.
+    Returns a DensityGrid whose `counts` has shape (n_groups, ny, nx).
+    """
+    codes = np.asarray(codes)
+    keep = codes >= 0
+    if not keep.all():
+        x, y, codes = x[keep], y[keep], codes[keep]
+    nx, ny = bins
+    x0, x1, y0, y1 = view
+    # Degenerate views (a single distinct value) still get one cell.
+    sx = nx / (x1 - x0) if x1 > x0 else 0.0
+    sy = ny / (y1 - y0) if y1 > y0 else 0.0
+    gx = np.minimum(((x - x0) * sx).astype(np.int64), nx - 1)
+    gy = np.minimum(((y - y0) * sy).astype(np.int64), ny - 1)
+    flat = (codes.astype(np.int64) * ny + gy) * nx + gx
+    counts = np.bincount(flat, minlength=n_groups * ny * nx).reshape(n_groups, ny, nx)
+    return DensityGrid(np.linspace(x0, x1, nx + 1), np.linspace(y0, y1, ny + 1), counts.astype(np.uint32))
+
+
+def blend(counts, colors, background=BACKGROUND):
+    """
+    RGB image (ny, nx, 3) for per-group counts: hue is the count-weighted mix
+    of `colors` (one RGB triple per group), brightness the log of the total.
+    """
+    counts = counts.astype(np.float32)
+    total = counts.sum(axis=0)
+    mix = np.einsum("gyx,gc->yxc", counts, np.asarray(colors, dtype=np.float32))
+    mix /= np.maximum(total, 1)[..., None]
+    intensity = (np.log1p(total) / max(np.log1p(total.max()), 1e-9))[..., None]
+    image = np.asarray(background, dtype=np.float32) * (1 - intensity) + mix * intensity
+    return image.round().astype(np.uint8)
+
+
+def hex_to_rgb(color):
+    color = color.lstrip("#")
+    return tuple(int(color[i:i + 2], 16) for i in (0, 2, 4))
+
+
+def density_figure(grid, labels, colors, title=None):
+    """Plotly figure of a DensityGrid: the blended image plus a legend entry per group."""
+    import plotly.express as px
+    import plotly.graph_objects as go
+
+    colors = palette(colors, len(labels))
+    rgb = [hex_to_rgb(c) for c in colors]
+    x_centers = (grid.x_edges[:-1] + grid.x_edges[1:]) / 2
+    y_centers = (grid.y_edges[:-1] + grid.y_edges[1:]) / 2
+    fig = px.imshow(blend(grid.counts, rgb), x=x_centers, y=y_centers, origin="lower", aspect="auto", title=title)
+    for label, color in zip(labels, colors):
+        fig.add_trace(go.Scatter(x=[None], y=[None], mode="markers", marker=dict(color=color), name=str(label)))
+    fig.update_layout(showlegend=True, dragmode="select")
+    return fig
+
+
+def figure_payload(fig):
+    """(bytes, ms) of the JSON Streamlit sends to the browser for `fig`."""
+    start = time.perf_counter()
+    payload = fig.to_json()
+    return len(payload.encode()), (time.perf_counter() - start) * 1000
+
+
+if __name__ == "__main__":
+    import plotly.express as px
+
+    from scripts.synthetic_tracks import SCALE_FACTORS, synthetic_tracks
+
+    parser = argparse.ArgumentParser(description="Compare density rendering with sending raw points.")
+    parser.add_argument("--scale", choices=SCALE_FACTORS, default="1.2M")
+    args = parser.parse_args()
+
+    df = synthetic_tracks(SCALE_FACTORS[args.scale]).select(["name", "artists", "valence", "energy", "promoted"]).to_pandas()
+    x, y, promoted = df["valence"].to_numpy(), df["energy"].to_numpy(), df["promoted"].to_numpy()
+    print(f"{len(df):,} points")
+
+    def report(label, build):
+        start = time.perf_counter()
+        fig = build()
+        build_ms = (time.perf_counter() - start) * 1000
+        size, json_ms = figure_payload(fig)
+        print(f"{label:38s} build {build_ms:8.1f} ms  serialise {json_ms:8.1f} ms  payload {size / 2**20:8.2f} MB")
+
+    report("px.scatter, all points (dashboard)", lambda: px.scatter(
+        df, x="valence", y="energy", color=df["promoted"].map({1: "Promoted", 0: "Not Promoted"}), opacity=0.5))
+    report("px.scatter, 20% sample + hover (mood)", lambda: px.scatter(
+        df.sample(frac=0.2, random_state=42), x="valence", y="energy", color="promoted",
+        hover_data=["name", "artists"]))
+    report("density grid, full view", lambda: density_figure(
+        bin_points(x, y, promoted, 2, extent(x, y)), ["Not Promoted", "Promoted"], ["#636EFA", "#1DB954"]))
+    zoom = (0.4, 0.45, 0.6, 0.65)
+    mask = in_view(x, y, zoom)
+    report(f"density grid, zoomed ({mask.sum():,} in view)", lambda: density_figure(
+        bin_points(x[mask], y[mask], promoted[mask], 2, zoom), ["Not Promoted", "Promoted"], ["#636EFA", "#1DB954"]))
@@ -0,0 +1,356 @@
+"""
+Load test: scripted sessions replayed concurrently against the app.
+
+The harness starts `streamlit run ui/app.py` headless on a free port (or
+targets a running server with `--url`), and plays sessions over
+Streamlit's websocket protocol the way browsers do: each session opens a
+page, then changes one widget at a time and waits for the rerun to finish.
+Sessions run `--concurrency` at a time against the one server process, so
+they share its caches and contend for its threads like real visitors:
+
+- `explorer`: open Track Explorer, then drag its year, danceability,
+  energy and tempo sliders;
+- `clusters`: open Mood Clusters and switch between clusters;
+- `promotion`: open the Promotion Model, search, and select albums and
+  tracks.
+
+An interaction is timed from sending the widget change to the server's
+"script finished" message. The report gives p50/p90/p99 per scenario and
+interaction, interactions per second, and the server's RSS (sampled while
+the sessions run). The run exits non-zero when an interaction's p90 exceeds
+its budget, the RSS grows by more than the RSS budget, a page raises, or,
+given `--baseline`, a p90 or the throughput regresses by more than
+`--tolerance` against a saved report. This makes it usable as a CI gate.
+
+Headless `AppTest` sessions cannot run concurrently in one process (each
+run patches Streamlit's global config), hence a real server.
+
+    python -m scripts.load_test --concurrency 20 --sessions 60
+    python -m scripts.load_test --concurrency 50 --scenarios explorer --save results.json
+    python -m scripts.load_test --concurrency 20 --baseline results.json --tolerance 0.25
+    python -m scripts.load_test --url http://localhost:8501 --pid 1234     # a server that is already running
+"""
+
+import argparse
+import asyncio
+import contextlib
+import json
+import os
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import urllib.request
+
+import numpy as np
+import pandas as pd
+
+from scripts.memory_usage import process_rss_bytes
+from scripts.perf_log import percentiles
+from scripts.startup import UI_DIR
+
+INTERACTIONS_PER_SESSION = 6
+P90_BUDGET_MS = 2000
+RSS_BUDGET_MB = 1024
+TOLERANCE = 0.25
+RSS_SAMPLE_S = 0.1
+SERVER_START_S = 60
+RERUN_TIMEOUT_S = 120
+
+
+class Session:
+    """One browser session on a page: the page's latest widgets, and the widget values set so far."""
+
+    def __init__(self, url, page):
+        self.url = url.replace("http", "ws", 1).rstrip("/") + "/_stcore/stream"
+        self.page = page
+        self.elements = []
+        self.states = {}
+
+    async def __aenter__(self):
+        from websockets.asyncio.client import connect
+
+        self._ws = await connect(self.url, max_size=None)
+        return self
+
+    async def __aexit__(self, *exc):
+        await self._ws.close()
+
+    async def rerun(self):
+        """Rerun the page with the current widget values; returns (ms, error or None)."""
+        from streamlit.proto.BackMsg_pb2 import BackMsg
+        from streamlit.proto.ForwardMsg_pb2 import ForwardMsg
+
+        message = BackMsg()
+        message.rerun_script.page_name = self.page
+        message.rerun_script.widget_states.widgets.extend(self.states.values())
+        start = time.perf_counter()
+        await self._ws.send(message.SerializeToString())
+        elements, error = [], None
+        while True:
+            forward = ForwardMsg()
+            forward.ParseFromString(await asyncio.wait_for(self._ws.recv(), RERUN_TIMEOUT_S))
+            kind = forward.WhichOneof("type")
+            if kind == "delta" and forward.delta.WhichOneof("type") == "new_element":
+                element = forward.delta.new_element
+                elements.append(element)
+                if element.WhichOneof("type") == "exception" and error is None:
+                    error = f"{element.exception.type}: {element.exception.message}"
+            elif kind == "script_finished":
+                if forward.script_finished == ForwardMsg.FINISHED_WITH_COMPILE_ERROR:
+                    error = error or "compile error"
+                break
+        self.elements = elements
+        return (time.perf_counter() - start) * 1000, error
+
+    def widget(self, kind, label):
+        """Proto of the `kind` widget (e.g. "slider") labelled `label` in the last rerun."""
+        for element in self.elements:
+            if element.WhichOneof("type") == kind and getattr(element, kind).label == label:
+                return getattr(element, kind)
+        raise LookupError(f"no {kind} {label!r} on {self.page}")
+
+    def set(self, widget, value):
+        """Set a widget's value for the next rerun: a string (select box, text) or a list of numbers (slider)."""
+        from streamlit.proto.WidgetStates_pb2 import WidgetState
+
+        state = WidgetState(id=widget.id)
+        if isinstance(value, str):
+            state.string_value = value
+        else:
+            state.double_array_value.data[:] = [float(v) for v in value]
+        self.states[widget.id] = state
+
+
+# --- Scenarios: generators that change a widget, then yield the interaction's name for the rerun
+def _slider_value(slider, rng, size=1):
+    steps = np.arange(slider.min, slider.max + slider.step / 2, slider.step)
+    return np.sort(rng.choice(steps, size)).round(6).tolist()
+
+
+def explorer(session, rng, n):
+    """Slider drags on Track Explorer."""
+    drags = [("drag year range", "Select Year Range", 2), ("drag danceability", "Minimum Danceability", 1),
+             ("drag energy", "Minimum Energy", 1), ("drag tempo range", "Tempo Range (BPM)", 2)]
+    for i in range(n):
+        name, label, size = drags[i % len(drags)]
+        slider = session.widget("slider", label)
+        session.set(slider, _slider_value(slider, rng, size))
+        yield name
+
+
+def clusters(session, rng, n):
+    """Cluster switching on Mood Clusters."""
+    for _ in range(n):
+        select = session.widget("selectbox", "🎨 Select Cluster")
+        session.set(select, select.options[rng.integers(len(select.options))])
+        yield "switch cluster"
+
+
+def promotion(session, rng, n):
+    """Album search and album / track selection on the Promotion Model."""
+    for i in range(n):
+        if i % 3 == 0:
+            albums = session.widget("selectbox", "💿 Album").options
+            album = albums[rng.integers(len(albums))]
+            session.set(session.widget("text_input", "🔎 Search albums, tracks or artists"),
+                        album[:rng.integers(1, len(album) + 1)])
+            yield "search"
+        else:
+            label = "💿 Album" if i % 3 == 1 else "🎵 Track"
+            select = session.widget("selectbox", label)
+            session.set(select, select.options[rng.integers(len(select.options))])
+            yield "select album" if i % 3 == 1 else "select track"
+
+
+# scenario: (page URL path, script)
+SCENARIOS = {
+    "explorer": ("track_explorer", explorer),
+    "clusters": ("mood_clusters", clusters),
+    "promotion": ("promotion_model", promotion),
+}
+
+
+async def play(url, scenario, seed, interactions):
+    """One session: open the page, then the scenario's interactions; returns one row per rerun."""
+    page, script = SCENARIOS[scenario]
+    rng = np.random.default_rng(seed)
+    rows = []
+    async with Session(url, page) as session:
+        name = "open page"
+        steps = script(session, rng, interactions)
+        while name is not None:
+            ms, error = await session.rerun()
+            rows.append({"scenario": scenario, "interaction": name, "ms": ms, "error": error})
+            if error is not None:
+                break
+            try:
+                name = next(steps, None)
+            except LookupError as exc:  # the widget a step drives is not on the page
+                rows.append({"scenario": scenario, "interaction": "script", "ms": 0.0, "error": str(exc)})
+                break
+    return rows
+
+
+async def _play_all(url, plan, concurrency, interactions):
+    slots = asyncio.Semaphore(concurrency)
+
+    async def run(scenario, seed):
+        async with slots:
+            return await play(url, scenario, seed, interactions)
+
+    return await asyncio.gather(*(run(scenario, seed) for scenario, seed in plan))
+
+
+def _free_port():
+    with socket.socket() as probe:
+        probe.bind(("127.0.0.1", 0))
+        return probe.getsockname()[1]
+
+
+@contextlib.contextmanager
+def local_server(port=None, start_timeout=SERVER_START_S):
+    """`streamlit run ui/app.py` headless on `port` (a free one by default); yields (url, pid), stopped on exit."""
+    port = port or _free_port()
+    url = f"http://127.0.0.1:{port}"
+    command = [sys.executable, "-m", "streamlit", "run", os.path.join(UI_DIR, "app.py"), "--server.headless", "true",
+               "--server.port", str(port), "--server.fileWatcherType", "none", "--browser.gatherUsageStats", "false"]
+    with tempfile.TemporaryFile("w+") as log:
+        server = subprocess.Popen(command, stdout=log, stderr=subprocess.STDOUT)
+        try:
+            deadline = time.monotonic() + start_timeout
+            while True:
+                try:
+                    with urllib.request.urlopen(f"{url}/_stcore/health", timeout=1):
+                        break
+                except OSError:
+                    if server.poll() is not None or time.monotonic() > deadline:
+                        log.seek(0)
+                        raise RuntimeError(f"The app server did not start:\n{log.read()[-2000:]}")
+                    time.sleep(0.2)
+            yield url, server.pid
+        finally:
+            server.terminate()
+            server.wait(10)
+
+
+class _RssSampler:
+    """Samples a process's RSS on a thread every RSS_SAMPLE_S seconds (nothing without a pid)."""
+
+    def __init__(self, pid):
+        self.pid = pid
+        self.samples = []
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _sample(self):
+        rss = process_rss_bytes(self.pid) if self.pid else None
+        if rss is not None:
+            self.samples.append(rss)
+
+    def _run(self):
+        while not self._stop.wait(RSS_SAMPLE_S):
+            self._sample()
+
+    def __enter__(self):
+        self._sample()
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self._sample()
+        return False
+
+
+def run(url, pid=None, scenarios=tuple(SCENARIOS), concurrency=10, sessions=30,
+        interactions=INTERACTIONS_PER_SESSION, seed=27):
+    """Play `sessions` sessions (scenarios round-robin), `concurrency` at a time; returns the report dict."""
+    # One unmeasured session per scenario fills the caches a server that has been up a while would have.
+    asyncio.run(_play_all(url, [(scenario, seed) for scenario in scenarios], len(scenarios), 1))
+
+    plan = [(scenarios[i % len(scenarios)], seed + i) for i in range(sessions)]
+    with _RssSampler(pid) as rss:
+        start = time.perf_counter()
+        results = asyncio.run(_play_all(url, plan, concurrency, interactions))
+        elapsed = time.perf_counter() - start
+
+    timings = pd.DataFrame([row for rows in results for row in rows])
+    timings["step"] = timings["scenario"] + ": " + timings["interaction"]
+    ok = timings[timings["error"].isna()]
+    mb = [sample / 2**20 for sample in rss.samples]
+    return {
+        "concurrency": concurrency,
+        "sessions": sessions,
+        "interactions": len(ok),
+        "errors": timings.loc[timings["error"].notna(), ["step", "error"]].drop_duplicates().values.tolist(),
+        "seconds": elapsed,
+        "throughput": len(ok) / elapsed,
+        "latency": percentiles(ok, "step", "ms").round(1).to_dict("records"),
+        "rss_mb": {"start": mb[0], "peak": max(mb), "end": mb[-1]} if mb else None,
+    }
+
+
+def regressions(report, p90_budget_ms=P90_BUDGET_MS, rss_budget_mb=RSS_BUDGET_MB, baseline=None, tolerance=TOLERANCE):
+    """Threshold and baseline violations of a report, as messages."""
+    failures = [f"{row['step']}: p90 {row['p90']:.0f} ms > {p90_budget_ms:.0f} ms"
+                for row in report["latency"] if row["p90"] > p90_budget_ms]
+    if report["rss_mb"] and report["rss_mb"]["peak"] - report["rss_mb"]["start"] > rss_budget_mb:
+        failures.append(f"RSS grew {report['rss_mb']['peak'] - report['rss_mb']['start']:.0f} MB "
+                        f"> {rss_budget_mb:.0f} MB")
+    if report["errors"]:
+        failures.append(f"{len(report['errors'])} distinct interaction errors")
+    if baseline is not None:
+        before = {row["step"]: row["p90"] for row in baseline["latency"]}
+        for row in report["latency"]:
+            if row["step"] in before and row["p90"] > before[row["step"]] * (1 + tolerance):
+                failures.append(f"{row['step']}: p90 {row['p90']:.0f} ms vs {before[row['step']]:.0f} ms baseline "
+                                f"(> +{tolerance:.0%})")
+        if report["throughput"] < baseline["throughput"] * (1 - tolerance):
+            failures.append(f"throughput {report['throughput']:.1f}/s vs {baseline['throughput']:.1f}/s baseline")
+    return failures
+
+
+def print_report(report):
+    print(f"{report['sessions']} sessions, {report['concurrency']} at a time: {report['interactions']:,} "
+          f"interactions in {report['seconds']:.1f}s = {report['throughput']:.1f} interactions/s")
+    print(pd.DataFrame(report["latency"]).to_string(index=False))
+    rss = report["rss_mb"]
+    if rss:
+        print(f"Server RSS: {rss['start']:.0f} MB at start, {rss['peak']:.0f} MB peak, {rss['end']:.0f} MB at end")
+    for step, error in report["errors"]:
+        print(f"  error in {step}: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay concurrent scripted sessions against the app.")
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", type=int, default=10, help="sessions running at once")
+    parser.add_argument("--sessions", type=int, default=30, help="sessions in total")
+    parser.add_argument("--interactions", type=int, default=INTERACTIONS_PER_SESSION, help="interactions per session")
+    parser.add_argument("--url", help="load a running server instead of starting one")
+    parser.add_argument("--pid", type=int, help="process id of the --url server, to sample its RSS")
+    parser.add_argument("--p90-budget-ms", type=float, default=P90_BUDGET_MS)
+    parser.add_argument("--rss-budget-mb", type=float, default=RSS_BUDGET_MB, help="allowed RSS growth")
+    parser.add_argument("--baseline", help="report JSON of an earlier run to compare p90 and throughput with")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE, help="allowed regression against the baseline")
+    parser.add_argument("--save", help="write this run's report as JSON")
+    args = parser.parse_args()
+
+    with contextlib.ExitStack() as stack:
+        url, pid = (args.url, args.pid) if args.url else stack.enter_context(local_server())
+        report = run(url, pid, args.scenarios, args.concurrency, args.sessions, args.interactions)
+    print_report(report)
+    if args.save:
+        with open(args.save, "w") as f:
+            json.dump(report, f, indent=2)
+    baseline = None
+    if args.baseline:
+        with open(args.baseline) as f:
+            baseline = json.load(f)
+    failures = regressions(report, args.p90_budget_ms, args.rss_budget_mb, baseline, args.tolerance)
+    print("Thresholds: " + ("; ".join(failures) if failures else "OK"))
+    sys.exit(1 if failures else 0)
@@ -0,0 +1,211 @@
+"""
+2-D mood embedding (replaces the t-SNE cell of notebook 02).
+
+Exact t-SNE over all 1.2M tracks takes hours and cannot place new tracks.
+Instead:
+
+1. t-SNE is fitted on a landmark sample, stratified by mood cluster so small
+   clusters are represented.
+2. Every other track, and any future one, is placed at the kernel-weighted
+   mean of its nearest landmarks in scaled feature space. This is the
+   out-of-sample initialisation used by openTSNE and parametric variants,
+   and it runs in vectorised batches.
+
+The landmarks, their coordinates and the scaler go into a compact artifact
+(`models/mood_embedding.npz`). Coordinates for the store go into the `tsne`
+float32 sidecar, which overrides the `tsne_1`/`tsne_2` columns from the CSV.
+
+    python -m scripts.mood_embedding                       # embed the store
+    python -m scripts.mood_embedding --benchmark           # vs exact t-SNE on a sample
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pyarrow as pa
+
+from scripts import mood_clustering
+from scripts.memory_usage import PeakMemory
+from scripts.track_store import AUDIO_FEATURES, PROJECT_ROOT, STORE_DIR, TrackStore, data_version, open_store, write_sidecar
+
+ARTIFACT_PATH = os.path.join(PROJECT_ROOT, "models", "mood_embedding.npz")
+EMBEDDING_SIDECAR = "tsne"
+N_LANDMARKS = 10_000
+N_NEIGHBORS = 10
+PERPLEXITY = 30
+RANDOM_STATE = 27
+CHUNK_ROWS = 65_536
+
+
+def scaler_stats(table):
+    """(mean, scale) from the clustering artifact when present, so both stages share one feature space."""
+    if os.path.exists(mood_clustering.ARTIFACT_PATH):
+        artifact = mood_clustering.load_artifact()
+        return np.array(artifact["mean"]), np.array(artifact["scale"])
+    scaler = mood_clustering.fit_scaler(table)
+    return scaler.mean_, scaler.scale_
+
+
+def landmark_rows(n_rows, n_landmarks, strata=None, seed=RANDOM_STATE):
+    """Sorted row indices of the landmark sample, proportional per stratum (e.g. cluster) when given."""
+    rng = np.random.default_rng(seed)
+    if n_rows <= n_landmarks:
+        return np.arange(n_rows)
+    if strata is None:
+        return np.sort(rng.choice(n_rows, n_landmarks, replace=False))
+    rows = []
+    for value in np.unique(strata):
+        members = np.flatnonzero(strata == value)
+        take = max(1, round(n_landmarks * len(members) / n_rows))
+        rows.append(rng.choice(members, min(take, len(members)), replace=False))
+    return np.sort(np.concatenate(rows))
+
+
+def fit_landmarks(landmarks, perplexity=PERPLEXITY, seed=RANDOM_STATE):
+    """Exact (Barnes-Hut) t-SNE coordinates of the scaled landmark features, as float32."""
+    from sklearn.manifold import TSNE
+
+    tsne = TSNE(n_components=2, perplexity=perplexity, init="pca", random_state=seed)
+    return tsne.fit_transform(landmarks).astype(np.float32)
+
+
+class Embedding:
+    """Fitted landmarks plus the out-of-sample mapping for new points."""
+
+    def __init__(self, mean, scale, landmarks, coords, n_neighbors=N_NEIGHBORS):
+        from sklearn.neighbors import NearestNeighbors
+
+        self.mean = np.asarray(mean)
+        self.scale = np.asarray(scale)
+        self.landmarks = np.asarray(landmarks, dtype=np.float32)
+        self.coords = np.asarray(coords, dtype=np.float32)
+        self.n_neighbors = n_neighbors
+        # Brute force beats the KD-tree here: 9 dimensions, and sklearn's chunked argkmin kernel is multithreaded.
+        self._index = NearestNeighbors(n_neighbors=n_neighbors, algorithm="brute").fit(self.landmarks)
+
+    def project_scaled(self, scaled):
+        """2-D coordinates (float32) for already-scaled feature rows."""
+        distances, neighbors = self._index.kneighbors(scaled)
+        # Gaussian kernel with a per-point bandwidth (the median neighbour distance).
+        bandwidth = np.maximum(np.median(distances, axis=1, keepdims=True), 1e-6)
+        weights = np.exp(-0.5 * (distances / bandwidth) ** 2)
+        weights /= weights.sum(axis=1, keepdims=True)
+        return np.einsum("nk,nkd->nd", weights, self.coords[neighbors]).astype(np.float32)
+
+    def project(self, table, chunk_rows=CHUNK_ROWS):
+        """2-D coordinates for every row of an Arrow table with AUDIO_FEATURES, in batches."""
+        out = np.empty((table.num_rows, 2), dtype=np.float32)
+        for start in range(0, table.num_rows, chunk_rows):
+            chunk = table.slice(start, chunk_rows)
+            scaled = (mood_clustering.audio_features(chunk) - self.mean) / self.scale
+            out[start:start + chunk.num_rows] = self.project_scaled(scaled.astype(np.float32))
+        return out
+
+    def save(self, path=ARTIFACT_PATH, **meta):
+        np.savez(path, mean=self.mean, scale=self.scale, landmarks=self.landmarks, coords=self.coords,
+                 n_neighbors=self.n_neighbors, **{key: np.asarray(value) for key, value in meta.items()})
+
+    @classmethod
+    def load(cls, path=ARTIFACT_PATH):
+        with np.load(path) as data:
+            return cls(data["mean"], data["scale"], data["landmarks"], data["coords"], int(data["n_neighbors"]))
+
+
+def fit(table, n_landmarks=N_LANDMARKS, strata=None, seed=RANDOM_STATE):
+    """Fit an Embedding on a landmark sample of `table`; returns (embedding, landmark rows)."""
+    mean, scale = scaler_stats(table)
+    rows = landmark_rows(table.num_rows, n_landmarks, strata, seed)
+    landmarks = ((mood_clustering.audio_features(table.take(rows)) - mean) / scale).astype(np.float32)
+    return Embedding(mean, scale, landmarks, fit_landmarks(landmarks, seed=seed)), rows
+
+
+def from_coords(table, coords, mean, scale, n_landmarks=N_LANDMARKS, strata=None, seed=RANDOM_STATE):
+    """
+    Embedding whose landmarks keep coordinates the rows already have (e.g. the
+    CSV's t-SNE columns) instead of a new t-SNE fit; returns (embedding, landmark rows).
+    """
+    rows = landmark_rows(table.num_rows, n_landmarks, strata, seed)
+    landmarks = ((mood_clustering.audio_features(table.take(rows)) - mean) / scale).astype(np.float32)
+    return Embedding(mean, scale, landmarks, np.asarray(coords)[rows]), rows
+
+
+def embed_store(store_dir=STORE_DIR, n_landmarks=N_LANDMARKS, artifact_path=ARTIFACT_PATH):
+    """Fit on landmarks, project the whole store and write the `tsne` sidecar; returns timing stats."""
+    store = TrackStore(store_dir)
+    table = store.table.select(["id"] + AUDIO_FEATURES)
+    # Latest cluster labels (the `clusters` sidecar when present) stratify the landmark sample.
+    strata = store.column("cluster").to_numpy() if "cluster" in store.columns else None
+
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        embedding, rows = fit(table, n_landmarks, strata)
+        fit_s = time.perf_counter() - start
+
+        start = time.perf_counter()
+        coords = embedding.project(table)
+        coords[rows] = embedding.coords
+        project_s = time.perf_counter() - start
+
+    embedding.save(artifact_path, store_version=data_version(store_dir))
+    write_sidecar(EMBEDDING_SIDECAR, pa.table({"id": table["id"], "tsne_1": coords[:, 0], "tsne_2": coords[:, 1]}),
+                  store_dir, meta={"artifact": os.path.relpath(artifact_path, PROJECT_ROOT), "landmarks": len(rows)})
+    return {"rows": table.num_rows, "landmarks": len(rows), "fit_s": fit_s, "project_s": project_s,
+            "rows_per_s": table.num_rows / project_s, "peak_mem_mb": memory.peak_delta_mb}
+
+
+def benchmark(table, sample_rows=20_000, n_landmarks=5_000, seed=RANDOM_STATE):
+    """Print time and trustworthiness of exact t-SNE vs landmarks + projection on the same sample."""
+    from sklearn.manifold import trustworthiness
+
+    rows = landmark_rows(table.num_rows, sample_rows, seed=seed)
+    sample = table.take(rows)
+    mean, scale = scaler_stats(table)
+    scaled = ((mood_clustering.audio_features(sample) - mean) / scale).astype(np.float32)
+    print(f"sample of {len(rows):,} rows, {n_landmarks:,} landmarks")
+
+    start = time.perf_counter()
+    exact = fit_landmarks(scaled, seed=seed)
+    exact_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    landmarks = landmark_rows(len(rows), n_landmarks, seed=seed)
+    embedding = Embedding(mean, scale, scaled[landmarks], fit_landmarks(scaled[landmarks], seed=seed))
+    fit_s = time.perf_counter() - start
+    start = time.perf_counter()
+    projected = embedding.project_scaled(scaled)
+    project_s = time.perf_counter() - start
+    projected[landmarks] = embedding.coords
+
+    check = landmark_rows(len(rows), 5_000, seed=seed + 1)
+
+    # Trustworthiness over 5 and 30 neighbours: local detail vs neighbourhood-scale structure.
+    def trust(coords):
+        return "  ".join(f"T@{n} {trustworthiness(scaled[check], coords[check], n_neighbors=n):.3f}" for n in (5, 30))
+
+    print(f"exact t-SNE           : {exact_s:7.1f}s  {trust(exact)}")
+    print(f"landmarks + projection: {fit_s + project_s:7.1f}s  {trust(projected)}  "
+          f"(fit {fit_s:.1f}s, projection {len(rows) / project_s:,.0f} rows/s)")
+
+
+if __name__ == "__main__":
+    from scripts.synthetic_tracks import SCALE_FACTORS, synthetic_tracks
+
+    parser = argparse.ArgumentParser(description="Embed every track in 2-D from a t-SNE landmark fit.")
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--landmarks", type=int, default=N_LANDMARKS)
+    parser.add_argument("--benchmark", action="store_true", help="compare with exact t-SNE on a sample instead")
+    parser.add_argument("--sample-rows", type=int, default=20_000)
+    parser.add_argument("--scale", choices=SCALE_FACTORS, help="benchmark on a synthetic catalogue")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        table = (synthetic_tracks(SCALE_FACTORS[args.scale], with_derived=False) if args.scale
+                 else open_store(AUDIO_FEATURES, store_dir=args.store))
+        benchmark(table, args.sample_rows, min(args.landmarks, args.sample_rows // 4))
+    else:
+        stats = embed_store(args.store, args.landmarks)
+        print(f"Embedded {stats['rows']:,} tracks: t-SNE on {stats['landmarks']:,} landmarks {stats['fit_s']:.1f}s, "
+              f"projection {stats['project_s']:.1f}s ({stats['rows_per_s']:,.0f} rows/s), "
+              f"peak +{stats['peak_mem_mb']:.0f} MB -> sidecars/{EMBEDDING_SIDECAR}")
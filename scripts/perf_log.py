@@ -0,0 +1,264 @@
+"""
+Stage-level latency and memory instrumentation for page reruns.
+
+`ui/app.py` wraps every rerun in `run(page, log)`; pages mark the parts worth
+watching with `with stage("filter"):` blocks or `@timed("figure")`. A stage
+records its wall time and the change in process RSS across it (RSS is per
+process, so with concurrent sessions a delta can include another session's
+allocations). Outside a run, e.g. a page started on its own with
+`streamlit run ui/<page>.py`, stages cost one context-variable lookup and
+record nothing.
+
+A rerun's stages are collected in memory and handed to a writer thread when
+the rerun ends. The writer appends them to a SQLite file (WAL mode, one
+transaction per batch) and drops everything but the newest MAX_RUNS reruns,
+so the log is a bounded ring buffer on disk that survives restarts and never
+makes a page wait on I/O. The Performance page reads it back as percentiles.
+
+    python -m scripts.perf_log               # p50/p90/p99 per page and stage from the log
+    python -m scripts.perf_log --benchmark   # overhead per stage and per rerun
+"""
+
+import argparse
+import contextlib
+import contextvars
+import functools
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from scripts.memory_usage import rss_bytes
+from scripts.track_store import PROJECT_ROOT
+
+PERF_LOG_PATH = os.environ.get("SIL_PERF_LOG", os.path.join(PROJECT_ROOT, "data", "perf_log.sqlite"))
+MAX_RUNS = 50_000
+PRUNE_EVERY = 500
+PERCENTILES = (0.5, 0.9, 0.99)
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS runs (
+    id INTEGER PRIMARY KEY AUTOINCREMENT,
+    ts REAL NOT NULL,
+    page TEXT NOT NULL,
+    status TEXT NOT NULL,
+    total_ms REAL NOT NULL,
+    rss_mb REAL NOT NULL,
+    rss_delta_mb REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS runs_ts ON runs (ts);
+CREATE TABLE IF NOT EXISTS stages (
+    run_id INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    stage TEXT NOT NULL,
+    ms REAL NOT NULL,
+    rss_delta_mb REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS stages_run ON stages (run_id);
+"""
+
+_current = contextvars.ContextVar("perf_run", default=None)
+
+
+class Run:
+    """Timings of one rerun: `(stage, ms, rss delta MB)` in completion order, then the totals."""
+
+    def __init__(self, page):
+        self.page = page
+        self.ts = time.time()
+        self.status = "ok"
+        self.stages = []
+        self.total_ms = self.rss_mb = self.rss_delta_mb = 0.0
+
+
+@contextlib.contextmanager
+def run(page, log):
+    """Record the enclosed rerun of `page` into `log`, including reruns ended by st.stop / st.rerun or an error."""
+    current = Run(page)
+    token = _current.set(current)
+    start, rss = time.perf_counter(), rss_bytes()
+    try:
+        yield current
+    except BaseException as exc:  # StopException and RerunException are how Streamlit ends a run early
+        current.status = type(exc).__name__
+        raise
+    finally:
+        _current.reset(token)
+        current.total_ms = (time.perf_counter() - start) * 1000
+        current.rss_mb = rss_bytes() / 2**20
+        current.rss_delta_mb = current.rss_mb - rss / 2**20
+        log.record(current)
+
+
+@contextlib.contextmanager
+def stage(name):
+    """Time the enclosed block as stage `name` of the current rerun (no-op outside `run`)."""
+    current = _current.get()
+    if current is None:
+        yield
+        return
+    start, rss = time.perf_counter(), rss_bytes()
+    try:
+        yield
+    finally:
+        current.stages.append((name, (time.perf_counter() - start) * 1000, (rss_bytes() - rss) / 2**20))
+
+
+def timed(name=None):
+    """Decorator form of `stage`; the stage is named after the function unless `name` is given."""
+    def decorate(fn):
+        @functools.wraps(fn)
+        def wrapper(*args, **kwargs):
+            with stage(name or fn.__name__):
+                return fn(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+class PerfLog:
+    """SQLite ring buffer of the newest `max_runs` reruns, appended to by a background writer thread."""
+
+    def __init__(self, path=PERF_LOG_PATH, max_runs=MAX_RUNS):
+        self.path = path
+        self.max_runs = max_runs
+        self._queue = queue.SimpleQueue()
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with contextlib.closing(self._connect()) as con:
+            con.executescript(_SCHEMA)
+        self._writer = threading.Thread(target=self._write_loop, name="sil-perf-log", daemon=True)
+        self._writer.start()
+
+    def _connect(self):
+        con = sqlite3.connect(self.path, timeout=10, check_same_thread=False)
+        con.execute("PRAGMA journal_mode=WAL")
+        con.execute("PRAGMA synchronous=NORMAL")
+        return con
+
+    def record(self, run):
+        """Queue a finished `Run` for writing; returns immediately."""
+        self._queue.put(run)
+
+    def flush(self, timeout=5):
+        """Wait until every run recorded so far is on disk."""
+        written = threading.Event()
+        self._queue.put(written)
+        return written.wait(timeout)
+
+    def _write_loop(self):
+        con, since_prune = self._connect(), 0
+        while True:
+            batch = [self._queue.get()]
+            with contextlib.suppress(queue.Empty):
+                while True:
+                    batch.append(self._queue.get_nowait())
+            runs = [item for item in batch if isinstance(item, Run)]
+            try:
+                with con:
+                    for current in runs:
+                        run_id = con.execute(
+                            "INSERT INTO runs (ts, page, status, total_ms, rss_mb, rss_delta_mb) VALUES (?, ?, ?, ?, ?, ?)",
+                            (current.ts, current.page, current.status, current.total_ms, current.rss_mb,
+                             current.rss_delta_mb),
+                        ).lastrowid
+                        con.executemany("INSERT INTO stages VALUES (?, ?, ?, ?, ?)",
+                                        [(run_id, seq, *entry) for seq, entry in enumerate(current.stages)])
+                    since_prune += len(runs)
+                    if since_prune >= PRUNE_EVERY:
+                        self._prune(con)
+                        since_prune = 0
+            except sqlite3.Error:
+                pass  # timings are best-effort: a locked or full disk must not break the app
+            for item in batch:
+                if isinstance(item, threading.Event):
+                    item.set()
+
+    def _prune(self, con):
+        (last,) = con.execute("SELECT coalesce(max(id), 0) FROM runs").fetchone()
+        con.execute("DELETE FROM runs WHERE id <= ?", (last - self.max_runs,))
+        con.execute("DELETE FROM stages WHERE run_id <= ?", (last - self.max_runs,))
+
+    def _read(self, sql, since, page):
+        import pandas as pd
+
+        clauses, params = ["runs.ts >= ?"], [since or 0]
+        if page is not None:
+            clauses.append("runs.page = ?")
+            params.append(page)
+        with contextlib.closing(self._connect()) as con:
+            df = pd.read_sql_query(f"{sql} WHERE {' AND '.join(clauses)} ORDER BY runs.id", con, params=params)
+        df["ts"] = pd.to_datetime(df["ts"], unit="s")
+        return df
+
+    def runs(self, since=None, page=None):
+        """Reruns since the unix time `since` (all by default), oldest first."""
+        return self._read("SELECT * FROM runs", since, page)
+
+    def stages(self, since=None, page=None):
+        """Stages of those reruns, with the rerun's ts and page."""
+        return self._read("SELECT runs.ts, runs.page, stages.* FROM stages JOIN runs ON runs.id = stages.run_id",
+                          since, page)
+
+
+def percentiles(df, by, value="ms", q=PERCENTILES):
+    """Count, p50/p90/p99 (for the default `q`) and max of `value` per `by` group."""
+    grouped = df.groupby(by, sort=False)[value]
+    out = grouped.quantile(list(q)).unstack()
+    out.columns = [f"p{round(p * 100)}" for p in q]
+    out.insert(0, "count", grouped.size())
+    out["max"] = grouped.max()
+    return out.reset_index()
+
+
+def stage_totals(stages):
+    """Time and RSS delta per (rerun, stage): a stage can run more than once per rerun (e.g. two lookups)."""
+    return stages.groupby(["run_id", "page", "stage"], sort=False)[["ms", "rss_delta_mb"]].sum().reset_index()
+
+
+def benchmark(stages_per_run=10, reruns=2000):
+    """Print the cost of a stage and of a recorded rerun against a scratch log."""
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        log = PerfLog(os.path.join(tmp, "perf.sqlite"))
+        start = time.perf_counter()
+        for _ in range(reruns):
+            with run("benchmark", log):
+                for i in range(stages_per_run):
+                    with stage(f"stage {i}"):
+                        pass
+        elapsed = time.perf_counter() - start
+        start = time.perf_counter()
+        log.flush(timeout=None)
+        drain = time.perf_counter() - start
+        per_run_us = elapsed / reruns * 1e6
+        print(f"{reruns:,} reruns x {stages_per_run} stages: {per_run_us:.0f} µs per rerun "
+              f"({per_run_us / stages_per_run:.1f} µs per stage) on the page thread; "
+              f"writer drained the rest in {drain * 1000:.0f} ms")
+
+        start = time.perf_counter()
+        for _ in range(reruns * stages_per_run):
+            with stage("outside a run"):
+                pass
+        print(f"stage outside a run: {(time.perf_counter() - start) / (reruns * stages_per_run) * 1e6:.2f} µs")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Summarise or benchmark the page performance log.")
+    parser.add_argument("--log", default=PERF_LOG_PATH)
+    parser.add_argument("--hours", type=float, help="only reruns from the last N hours")
+    parser.add_argument("--benchmark", action="store_true", help="measure instrumentation overhead instead")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark()
+    else:
+        log = PerfLog(args.log)
+        since = time.time() - args.hours * 3600 if args.hours else None
+        runs, stages = log.runs(since), log.stages(since)
+        if runs.empty:
+            print(f"No reruns recorded in {args.log}")
+        else:
+            print(percentiles(runs, "page", "total_ms").round(1).to_string(index=False))
+            print()
+            print(percentiles(stage_totals(stages), ["page", "stage"]).round(1).to_string(index=False))
@@ -0,0 +1,289 @@
+"""
+Bulk loader for the `spotify_tracks` table of the SQL study.
+
+Loads the cleaned tracks (the store's base columns, or a cleaned CSV) into
+PostgreSQL the way bulk loads should be done:
+
+1. create the table from `sql/create_table.sql` (or keep it with --append);
+2. drop the benchmark indexes of `02_indexed_queries.sql`, so rows are not
+   inserted into four B-trees one at a time;
+3. stream the rows with `COPY ... FROM STDIN (FORMAT csv)` in batches of
+   BATCH_ROWS, spread over `workers` connections (Arrow encodes each batch
+   to CSV without holding the GIL, so the workers overlap encoding with the
+   server's parsing);
+4. rebuild the indexes from sorted data, one connection per index, with a
+   larger `maintenance_work_mem`;
+5. `ANALYZE` so the planner sees the new row counts and histograms.
+
+The report gives COPY rows/s and the time to build each index.
+
+Without a server (no DSN, psycopg2 missing or the connection refused) the
+same steps run against an embedded DuckDB file instead, so the SQL study
+still has a populated, indexed table. `--throwaway` starts a temporary
+local cluster with `initdb` / `pg_ctl` for the duration of the load, which
+is what checks and CI runs use.
+
+    python -m scripts.pg_load --pg-dsn postgresql://localhost/spotify   # or SIL_PG_DSN
+    python -m scripts.pg_load --throwaway --scale 1.2M                  # temporary cluster, synthetic rows
+    python -m scripts.pg_load                                           # no server: data/spotify_tracks.duckdb
+"""
+
+import argparse
+import contextlib
+import glob
+import io
+import os
+import re
+import shutil
+import socket
+import subprocess
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import pyarrow as pa
+import pyarrow.csv as pacsv
+
+from scripts.bench_engines import SQL_DIR, TABLE, split_statements
+from scripts.track_store import BASE_COLUMNS, DATA_DIR, PROJECT_ROOT, open_store, read_source_csv
+
+CREATE_TABLE_SQL = os.path.join(PROJECT_ROOT, "sql", "create_table.sql")
+INDEX_SQL = os.path.join(SQL_DIR, "02_indexed_queries.sql")
+EMBEDDED_PATH = os.path.join(DATA_DIR, "spotify_tracks.duckdb")
+BATCH_ROWS = 100_000
+WORKERS = min(4, os.cpu_count() or 1)
+MAINTENANCE_WORK_MEM = "512MB"
+
+
+def index_statements(path=INDEX_SQL):
+    """{index name: CREATE INDEX statement} of a SQL file, in file order."""
+    with open(path) as f:
+        statements = [s for s in split_statements(f.read()) if s.upper().startswith("CREATE INDEX")]
+    return {re.search(r"INDEX\s+(?:IF NOT EXISTS\s+)?(\w+)", s, re.I).group(1): s for s in statements}
+
+
+def _csv_bytes(batch):
+    buffer = io.BytesIO()
+    pacsv.write_csv(batch, buffer, pacsv.WriteOptions(include_header=False))
+    buffer.seek(0)
+    return buffer
+
+
+class PostgresTarget:
+    name = "postgres"
+
+    def __init__(self, dsn, workers=WORKERS):
+        import psycopg2
+
+        self.dsn = dsn
+        self.workers = workers
+        self._connect = psycopg2.connect
+        self.con = self.connect()
+
+    def connect(self):
+        con = self._connect(self.dsn)
+        con.autocommit = True
+        # A crash mid-load means reloading anyway; do not wait for WAL flushes per batch.
+        con.cursor().execute("SET synchronous_commit TO off")
+        return con
+
+    def execute(self, statement):
+        self.con.cursor().execute(statement)
+
+    def copy(self, batches):
+        """COPY the batches on `workers` connections; returns the row count."""
+        local = threading.local()
+        connections = []
+        lock = threading.Lock()
+
+        def copy_batch(batch):
+            if not hasattr(local, "con"):
+                local.con = self.connect()
+                with lock:
+                    connections.append(local.con)
+            local.con.cursor().copy_expert(f"COPY {TABLE} ({', '.join(batch.schema.names)}) FROM STDIN WITH (FORMAT csv)",
+                                           _csv_bytes(batch), size=1 << 20)
+            return batch.num_rows
+
+        try:
+            with ThreadPoolExecutor(self.workers) as pool:
+                return sum(pool.map(copy_batch, batches))
+        finally:
+            for con in connections:
+                con.close()
+
+    def create_indexes(self, statements):
+        """Build the indexes concurrently (one connection each); returns seconds per index."""
+        def build(statement):
+            con = self.connect()
+            try:
+                cur = con.cursor()
+                cur.execute(f"SET maintenance_work_mem TO '{MAINTENANCE_WORK_MEM}'")
+                start = time.perf_counter()
+                cur.execute(statement)
+                return time.perf_counter() - start
+            finally:
+                con.close()
+
+        with ThreadPoolExecutor(max(1, min(self.workers, len(statements)))) as pool:
+            return dict(zip(statements, pool.map(build, statements.values())))
+
+    def close(self):
+        self.con.close()
+
+
+class DuckDBTarget:
+    """Embedded fallback: the same load steps against a DuckDB database file."""
+
+    name = "duckdb"
+
+    def __init__(self, path=EMBEDDED_PATH, workers=WORKERS):
+        import duckdb
+
+        self.path = path
+        self.workers = workers
+        self.con = duckdb.connect(path)
+        self.con.execute(f"SET threads TO {workers}")
+
+    def execute(self, statement):
+        # PostgreSQL's FLOAT is double precision; DuckDB's is 4 bytes.
+        self.con.execute(re.sub(r"\bFLOAT\b", "DOUBLE", statement))
+
+    def copy(self, batches):
+        rows = 0
+        for batch in batches:
+            self.con.register("copy_batch", batch)
+            self.con.execute(f"INSERT INTO {TABLE} ({', '.join(batch.schema.names)}) SELECT * FROM copy_batch")
+            self.con.unregister("copy_batch")
+            rows += batch.num_rows
+        return rows
+
+    def create_indexes(self, statements):
+        seconds = {}
+        for name, statement in statements.items():
+            start = time.perf_counter()
+            self.con.execute(statement)
+            seconds[name] = time.perf_counter() - start
+        return seconds
+
+    def close(self):
+        self.con.close()
+
+
+def _pg_bin(name):
+    found = shutil.which(name) or sorted(glob.glob(f"/usr/lib/postgresql/*/bin/{name}"))
+    return found if isinstance(found, str) else (found[-1] if found else None)
+
+
+@contextlib.contextmanager
+def temporary_postgres():
+    """A scratch PostgreSQL cluster on a unix socket in a temp dir; yields its DSN, removed on exit."""
+    initdb, pg_ctl = _pg_bin("initdb"), _pg_bin("pg_ctl")
+    if not initdb or not pg_ctl:
+        raise FileNotFoundError("initdb / pg_ctl not found; install PostgreSQL or pass --pg-dsn")
+    with tempfile.TemporaryDirectory(prefix="sil-pg-") as tmp:
+        data = os.path.join(tmp, "data")
+        subprocess.run([initdb, "-D", data, "-A", "trust", "-U", "postgres"], check=True, capture_output=True)
+        with socket.socket() as probe:
+            probe.bind(("127.0.0.1", 0))
+            port = probe.getsockname()[1]
+        options = f"-k {tmp} -p {port} -c listen_addresses='' -c fsync=off -c full_page_writes=off"
+        subprocess.run([pg_ctl, "-D", data, "-o", options, "-l", os.path.join(tmp, "log"), "-w", "start"],
+                       check=True, capture_output=True)
+        try:
+            yield f"host={tmp} port={port} dbname=postgres user=postgres"
+        finally:
+            subprocess.run([pg_ctl, "-D", data, "-m", "immediate", "stop"], capture_output=True)
+
+
+def open_target(pg_dsn=None, workers=WORKERS, embedded_path=EMBEDDED_PATH):
+    """PostgreSQL at `pg_dsn` (or SIL_PG_DSN), else the embedded DuckDB file; returns (target, fallback reason)."""
+    pg_dsn = pg_dsn or os.environ.get("SIL_PG_DSN")
+    if not pg_dsn:
+        return DuckDBTarget(embedded_path, workers), "no PostgreSQL DSN given"
+    try:
+        return PostgresTarget(pg_dsn, workers), None
+    except ImportError:
+        reason = "psycopg2 is not installed"
+    except Exception as exc:  # psycopg2.OperationalError: server down, bad credentials...
+        reason = f"cannot connect to PostgreSQL ({str(exc).strip().splitlines()[0]})"
+    return DuckDBTarget(embedded_path, workers), reason
+
+
+def load(table, target, append=False, batch_rows=BATCH_ROWS):
+    """Bulk-load an Arrow table with BASE_COLUMNS into `target`; returns timings and rates."""
+    indexes = index_statements()
+    stats = {"engine": target.name, "rows": table.num_rows, "workers": target.workers}
+
+    start = time.perf_counter()
+    if not append:
+        with open(CREATE_TABLE_SQL) as f:
+            for statement in split_statements(f.read()):
+                target.execute(statement)
+    for name in indexes:
+        target.execute(f"DROP INDEX IF EXISTS {name}")
+    stats["prepare_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    table = table.select(BASE_COLUMNS)
+    target.copy(iter(table.to_batches(max_chunksize=batch_rows)))
+    stats["copy_s"] = time.perf_counter() - start
+    stats["rows_per_s"] = table.num_rows / stats["copy_s"]
+
+    start = time.perf_counter()
+    stats["index_s"] = target.create_indexes(indexes)
+    stats["index_wall_s"] = time.perf_counter() - start
+
+    start = time.perf_counter()
+    target.execute(f"ANALYZE {TABLE}")
+    stats["analyze_s"] = time.perf_counter() - start
+    return stats
+
+
+def report(stats):
+    print(f"{stats['engine']}: {stats['rows']:,} rows in {stats['copy_s']:.2f}s "
+          f"= {stats['rows_per_s']:,.0f} rows/s ({stats['workers']} workers)")
+    for name, seconds in stats["index_s"].items():
+        print(f"  {name:26s} {seconds:7.2f}s")
+    print(f"  indexes total (wall)       {stats['index_wall_s']:7.2f}s")
+    print(f"  ANALYZE                    {stats['analyze_s']:7.2f}s")
+
+
+def _dataset(args):
+    if args.scale:
+        from scripts.synthetic_tracks import SCALE_FACTORS, synthetic_tracks
+
+        return synthetic_tracks(SCALE_FACTORS[args.scale], with_derived=False)
+    if args.source:
+        return read_source_csv(args.source)
+    return open_store(BASE_COLUMNS)
+
+
+if __name__ == "__main__":
+    from scripts.synthetic_tracks import SCALE_FACTORS
+
+    parser = argparse.ArgumentParser(description="Bulk-load the cleaned tracks into PostgreSQL (or DuckDB).")
+    parser.add_argument("--pg-dsn", help="PostgreSQL DSN (defaults to SIL_PG_DSN)")
+    parser.add_argument("--throwaway", action="store_true", help="load into a temporary local cluster")
+    parser.add_argument("--source", help="cleaned tracks CSV (default: the track store)")
+    parser.add_argument("--scale", choices=list(SCALE_FACTORS), help="load synthetic rows instead")
+    parser.add_argument("--workers", type=int, default=WORKERS, help="parallel COPY connections")
+    parser.add_argument("--batch-rows", type=int, default=BATCH_ROWS)
+    parser.add_argument("--append", action="store_true", help="keep the existing table and its rows")
+    parser.add_argument("--embedded", default=EMBEDDED_PATH, help="DuckDB file used when there is no server")
+    args = parser.parse_args()
+
+    table = _dataset(args)
+    with contextlib.ExitStack() as stack:
+        dsn = args.pg_dsn
+        if args.throwaway:
+            try:
+                dsn = stack.enter_context(temporary_postgres())
+            except (FileNotFoundError, subprocess.CalledProcessError) as exc:
+                print(f"No throwaway PostgreSQL ({exc}); using the embedded engine")
+        target, reason = open_target(dsn, args.workers, args.embedded)
+        stack.callback(target.close)
+        if reason:
+            print(f"Falling back to DuckDB at {args.embedded}: {reason}")
+        report(load(table, target, args.append, args.batch_rows))
@@ -0,0 +1,408 @@
+"""
+Pluggable query backends for the UI pages.
+
+Pages describe what they need (range filters, a cluster selection, yearly
+means, top-N values, album search and track lookups) and the backend decides
+how to run it:
+
+- ``pandas``: in-process over the shared TrackStore frames; range filters go
+  through TrackFilterIndex and album/track lookups through TrackLookup.
+- ``duckdb``: SQL inside an embedded DuckDB over the store's Parquet parts.
+  Projection and predicate pushdown (plus per-row-group min/max stats) mean
+  only the referenced columns are decoded and only result rows come back
+  into Python. Sidecar columns (e.g. promotion scores) are joined in by id
+  only when a request references them.
+
+Result tables come back one page at a time: ``offset``/``limit`` plus an
+optional sort column are applied by the backend, so only the visible rows are
+materialised. Exports stream every matching row as Arrow batches instead.
+
+Pick one with the ``SIL_QUERY_BACKEND`` environment variable or the sidebar
+selector, which makes A/B timing between the two a one-click switch.
+
+Given a ``ResultCache`` (``scripts/result_cache.py``), a backend serves
+repeated requests from it and materializes the filtered subsets behind paged
+results (row ids in pandas, a table of the matching rows in DuckDB), so
+paging and re-sorting a filter never rescans the store.
+"""
+
+import itertools
+import os
+import threading
+
+import numpy as np
+
+from scripts import exports, track_store
+from scripts.result_cache import normalize_params, normalize_sql
+from scripts.track_filter import FILTER_COLUMNS, TrackFilterIndex
+from scripts.track_lookup import TOP_MATCHES, TrackLookup
+
+BACKENDS = ("pandas", "duckdb")
+DEFAULT_BACKEND = os.environ.get("SIL_QUERY_BACKEND", "pandas")
+# Largest filtered subset DuckDB materializes, as a share of the result cache budget.
+MATERIALIZE_SHARE = 0.25
+# DuckDB's store row order: part, then row within the part. Every paged query ends its ORDER BY with it.
+ROW_ORDER = "file_index, file_row_number"
+
+
+class PandasBackend:
+    name = "pandas"
+
+    def __init__(self, store, cache=None):
+        self.store = store
+        self.cache = cache
+        self._filter_index = None
+        self._lookup = None
+        self._lock = threading.Lock()
+
+    @property
+    def filter_index(self):
+        with self._lock:
+            if self._filter_index is None:
+                self._filter_index = TrackFilterIndex.from_frame(self.store.frame(FILTER_COLUMNS))
+        return self._filter_index
+
+    @property
+    def lookup(self):
+        with self._lock:
+            if self._lookup is None:
+                self._lookup = TrackLookup(self.store.table.select(["album", "name", "artists"]))
+        return self._lookup
+
+    def warm(self):
+        """Build the lazy indexes now (the app's warm-up thread) instead of on the first query."""
+        return self.filter_index, self.lookup
+
+    def _rows(self, rows, columns):
+        return self.store.frame(columns).iloc[rows].reset_index(drop=True)
+
+    def _page(self, rows, offset, limit, sort, descending):
+        """One page of `rows` (matching row ids in row order), ordered by the `sort` column when given."""
+        end = len(rows) if limit is None else min(offset + limit, len(rows))
+        if sort is None:
+            return rows[offset:end]
+        return rows[_page_order(self.store.column(sort).to_numpy()[rows], offset, end, descending)]
+
+    def _batches(self, rows, columns, batch_rows):
+        table = self.store.table.select(columns)
+        return exports.batch_reader(table.schema, (table.take(rows[start:start + batch_rows])
+                                                   for start in range(0, len(rows), batch_rows)))
+
+    def _filter_rows(self, ranges):
+        return _cached(self, "filtered subset", ranges, lambda: self.filter_index.query(ranges, limit=None).rows)
+
+    def filter_tracks(self, ranges, columns, offset=0, limit=None, sort=None, descending=False):
+        """Rows matching inclusive `(lo, hi)` ranges on FILTER_COLUMNS; returns (count, frame)."""
+        def run():
+            if sort is None and self.cache is None:
+                result = self.filter_index.query(ranges, offset=offset, limit=limit)
+                return result.count, self._rows(result.rows, columns)
+            rows = self._filter_rows(ranges)
+            return len(rows), self._rows(self._page(rows, offset, limit, sort, descending), columns)
+
+        return _cached(self, "filter_tracks", (ranges, columns, offset, limit, sort, descending), run)
+
+    def filter_batches(self, ranges, columns, batch_rows=exports.BATCH_ROWS):
+        """All rows matching `ranges` as a stream of Arrow tables, for exports."""
+        return self._batches(self._filter_rows(ranges), columns, batch_rows)
+
+    def cluster_ids(self):
+        return _cached(self, "cluster_ids", (), lambda: np.unique(self.store.column("cluster").to_numpy()).tolist())
+
+    def cluster_tracks(self, cluster, columns, offset=0, limit=None, sort=None, descending=False):
+        """One page of the tracks in `cluster`; returns (count, frame)."""
+        def run():
+            rows = _cached(self, "cluster subset", cluster,
+                           lambda: np.flatnonzero(self.store.column("cluster").to_numpy() == cluster))
+            return len(rows), self._rows(self._page(rows, offset, limit, sort, descending), columns)
+
+        return _cached(self, "cluster_tracks", (cluster, columns, offset, limit, sort, descending), run)
+
+    def yearly_means(self, features):
+        def run():
+            df = self.store.frame(["year"] + features)
+            return df.groupby("year")[features].mean().reset_index()
+
+        return _cached(self, "yearly_means", features, run)
+
+    def top_values(self, column, k=10):
+        return _cached(self, "top_values", (column, k), lambda: self.store.column(column).value_counts().nlargest(k))
+
+    def albums(self):
+        return _cached(self, "albums", (), lambda: self.lookup.albums.tolist())
+
+    def search_albums(self, query, limit=TOP_MATCHES):
+        """Albums matching `query` as a prefix of the album, a track or an artist name."""
+        return self.lookup.search_albums(query, limit)
+
+    def album_tracks(self, album):
+        return self.lookup.album_tracks(album)
+
+    def track_row(self, album, name, columns):
+        return self.store.frame(columns).iloc[self.lookup.row(album, name)]
+
+    def top_tracks(self, score, k, filters, columns):
+        """The `k` rows with the highest `score`, restricted to `column == value` filters."""
+        def run():
+            df = self.store.frame(columns + [score])
+            mask = np.ones(len(df), dtype=bool)
+            for name, value in filters.items():
+                mask &= self.store.column(name).to_numpy() == value
+            return df[mask].nlargest(k, score).reset_index(drop=True)
+
+        return _cached(self, "top_tracks", (score, k, filters, columns), run)
+
+
+class DuckDBBackend:
+    name = "duckdb"
+
+    def __init__(self, store, cache=None):
+        self.store = store
+        self.cache = cache
+        self._subsets = itertools.count()
+        parts = store.manifest["parts"]
+        if any("parquet" not in part for part in parts):
+            raise RuntimeError("Store has no Parquet parts; rebuild it with `python -m scripts.csv_to_parquet`.")
+        files = ", ".join(_literal(os.path.join(store.store_dir, part["parquet"])) for part in parts)
+        # Sidecar columns replace base columns of the same name (e.g. re-fitted clusters).
+        overridden = [c for info in store.sidecars.values() for c in info["columns"] if c in store.manifest["schema"]]
+        exclude = f" EXCLUDE ({', '.join(overridden)})" if overridden else ""
+        # Rows superseded by a refresh are (part, row) pairs: part is the file's index in `files`.
+        deleted = store.manifest.get("deleted")
+        anti = (" ANTI JOIN (SELECT part AS file_index, row AS file_row_number FROM read_parquet("
+                f"{_literal(os.path.join(store.store_dir, deleted['path']))})) USING (file_index, file_row_number)"
+                if deleted else "")
+        self._con = duckdb_connect()
+        # file_index and file_row_number give ROW_ORDER, the row order of the pandas backend.
+        self._con.execute(f"CREATE VIEW tracks AS SELECT *{exclude}, file_index "
+                          f"FROM read_parquet([{files}], file_row_number = true){anti}")
+        for name, info in store.sidecars.items():
+            path = _literal(track_store.sidecar_path(name, store.store_dir, ".parquet"))
+            source = f"SELECT * FROM read_parquet({path})"
+            if info.get("delta_rows"):
+                # Rows a refresh appended override the base file's values of the same ids.
+                delta = f"read_parquet({_literal(track_store.sidecar_path(name, store.store_dir, '.delta.parquet'))})"
+                source = (f"SELECT * FROM read_parquet({path}) base ANTI JOIN {delta} delta USING (id) "
+                          f"UNION ALL SELECT * FROM {delta}")
+            self._con.execute(f'CREATE VIEW "{name}" AS {source}')
+
+    def warm(self):
+        """Open the Parquet parts once (reading their footers) before the first page query."""
+        return self._execute("SELECT count(*) FROM tracks").fetchone()
+
+    def _execute(self, sql, params=()):
+        # One cursor per call: cursors are cheap and safe to use from concurrent sessions.
+        cursor = self._con.cursor()
+        try:
+            return cursor.execute(sql, list(params))
+        except Exception:
+            cursor.close()
+            raise
+
+    def _df(self, sql, params=()):
+        return self._execute(sql, params).df()
+
+    def _columns(self, columns):
+        unknown = [c for c in columns if c not in self.store.columns]
+        if unknown:
+            raise KeyError(f"Unknown columns: {unknown}")
+        return ", ".join(f'"{c}"' for c in columns)
+
+    def _source(self, columns):
+        """`tracks`, joined by id with the sidecars holding any of `columns`."""
+        joins = [name for name, info in self.store.sidecars.items() if any(c in info["columns"] for c in columns)]
+        return "tracks" + "".join(f' JOIN "{name}" USING (id)' for name in joins)
+
+    def _query(self, kind, sql, params=(), fetch=lambda cursor: cursor.df()):
+        return _cached(self, kind, (normalize_sql(sql), params), lambda: fetch(self._execute(sql, params)))
+
+    def _subset(self, source, where, params):
+        """
+        (table, count) of the rows of `source` matching `where`. With a result
+        cache, `table` is a materialized copy of those rows (the temp-table
+        trick) unless it would take more than MATERIALIZE_SHARE of the budget.
+        """
+        def count():
+            return self._execute(f"SELECT count(*) FROM {source} {where}", params).fetchone()[0]
+
+        def materialize():
+            rows = count()
+            if rows * self._row_bytes() > self.cache.max_bytes * MATERIALIZE_SHARE:
+                return None, rows
+            table = f"_subset_{next(self._subsets)}"
+            self._execute(f"CREATE TABLE {table} AS SELECT * FROM {source} {where}", params).close()
+            return table, rows
+
+        if self.cache is None:
+            return None, count()
+        return _cached(self, "filtered subset", (normalize_sql(f"{source} {where}"), params), materialize,
+                       size=lambda subset: int(subset[1] * self._row_bytes()) if subset[0] else 64,
+                       release=self._drop_subset)
+
+    def _row_bytes(self):
+        return self.store.table.nbytes / max(len(self.store), 1)
+
+    def _drop_subset(self, subset):
+        if subset[0] is not None:
+            self._execute(f"DROP TABLE IF EXISTS {subset[0]}").close()
+
+    def _page(self, kind, columns, source, where, params, offset, limit, sort, descending):
+        """(count, frame) of one page of `SELECT columns FROM source where`, sorted and sliced in DuckDB."""
+        import duckdb
+
+        def select(from_where):
+            sql = f"SELECT {self._columns(columns)} FROM {from_where}"
+            # Without ORDER BY, DuckDB may return the rows of a join in any order, so pages could overlap.
+            order = ROW_ORDER
+            if sort is not None:
+                order = f"{self._columns([sort])} {'DESC' if descending else 'ASC'} NULLS LAST, {ROW_ORDER}"
+            sql += f" ORDER BY {order}"
+            if limit is not None:
+                sql += f" LIMIT {int(limit)} OFFSET {int(offset)}"
+            return sql
+
+        def run():
+            table, count = self._subset(source, where, params)
+            if table is not None:
+                try:
+                    return count, self._df(select(table))
+                except duckdb.CatalogException:
+                    pass  # evicted by another session in the meantime
+            return count, self._df(select(f"{source} {where}"), params)
+
+        key = (normalize_sql(select(f"{source} {where}")), params)
+        return _cached(self, kind, key, run)
+
+    def _batches(self, sql, params, batch_rows):
+        cursor = self._execute(sql, params)
+        reader = cursor.fetch_record_batch(batch_rows)
+
+        def batches():
+            try:
+                yield from reader
+            finally:
+                cursor.close()
+
+        return exports.batch_reader(reader.schema, batches())
+
+    def filter_tracks(self, ranges, columns, offset=0, limit=None, sort=None, descending=False):
+        where, params = _where(ranges, self.store.columns)
+        source = self._source(list(columns) + list(ranges) + ([sort] if sort else []))
+        return self._page("filter_tracks", columns, source, where, params, offset, limit, sort, descending)
+
+    def filter_batches(self, ranges, columns, batch_rows=exports.BATCH_ROWS):
+        where, params = _where(ranges, self.store.columns)
+        sql = f"SELECT {self._columns(columns)} FROM {self._source(list(columns) + list(ranges))} {where}"
+        return self._batches(sql, params, batch_rows)
+
+    def cluster_ids(self):
+        sql = f"SELECT DISTINCT cluster FROM {self._source(['cluster'])} ORDER BY cluster"
+        return self._query("cluster_ids", sql, fetch=lambda cursor: [row[0] for row in cursor.fetchall()])
+
+    def cluster_tracks(self, cluster, columns, offset=0, limit=None, sort=None, descending=False):
+        source = self._source(columns + ["cluster"] + ([sort] if sort else []))
+        return self._page("cluster_tracks", columns, source, "WHERE cluster = ?", [int(cluster)], offset, limit, sort,
+                          descending)
+
+    def yearly_means(self, features):
+        means = ", ".join(f'avg("{f}") AS "{f}"' for f in features)
+        self._columns(features)
+        return self._query("yearly_means", f"SELECT year, {means} FROM {self._source(features)} GROUP BY year ORDER BY year")
+
+    def top_values(self, column, k=10):
+        col = self._columns([column])
+        df = self._query("top_values", f"SELECT {col}, count(*) AS count FROM {self._source([column])} "
+                                       f"GROUP BY {col} ORDER BY count DESC LIMIT {int(k)}")
+        return df.set_index(column)["count"]
+
+    def albums(self):
+        return self._query("albums", "SELECT DISTINCT album FROM tracks ORDER BY album",
+                           fetch=lambda cursor: [row[0] for row in cursor.fetchall()])
+
+    def search_albums(self, query, limit=TOP_MATCHES):
+        # An artist name starts right after a quote inside the "['A', 'B']" list string.
+        match = ("starts_with(lower(album), $1)", "starts_with(lower(name), $1)",
+                 "contains(lower(artists), '''' || $1) OR contains(lower(artists), '\"' || $1)")
+        sql = (f"SELECT album FROM tracks WHERE {' OR '.join(match)} GROUP BY album "
+               f"ORDER BY min(CASE WHEN {match[0]} THEN 0 WHEN {match[1]} THEN 1 ELSE 2 END), album LIMIT {int(limit)}")
+        return [row[0] for row in self._execute(sql, [query.strip().lower()]).fetchall()]
+
+    def album_tracks(self, album):
+        rows = self._execute("SELECT DISTINCT name FROM tracks WHERE album = ? ORDER BY name", [album]).fetchall()
+        return [row[0] for row in rows]
+
+    def track_row(self, album, name, columns):
+        df = self._df(f"SELECT {self._columns(columns)} FROM {self._source(columns)} "
+                      f"WHERE album = ? AND name = ? ORDER BY {ROW_ORDER} LIMIT 1", [album, name])
+        return df.iloc[0]
+
+    def top_tracks(self, score, k, filters, columns):
+        where = " AND ".join(f"{self._columns([name])} = ?" for name in filters)
+        sql = (f"SELECT {self._columns(columns + [score])} FROM {self._source(columns + [score] + list(filters))} "
+               f"{'WHERE ' + where if where else ''} ORDER BY {self._columns([score])} DESC, {ROW_ORDER} "
+               f"LIMIT {int(k)}")
+        return self._query("top_tracks", sql, [int(value) for value in filters.values()])
+
+
+def _cached(backend, kind, key, compute, **kwargs):
+    """`compute()` through the backend's result cache (if any), keyed on the backend, `kind` and normalized `key`."""
+    if backend.cache is None:
+        return compute()
+    # Rewritten sidecars change results as much as a new store version does.
+    store = backend.store
+    version = (store.version, tuple((name, info["written_at"]) for name, info in store.sidecars.items()))
+    return backend.cache.get(version, f"{kind} ({backend.name})", normalize_params(key), compute, **kwargs)
+
+
+def _page_order(values, offset, end, descending):
+    """
+    Positions of `values` ranked [offset, end) in sort order, nulls/NaN last and
+    ties by position; partial sort for early pages.
+    """
+    if values.dtype.kind not in "biuf":
+        import pandas as pd
+
+        # Sort strings by rank, so descending order keeps ties in row order too.
+        codes, _ = pd.factorize(values, sort=True)
+        values = np.where(codes < 0, np.nan, codes)
+    keys = values.astype(np.float64)
+    keys = -keys if descending else keys
+    if 0 < end < len(keys):
+        # Every tie of the last key on the page takes part, so a page is the same however far the sort went.
+        last = np.partition(keys, end - 1)[end - 1]
+        if not np.isnan(last):
+            top = np.flatnonzero(keys <= last)
+            return top[np.argsort(keys[top], kind="stable")][offset:end]
+    return np.argsort(keys, kind="stable")[offset:end]
+
+
+def duckdb_connect(database=":memory:", **kwargs):
+    import duckdb
+
+    return duckdb.connect(database, **kwargs)
+
+
+def _literal(value):
+    return "'" + str(value).replace("'", "''") + "'"
+
+
+def _where(ranges, known_columns):
+    clauses, params = [], []
+    for name, (lo, hi) in ranges.items():
+        if name not in known_columns:
+            raise KeyError(f"Unknown column: {name}")
+        if lo is not None:
+            clauses.append(f'"{name}" >= ?')
+            params.append(lo)
+        if hi is not None:
+            clauses.append(f'"{name}" <= ?')
+            params.append(hi)
+    return ("WHERE " + " AND ".join(clauses)) if clauses else "", params
+
+
+def open_backend(name, store, cache=None):
+    if name == "pandas":
+        return PandasBackend(store, cache)
+    if name == "duckdb":
+        return DuckDBBackend(store, cache)
+    raise ValueError(f"Unknown query backend {name!r}; expected one of {BACKENDS}")
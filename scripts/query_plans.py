@@ -0,0 +1,153 @@
+"""
+Live EXPLAIN / timing capture for the Query Benchmark page.
+
+Runs the benchmark query from `scripts/query_optimization/README.md` in its
+three variants (raw, multi-column index, pre-filtered temp table) against a
+local engine: embedded DuckDB or SQLite, or PostgreSQL when `SIL_PG_DSN` is
+set. Plans and timings are cached on disk keyed by store version, engine,
+host and the exact SQL text, so the page shows numbers for the current data
+and hardware without re-running on every visit.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import platform
+import re
+import time
+
+from scripts.bench_engines import DuckDBEngine, PostgresEngine, SQLiteEngine
+from scripts.run_benchmark import measure
+from scripts.track_store import BASE_COLUMNS, STORE_DIR, open_store, read_manifest
+
+PLAN_CACHE_DIR = "plan_cache"
+
+_AVG = {
+    "postgres": "ROUND(AVG({col})::NUMERIC, 2)",
+    "duckdb": "ROUND(AVG({col}), 2)",
+    "sqlite": "ROUND(AVG({col}), 2)",
+}
+
+
+def benchmark_query(engine, source="spotify_tracks", filtered=True):
+    where = "\nWHERE explicit = true\n  AND energy > 0.8\n  AND danceability > 0.75" if filtered else ""
+    avg = _AVG[engine]
+    return (
+        "SELECT year,\n"
+        "       COUNT(*) AS track_count,\n"
+        f"       {avg.format(col='tempo')} AS avg_tempo,\n"
+        f"       {avg.format(col='valence')} AS avg_valence\n"
+        f"FROM {source}{where}\n"
+        "GROUP BY year\n"
+        "ORDER BY track_count DESC\n"
+        "LIMIT 5"
+    )
+
+
+def variants(engine):
+    """(name, setup statements, query) for the raw, indexed and temp-table runs, in order."""
+    return [
+        ("raw", [], benchmark_query(engine)),
+        ("indexed",
+         ["CREATE INDEX idx_explicit_energy_dance ON spotify_tracks(explicit, energy, danceability)"],
+         benchmark_query(engine)),
+        ("temp_table",
+         ["CREATE TEMP TABLE temp_explicit_energy_dance AS SELECT * FROM spotify_tracks "
+          "WHERE explicit = true AND energy > 0.8 AND danceability > 0.75"],
+         benchmark_query(engine, "temp_explicit_energy_dance", filtered=False)),
+    ]
+
+
+def available_engines():
+    engines = ["duckdb", "sqlite"]
+    if os.environ.get("SIL_PG_DSN"):
+        engines.append("postgres")
+    return engines
+
+
+def _open_engine(name):
+    if name == "duckdb":
+        return DuckDBEngine()
+    if name == "sqlite":
+        return SQLiteEngine()
+    if name == "postgres":
+        return PostgresEngine(os.environ["SIL_PG_DSN"])
+    raise ValueError(f"Unknown engine {name!r}")
+
+
+def explain(engine, query):
+    """Return (plan text, engine-reported execution time in ms or None)."""
+    if engine.name == "duckdb":
+        plan = engine.execute("EXPLAIN ANALYZE " + query).fetchall()[0][1]
+        match = re.search(r"Total Time: ([\d.]+)s", plan)
+        return plan, float(match.group(1)) * 1000 if match else None
+    if engine.name == "postgres":
+        plan = "\n".join(row[0] for row in engine.query("EXPLAIN (ANALYZE, BUFFERS) " + query))
+        match = re.search(r"Execution Time: ([\d.]+) ms", plan)
+        return plan, float(match.group(1)) if match else None
+    # SQLite has no EXPLAIN ANALYZE: show the query plan tree, timing comes from the harness.
+    rows = engine.query("EXPLAIN QUERY PLAN " + query)
+    depth = {0: -1}
+    lines = []
+    for node_id, parent, _, detail in rows:
+        depth[node_id] = depth.get(parent, -1) + 1
+        lines.append("  " * depth[node_id] + "-> " + detail)
+    return "\n".join(lines), None
+
+
+def _cache_key(engine, version):
+    text = json.dumps([engine, version, platform.node(), os.cpu_count(), variants(engine)])
+    return hashlib.sha256(text.encode()).hexdigest()[:20]
+
+
+def capture(engine_name, store_dir=STORE_DIR, repeat=20, refresh=False):
+    """Plans and timings for every variant on `engine_name`, served from cache unless `refresh`."""
+    version = read_manifest(store_dir)["version"]
+    cache_dir = os.path.join(store_dir, PLAN_CACHE_DIR)
+    cache_path = os.path.join(cache_dir, f"{engine_name}-{_cache_key(engine_name, version)}.json")
+    if not refresh and os.path.exists(cache_path):
+        with open(cache_path) as f:
+            return json.load(f)
+
+    engine = _open_engine(engine_name)
+    try:
+        table = open_store(BASE_COLUMNS, store_dir=store_dir)
+        start = time.perf_counter()
+        engine.load(table)
+        load_ms = (time.perf_counter() - start) * 1000
+        results = []
+        for name, setup, query in variants(engine_name):
+            engine.setup(setup)
+            rows = engine.query(query)
+            timing = measure(lambda: engine.query(query), warmup=2, repeat=repeat)
+            plan, reported_ms = explain(engine, query)
+            results.append({
+                "variant": name,
+                "setup": setup,
+                "query": query,
+                "plan": plan,
+                "engine_ms": reported_ms,
+                "timing": timing,
+                "rows": [list(map(_jsonable, row)) for row in rows],
+            })
+    finally:
+        engine.close()
+
+    captured = {
+        "engine": engine_name,
+        "data_version": version,
+        "host": platform.node(),
+        "captured_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "rows_loaded": table.num_rows,
+        "load_ms": load_ms,
+        "variants": results,
+    }
+    os.makedirs(cache_dir, exist_ok=True)
+    with open(cache_path, "w") as f:
+        json.dump(captured, f, indent=2)
+    return captured
+
+
+def _jsonable(value):
+    return value if isinstance(value, (int, float, str, type(None))) else float(value)
@@ -0,0 +1,521 @@
+"""
+Incremental catalogue refresh from a delta file.
+
+A delta holds new and updated tracks keyed by `id`: a cleaned / uplift CSV,
+a raw `tracks_features.csv`-style CSV (cleaned on the way in) or a Parquet
+file with the store columns. `refresh` folds it into the store without a
+rebuild:
+
+- the delta's rows, new and updated tracks alike, are written as one part
+  appended to the part list (`tracks/delta/`); nothing already written is
+  copied;
+- the rows it updates are superseded, not rewritten: their (part, row)
+  positions go to the manifest's `deleted` file, and readers drop them
+  (`track_store.deleted_rows`; an anti-join in the DuckDB backend). An
+  updated track therefore moves to the end of the row order;
+- derived values (cluster, t-SNE coordinates, promotion label and score) are
+  computed for the delta rows only, with the artifacts recorded in each
+  sidecar's metadata, and appended to the sidecars' delta files. Sidecars
+  ingested from the CSV take the delta's own columns when it carries them,
+  and otherwise the artifacts the build fitted to the CSV's values;
+- the dashboard rollups are updated from the delta and the rows it replaces
+  (`scripts.rollups.update_rollups`), and the artist index is patched
+  (`scripts.artist_index.patch_artist_index`);
+- the manifest gets a new data version, which every UI cache keys on.
+
+Work scales with the delta; what is left of O(store) is the vectorized id
+probe. Superseded rows cost readers a filter, and each delta part is one
+more file for DuckDB, so once they pass COMPACT_SHARE / COMPACT_PARTS the
+refresh ends with `compact_store`, which rewrites the live rows as year
+parts (`--compact` runs it on demand). A sidecar whose model changed since
+it was written (e.g. a retrained promotion model), or which refresh cannot
+derive, stays at the old version and readers ignore it until it is rebuilt.
+The similar-tracks index is per version: rebuild it with
+`python -m scripts.similarity`, or pass `--similarity`. Files replaced by a
+refresh or compaction are retired, and deleted by the next one once running
+apps have moved on to the new manifest.
+
+    python -m scripts.refresh data/delta.csv
+    python -m scripts.refresh --compact                         # fold the deltas back into year parts
+    python -m scripts.refresh --benchmark --delta-rows 10000   # vs a full recompute, on a scratch copy
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import re
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.parquet as pq
+
+from scripts import artist_index, batch_scoring, mood_clustering, mood_embedding, rollups, train_promotion
+from scripts.clean_tracks import clean_batch, read_raw_csv
+from scripts.track_store import (
+    BASE_COLUMNS, BASE_SCHEMA, DERIVED_SCHEMA, MANIFEST_NAME, PROJECT_ROOT, SIDECAR_DIR, STORE_DIR, TrackStore,
+    _csv_header, _ingest_artifacts, deleted_rows, drop_rows, file_sha256, open_parts, open_sidecar, open_store,
+    read_manifest, read_source_csv, sidecars, stage_sidecar_delta, write_delta_part, write_parts, write_sidecar,
+)
+
+# Base columns that mirror a sidecar; filled from it when the delta lacks them.
+BASE_DERIVED = {
+    "cluster": mood_clustering.CLUSTER_SIDECAR,
+    "tsne_1": mood_embedding.EMBEDDING_SIDECAR,
+    "tsne_2": mood_embedding.EMBEDDING_SIDECAR,
+    "promoted": train_promotion.LABEL_SIDECAR,
+}
+# Compact once superseded rows exceed this share of the store, or after this many delta parts.
+COMPACT_SHARE = 0.05
+COMPACT_PARTS = 32
+# Sidecars ingested from a CSV that `track_store._ingest_artifacts` can extend to new rows.
+INGEST_DERIVED = (mood_clustering.CLUSTER_SIDECAR, mood_embedding.EMBEDDING_SIDECAR)
+
+
+def read_delta(path):
+    """The delta as a typed table with BASE_SCHEMA (plus any derived columns it carries), one row per id."""
+    if path.endswith(".parquet"):
+        table = pq.read_table(path)
+        missing = [name for name in BASE_COLUMNS if name not in table.column_names]
+        if missing:
+            raise ValueError(f"{path} is missing required columns: {missing}")
+        fields = [field for field in list(BASE_SCHEMA) + list(DERIVED_SCHEMA) if field.name in table.column_names]
+        table = table.select([field.name for field in fields]).cast(pa.schema(fields))
+    elif "duration_ms" in _csv_header(path):
+        table = pa.concat_tables(clean_batch(batch) for batch in read_raw_csv(path))
+    else:
+        table = read_source_csv(path)
+
+    # The last row of an id wins, as if the delta's rows were applied in order.
+    ids = table["id"].to_numpy(zero_copy_only=False)
+    _, last = np.unique(ids[::-1], return_index=True)
+    if len(last) < len(ids):
+        table = table.take(np.sort(len(ids) - 1 - last))
+    return table.combine_chunks()
+
+
+# --- Derived values for the delta rows, with the artifacts the sidecars were written from
+def _artifact(info, default):
+    return os.path.join(PROJECT_ROOT, info["artifact"]) if info.get("artifact") else default
+
+
+def _clusters(table, info):
+    path = _artifact(info, mood_clustering.ARTIFACT_PATH)
+    if not os.path.exists(path):
+        return None
+    return {"cluster": mood_clustering.assign_clusters(table, mood_clustering.load_artifact(path))}
+
+
+def _embedding(table, info):
+    path = _artifact(info, mood_embedding.ARTIFACT_PATH)
+    if not os.path.exists(path):
+        return None
+    coords = mood_embedding.Embedding.load(path).project(table)
+    return {"tsne_1": coords[:, 0], "tsne_2": coords[:, 1]}
+
+
+def _labels(table, info):
+    return {"promoted": train_promotion.synthesize_labels(table, info.get("seed", train_promotion.RANDOM_STATE))}
+
+
+def _scores(table, info):
+    path = os.path.join(PROJECT_ROOT, info["model"]) if info.get("model") else batch_scoring.default_model_path()
+    if not os.path.exists(path):
+        return None
+    # Scores from another model would be mixed with the stored ones: rescore everything instead.
+    if info.get("model_sha256") not in (None, file_sha256(path)):
+        return None
+    booster = batch_scoring.load_model(path).get_booster()
+    return {batch_scoring.SCORE_COLUMN: batch_scoring.score_table(booster, table)}
+
+
+DERIVERS = {
+    mood_clustering.CLUSTER_SIDECAR: _clusters,
+    mood_embedding.EMBEDDING_SIDECAR: _embedding,
+    train_promotion.LABEL_SIDECAR: _labels,
+    batch_scoring.SCORE_SIDECAR: _scores,
+}
+
+
+def _carried(table, info):
+    """The delta's own values of a sidecar ingested from a CSV, when it carries them all."""
+    columns = list(info.get("columns", {}))
+    if not info.get("source") or not columns or any(c not in table.column_names for c in columns):
+        return None
+    if any(table[c].null_count for c in columns):
+        return None
+    return {c: table[c].to_numpy() for c in columns}
+
+
+def derive(table, infos, names):
+    """
+    {sidecar name: {column: values}} for the rows of `table`; None where it
+    cannot be derived. Sidecars ingested from a CSV take the delta's own
+    columns when it has them (an uplift CSV), like the source did.
+    """
+    derived = {}
+    for name in names:
+        info = infos.get(name, {})
+        derived[name] = _carried(table, info)
+        if derived[name] is None and name in DERIVERS:
+            derived[name] = DERIVERS[name](table, info)
+    return derived
+
+
+def _part_number(part):
+    return int(re.search(r"part-(\d+)\.arrow$", part["path"]).group(1))
+
+
+def _replace(path):
+    os.replace(path + ".tmp", path)
+
+
+def _remove_retired(manifest, store_dir):
+    """Delete the files an earlier refresh or compaction replaced; running apps have moved on by now."""
+    for path in manifest.get("retired", []):
+        if os.path.exists(os.path.join(store_dir, path)):
+            os.remove(os.path.join(store_dir, path))
+
+
+def _write_manifest(manifest, store_dir):
+    path = os.path.join(store_dir, MANIFEST_NAME)
+    with open(path + ".tmp", "w") as f:
+        json.dump(manifest, f, indent=2)
+    _replace(path)
+
+
+def needs_compaction(manifest):
+    """Whether superseded rows or delta parts have piled up past COMPACT_SHARE / COMPACT_PARTS."""
+    deltas = [part for part in manifest["parts"] if "year" not in part]
+    superseded = (manifest.get("deleted") or {}).get("rows", 0)
+    return superseded > COMPACT_SHARE * manifest["rows"] or len(deltas) > COMPACT_PARTS
+
+
+def refresh(delta_path, store_dir=STORE_DIR, similarity=False, compact=True):
+    """
+    Fold the delta at `delta_path` into the store, compacting it when deltas
+    have piled up (`needs_compaction`); returns the new version, row counts
+    and stage timings.
+    """
+    stages = {}
+    clock = [time.perf_counter()]
+
+    def lap(name):
+        now = time.perf_counter()
+        stages[name] = round(now - clock[0], 3)
+        clock[0] = now
+
+    manifest = read_manifest(store_dir)
+    _remove_retired(manifest, store_dir)
+    previous, parts, infos = manifest["version"], list(manifest["parts"]), sidecars(store_dir)
+    if any(infos[name].get("source") and not infos[name].get("artifact") for name in INGEST_DERIVED if name in infos):
+        # Stores built before ingest recorded its artifacts: fit them once from the stored values.
+        for name, meta in _ingest_artifacts(TrackStore(store_dir).table, store_dir).items():
+            infos[name] = {**infos[name], **meta}
+    delta = read_delta(delta_path)
+    delta_ids = delta["id"].combine_chunks()
+    lap("read delta")
+
+    # Positions (over the concatenated parts) of the live rows the delta updates, and their row ids.
+    deleted = deleted_rows(manifest, store_dir)
+    hits = pc.is_in(open_parts(parts, ["id"], store_dir)["id"], value_set=delta_ids)
+    superseded = np.setdiff1d(np.flatnonzero(hits.to_numpy(zero_copy_only=False)), deleted, assume_unique=True)
+    removed = superseded - np.searchsorted(deleted, superseded)
+    lap("match ids")
+
+    schema = pa.ipc.open_file(pa.memory_map(os.path.join(store_dir, parts[0]["path"]), "r")).schema
+    needed = set(infos) | {BASE_DERIVED[name] for name in schema.names
+                           if name in BASE_DERIVED and name not in delta.column_names}
+    derived = derive(delta, infos, needed)
+    lap("derive")
+
+    columns = []
+    for field in schema:
+        if field.name in delta.column_names:
+            columns.append(delta[field.name].cast(field.type))
+        elif derived.get(BASE_DERIVED.get(field.name)):
+            columns.append(pa.array(derived[BASE_DERIVED[field.name]][field.name]).cast(field.type))
+        else:
+            columns.append(pa.nulls(delta.num_rows, field.type))
+    rows = pa.table(columns, schema=schema)
+
+    # The delta becomes one part at the end; the rows it replaces are marked, not rewritten.
+    number = max(_part_number(part) for part in parts) + 1
+    bounds = np.cumsum([0] + [part["rows"] for part in parts])
+    part_of = np.searchsorted(bounds, superseded, side="right") - 1
+    tombstones = pa.table({"part": pa.array(part_of, pa.int32()), "row": pa.array(superseded - bounds[part_of])})
+    retired = []
+    if manifest.get("deleted"):
+        retired.append(manifest["deleted"]["path"])
+        tombstones = pa.concat_tables([pq.read_table(os.path.join(store_dir, manifest["deleted"]["path"])),
+                                       tombstones])
+    parts.append(write_delta_part(rows, store_dir, number))
+    deleted_entry = {"path": f"tracks/deleted-{number:04d}.parquet", "rows": tombstones.num_rows}
+    pq.write_table(tombstones, os.path.join(store_dir, deleted_entry["path"]))
+    deleted = np.sort(np.r_[deleted, superseded])
+    total = manifest["rows"] - len(removed) + delta.num_rows
+    lap("write parts")
+
+    delta_sha = file_sha256(delta_path)
+    version = hashlib.sha256(f"{manifest['version']}:{delta_sha}".encode()).hexdigest()[:16]
+    now = datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds")
+    written, stale = [], []
+    for name, info in infos.items():
+        values = derived.get(name)
+        if values is None:
+            stale.append(name)
+            continue
+        fields = open_sidecar(name, store_dir).schema
+        added = pa.table([delta_ids] + [pa.array(np.asarray(values[f.name], dtype=f.type.to_pandas_dtype()), f.type)
+                                        for f in fields], names=["id"] + fields.names)
+        delta_rows = stage_sidecar_delta(name, added, store_dir, info)
+        base = os.path.join(store_dir, SIDECAR_DIR, name)
+        with open(base + ".json.tmp", "w") as f:
+            json.dump({**info, "store_version": version, "rows": total, "delta_rows": delta_rows, "written_at": now},
+                      f, indent=2)
+        written.append(base)
+    lap("sidecars")
+
+    # Rollups: the rows that leave the store are the old versions of the updated tracks.
+    try:
+        with open(os.path.join(store_dir, rollups.ROLLUP_NAME)) as f:
+            current = json.load(f)
+        counts = rollups.read_counts(store_dir)
+        if current.get("format") != rollups.ROLLUP_FORMAT or current.get("version") != manifest["version"]:
+            current = None
+    except FileNotFoundError:
+        current = None
+    if current is not None:
+        # Both sides as the pages see them: sidecar columns override base ones (e.g. `promoted`).
+        added = rows
+        for name in infos:
+            for column, values in (derived.get(name) or {}).items():
+                index = added.schema.get_field_index(column)
+                if index >= 0:
+                    added = added.set_column(index, column, pa.array(values))
+                else:
+                    added = added.append_column(column, pa.array(values))
+        replaced = rollups.rollup_table(TrackStore(store_dir).table).take(removed)
+        current, counts = rollups.update_rollups(
+            current, counts, rollups.rollup_table(added), replaced, version,
+            lambda feature: drop_rows(open_parts(parts, [feature], store_dir), deleted)[feature].to_numpy(),
+        )
+    lap("rollups")
+
+    # Sidecars first: until the manifest flips, readers ignore them as computed for another version.
+    for base in written:
+        for ext in (".delta.arrow", ".delta.parquet", ".json"):
+            _replace(base + ext)
+    manifest.update({
+        "version": version,
+        "rows": total,
+        "parts": parts,
+        "deleted": deleted_entry,
+        "retired": retired,
+        "refreshed_at": now,
+        "refreshes": manifest.get("refreshes", []) + [{
+            "delta": os.path.relpath(os.path.abspath(delta_path), PROJECT_ROOT),
+            "sha256": delta_sha,
+            "added": delta.num_rows - len(removed),
+            "updated": len(removed),
+            "at": now,
+        }],
+    })
+    _write_manifest(manifest, store_dir)
+    if current is not None:
+        rollups.save_rollups(current, counts, store_dir)
+    else:
+        rollups.build_rollups(store_dir)
+    lap("commit")
+
+    if os.path.exists(os.path.join(store_dir, artist_index.INDEX_NAME)):
+        # The delta's rows are the last `delta.num_rows` row ids, after the updated ones leave.
+        artist_index.patch(store_dir, previous, removed, delta["artists"], total - delta.num_rows)
+        lap("artist index")
+
+    compacted = compact and needs_compaction(manifest)
+    if compacted:
+        version = compact_store(store_dir)
+        lap("compact")
+
+    if similarity:
+        from scripts import similarity as similarity_index
+
+        similarity_index.build_store_index(store_dir)
+        lap("similarity index")
+
+    return {"version": version, "rows": total, "added": delta.num_rows - len(removed), "updated": len(removed),
+            "superseded": 0 if compacted else tombstones.num_rows, "compacted": compacted,
+            "stale_sidecars": stale, "stages": stages}
+
+
+def compact_store(store_dir=STORE_DIR):
+    """
+    Rewrite the live rows as year parts, dropping the delta parts and the
+    superseded rows refreshes left behind. The sidecars, rollups and artist
+    index follow the new row order. O(store), like a rebuild without the CSV;
+    returns the new version.
+    """
+    manifest = read_manifest(store_dir)
+    _remove_retired(manifest, store_dir)
+    store = TrackStore(store_dir)
+    # PartWriter's stable sort by year, applied once so the sidecars get the same order.
+    order = pc.sort_indices(store.table["year"])
+    number = max(_part_number(part) for part in manifest["parts"]) + 1
+    parts = write_parts(open_store(store_dir=store_dir).take(order), store_dir, number)
+
+    previous = manifest["version"]
+    retired = [part[key] for part in manifest["parts"] for key in ("path", "parquet")]
+    retired += [manifest["deleted"]["path"]] if manifest.get("deleted") else []
+    manifest.pop("deleted", None)
+    manifest.update({
+        "version": hashlib.sha256(f"{previous}:compact".encode()).hexdigest()[:16],
+        "parts": parts,
+        "retired": retired,
+        "compacted_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+    })
+    written = ("name", "store_version", "rows", "columns", "written_at", "delta_rows")
+    for name, info in store.sidecars.items():
+        write_sidecar(name, store.table.select(["id"] + list(info["columns"])).take(order), store_dir,
+                      meta={key: value for key, value in info.items() if key not in written}, manifest=manifest)
+    _write_manifest(manifest, store_dir)
+
+    # Same rows, new order: the rollups only need the new version; the artist index holds row ids.
+    try:
+        with open(os.path.join(store_dir, rollups.ROLLUP_NAME)) as f:
+            current = json.load(f)
+        if current.get("format") == rollups.ROLLUP_FORMAT and current.get("version") == previous:
+            rollups.save_rollups({**current, "version": manifest["version"]}, rollups.read_counts(store_dir), store_dir)
+        else:
+            rollups.build_rollups(store_dir)
+    except FileNotFoundError:
+        rollups.build_rollups(store_dir)
+    if os.path.exists(os.path.join(store_dir, artist_index.INDEX_NAME)):
+        artist_index.build(store_dir)
+    return manifest["version"]
+
+
+def synthetic_delta(table, rows, seed=27):
+    """Half updates of random store rows (new audio features, same year), half new tracks."""
+    from scripts.synthetic_tracks import synthetic_tracks
+
+    rng = np.random.default_rng(seed)
+    updated = table.select(BASE_COLUMNS).take(rng.choice(table.num_rows, rows // 2, replace=False))
+    for feature in ("danceability", "energy", "valence"):
+        updated = updated.set_column(updated.schema.get_field_index(feature), feature,
+                                     pa.array(rng.random(updated.num_rows).round(3)))
+    new = synthetic_tracks(rows - rows // 2, seed, with_derived=False)
+    new = new.set_column(0, "id", pc.binary_join_element_wise("refresh-", new["id"], ""))
+    return pa.concat_tables([updated, new])
+
+
+def _rollup_mismatches(incremental, full):
+    mismatches = [key for key in ("top_artists", "top_albums") if incremental[key] != full[key]]
+    for key, value in full["hero"].items():
+        if not np.isclose(incremental["hero"][key] or 0.0, value or 0.0):
+            mismatches.append(f"hero.{key}")
+    yearly = incremental["yearly"]
+    if yearly["year"] != full["yearly"]["year"] or yearly["count"] != full["yearly"]["count"]:
+        mismatches.append("yearly counts")
+    elif not all(np.allclose(yearly[f], full["yearly"][f]) for f in rollups.YEARLY_FEATURES):
+        mismatches.append("yearly means")
+    for feature, hist in full["histograms"].items():
+        # Edges only grow incrementally, so a narrower full-build range is not a mismatch.
+        mine = incremental["histograms"][feature]
+        if mine["edges"] == hist["edges"] and mine["counts"] != hist["counts"]:
+            mismatches.append(f"histogram {feature}")
+    return mismatches
+
+
+def benchmark(store_dir=STORE_DIR, delta_rows=10_000):
+    """Refresh a scratch copy of the store with a synthetic delta and compare against a full recompute."""
+    import shutil
+    import tempfile
+
+    with tempfile.TemporaryDirectory() as tmp:
+        scratch = os.path.join(tmp, "store")
+        shutil.copytree(store_dir, scratch, ignore=shutil.ignore_patterns("similarity", "plan_cache", "*.tmp"))
+        delta_path = os.path.join(tmp, "delta.parquet")
+        pq.write_table(synthetic_delta(open_store(store_dir=scratch), delta_rows), delta_path)
+
+        start = time.perf_counter()
+        stats = refresh(delta_path, scratch, compact=False)
+        refresh_s = time.perf_counter() - start
+        print(f"Refresh of {stats['added']:,} new + {stats['updated']:,} updated tracks into "
+              f"{stats['rows']:,} rows: {refresh_s:.2f}s ({stats['superseded']:,} superseded rows pending compaction)")
+        for stage, seconds in stats["stages"].items():
+            print(f"  {stage:14s} {seconds:7.3f}s")
+        if stats["stale_sidecars"]:
+            print(f"  stale sidecars (rebuild them): {', '.join(stats['stale_sidecars'])}")
+
+        # What a rebuild redoes: write every part, derive every sidecar, recompute the rollups (and artist index).
+        with open(os.path.join(scratch, rollups.ROLLUP_NAME)) as f:
+            incremental = json.load(f)
+        table = open_store(store_dir=scratch)
+        timings = {}
+        start = time.perf_counter()
+        write_parts(table, os.path.join(tmp, "rebuild"))
+        timings["write parts"] = time.perf_counter() - start
+        start = time.perf_counter()
+        derive(table, sidecars(scratch), set(sidecars(scratch)) | set(BASE_DERIVED.values()))
+        timings["derive"] = time.perf_counter() - start
+        start = time.perf_counter()
+        full = rollups.compute_rollups(rollups.rollup_table(TrackStore(scratch).table), stats["version"])
+        timings["rollups"] = time.perf_counter() - start
+        if "artist index" in stats["stages"]:
+            start = time.perf_counter()
+            artist_index.build_artist_index(table["artists"])
+            timings["artist index"] = time.perf_counter() - start
+        full_s = sum(timings.values())
+        print(f"Full recompute: {full_s:.2f}s (" + ", ".join(f"{k} {v:.2f}s" for k, v in timings.items())
+              + f") -> refresh is {full_s / refresh_s:.1f}x faster")
+
+        mismatches = _rollup_mismatches(incremental, full)
+        print("Incremental rollups match a full recompute" if not mismatches
+              else f"Rollup mismatches: {', '.join(mismatches)}")
+        if "artist index" in stats["stages"]:
+            patched = pa.ipc.open_file(os.path.join(scratch, artist_index.INDEX_NAME)).read_all()
+            rebuilt = artist_index.build_artist_index(TrackStore(scratch).table["artists"])
+            print("Patched artist index matches a rebuild" if patched.replace_schema_metadata().equals(rebuilt)
+                  else "Patched artist index differs from a rebuild")
+
+        start = time.perf_counter()
+        compact_store(scratch)
+        print(f"Compaction (once per {COMPACT_SHARE:.0%} of the store superseded or {COMPACT_PARTS} deltas): "
+              f"{time.perf_counter() - start:.2f}s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fold a delta of new / updated tracks into the store.")
+    parser.add_argument("delta", nargs="?", help="delta CSV (cleaned or raw) or Parquet file")
+    parser.add_argument("--store", default=STORE_DIR, help="store directory")
+    parser.add_argument("--similarity", action="store_true", help="also rebuild the similar-tracks index")
+    parser.add_argument("--compact", action="store_true", help="fold the delta parts back into year parts")
+    parser.add_argument("--benchmark", action="store_true", help="time a synthetic delta on a scratch copy instead")
+    parser.add_argument("--delta-rows", type=int, default=10_000, help="benchmark delta size (half updates)")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.store, args.delta_rows)
+    elif args.compact and not args.delta:
+        start = time.perf_counter()
+        version = compact_store(args.store)
+        print(f"Store {version}: compacted in {time.perf_counter() - start:.2f}s")
+    elif not args.delta:
+        parser.error("a delta file is required (or --benchmark / --compact)")
+    else:
+        stats = refresh(args.delta, args.store, args.similarity)
+        if args.compact and not stats["compacted"]:
+            stats["version"] = compact_store(args.store)
+            stats["compacted"] = True
+        print(f"Store {stats['version']}: +{stats['added']:,} new, {stats['updated']:,} updated, {stats['rows']:,} rows "
+              + ("(compacted)" if stats["compacted"] else f"({stats['superseded']:,} superseded rows pending compaction)"))
+        for stage, seconds in stats["stages"].items():
+            print(f"  {stage:16s} {seconds:7.3f}s")
+        if stats["stale_sidecars"]:
+            print(f"Stale sidecars, rebuild them: {', '.join(stats['stale_sidecars'])}")
+        if not args.similarity:
+            print("The similar-tracks index is now stale: python -m scripts.similarity")
@@ -0,0 +1,243 @@
+"""
+Process-wide query result cache for the query backends.
+
+`scripts/query_optimization/03_temp_table_queries.sql` materializes hot
+filtered subsets by hand (89 ms -> 0.6 ms), and the temp tables die with the
+session. The backends do the same automatically:
+
+- results (pages, counts, yearly means, top-N lists, cluster ids...) are
+  keyed on the backend, the request kind and the normalized query text and
+  parameters, so `year BETWEEN 2010 AND 2020` typed with ints or floats, or
+  filters given in another order, share an entry;
+- filtered subsets are materialized once per predicate: the pandas backend
+  keeps the matching row ids, the DuckDB backend a table of the matching rows
+  that later pages, sorts and counts read instead of the Parquet parts;
+- entries are evicted least-recently-used once their size passes the memory
+  budget (`SIL_RESULT_CACHE_MB`, 256 MB by default); a DuckDB materialization
+  drops its table when evicted;
+- every entry belongs to a data version. The first request for a new version
+  drops all entries of the previous one, and requests still running against
+  an older store bypass the cache instead of flushing it again.
+
+The cache is shared by every session of the app (pages get it through
+`ui/track_data.py`), and keeps hits, misses and the query time saved per
+request kind for the Performance page.
+
+    python -m scripts.result_cache --benchmark    # replay the pages' queries cold vs cached, per backend
+"""
+
+import argparse
+import collections
+import os
+import re
+import sys
+import threading
+import time
+
+import numpy as np
+
+MAX_BYTES = int(float(os.environ.get("SIL_RESULT_CACHE_MB", 256)) * 2**20)
+
+
+def normalize_sql(sql):
+    """Query text with `--` comments dropped and whitespace collapsed, outside string literals."""
+    parts = re.split(r"('(?:[^']|'')*')", sql)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", re.sub(r"--[^\n]*", "", parts[i]))
+    return "".join(parts).strip()
+
+
+def normalize_params(value):
+    """A hashable, canonical form of request parameters: dicts sorted by key, numbers as floats."""
+    if isinstance(value, dict):
+        return tuple((key, normalize_params(value[key])) for key in sorted(value))
+    if isinstance(value, (list, tuple)):
+        return tuple(normalize_params(v) for v in value)
+    if isinstance(value, (bool, np.bool_)) or value is None or isinstance(value, str):
+        return value
+    if isinstance(value, (int, float, np.integer, np.floating)):
+        return float(value)
+    return value
+
+
+def nbytes(value):
+    """Approximate memory held by a cached result."""
+    import pandas as pd
+
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (list, tuple)):
+        return sys.getsizeof(value) + sum(nbytes(v) for v in value)
+    return sys.getsizeof(value)
+
+
+class _Entry:
+    __slots__ = ("value", "nbytes", "compute_ms", "release")
+
+    def __init__(self, value, size, compute_ms, release):
+        self.value, self.nbytes, self.compute_ms, self.release = value, size, compute_ms, release
+
+
+class ResultCache:
+    """LRU cache of query results under a byte budget, invalidated per data version."""
+
+    def __init__(self, max_bytes=MAX_BYTES):
+        self.max_bytes = max_bytes
+        self.version = None
+        self.bytes = 0
+        self._retired = set()
+        self._entries = collections.OrderedDict()
+        self._stats = collections.defaultdict(lambda: {"hits": 0, "misses": 0, "compute_ms": 0.0, "saved_ms": 0.0})
+        self._lock = threading.Lock()
+
+    def get(self, version, kind, key, compute, size=nbytes, release=None):
+        """
+        The cached result of `compute()` for (`kind`, `key`) at data `version`.
+
+        `size(value)` gives its footprint for the budget; `release(value)`,
+        if given, runs when the entry is evicted or invalidated (e.g. to drop
+        a materialized table). Concurrent misses on one key each compute; the
+        last result is kept.
+        """
+        key = (kind, key)
+        with self._lock:
+            if version != self.version and version not in self._retired:
+                self._invalidate(version)
+            entry = self._entries.get(key) if version == self.version else None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                stats = self._stats[kind]
+                stats["hits"] += 1
+                stats["saved_ms"] += entry.compute_ms
+                return entry.value
+
+        start = time.perf_counter()
+        value = compute()
+        compute_ms = (time.perf_counter() - start) * 1000
+        value_bytes = size(value)
+
+        with self._lock:
+            stats = self._stats[kind]
+            stats["misses"] += 1
+            stats["compute_ms"] += compute_ms
+            if version != self.version or value_bytes > self.max_bytes:
+                stored = False  # a straggler on an old store, or too big to ever fit
+            else:
+                stored = True
+                self._drop(key)
+                self._entries[key] = _Entry(value, value_bytes, compute_ms, release)
+                self.bytes += value_bytes
+                while self.bytes > self.max_bytes:
+                    self._drop(next(iter(self._entries)))
+        if not stored and release is not None:
+            release(value)
+        return value
+
+    def _drop(self, key):
+        entry = self._entries.pop(key, None)
+        if entry is not None:
+            self.bytes -= entry.nbytes
+            if entry.release is not None:
+                entry.release(entry.value)
+
+    def _invalidate(self, version):
+        if self.version is not None:
+            self._retired.add(self.version)
+        for key in list(self._entries):
+            self._drop(key)
+        self.version = version
+
+    def clear(self):
+        with self._lock:
+            for key in list(self._entries):
+                self._drop(key)
+            self._stats.clear()
+
+    def stats(self):
+        """Per request kind: hits, misses, hit rate, entries, MB held and query time saved by hits."""
+        import pandas as pd
+
+        with self._lock:
+            entries = collections.Counter(kind for kind, _ in self._entries)
+            held = collections.Counter()
+            for (kind, _), entry in self._entries.items():
+                held[kind] += entry.nbytes
+            rows = [{
+                "request": kind,
+                "hits": stats["hits"],
+                "misses": stats["misses"],
+                "hit rate": stats["hits"] / max(stats["hits"] + stats["misses"], 1),
+                "entries": entries[kind],
+                "MB": held[kind] / 2**20,
+                "avg miss ms": stats["compute_ms"] / max(stats["misses"], 1),
+                "saved ms": stats["saved_ms"],
+            } for kind, stats in self._stats.items()]
+        columns = ["request", "hits", "misses", "hit rate", "entries", "MB", "avg miss ms", "saved ms"]
+        return pd.DataFrame(rows, columns=columns).sort_values("saved ms", ascending=False, ignore_index=True)
+
+
+# --- Benchmark: the pages' queries, as a session clicking through them would issue them
+FILTERS = {
+    "energetic explicit": {"energy": (0.85, None), "year": (2020, None)},
+    "dance + tempo": {"danceability": (0.8, None), "tempo": (120, None)},
+    "explorer defaults": {"year": (2010, 2024), "danceability": (0.5, None), "energy": (0.5, None), "tempo": (80, 180)},
+}
+
+
+def workload(backend):
+    """(kind, callable) pairs replaying the dashboard, explorer and cluster pages."""
+    columns = ["name", "artists", "year", "danceability", "energy", "tempo"]
+    calls = [
+        ("yearly_means", lambda: backend.yearly_means(["tempo", "valence", "energy"])),
+        ("top_values", lambda: backend.top_values("artists")),
+        ("top_values", lambda: backend.top_values("album")),
+        ("cluster_ids", backend.cluster_ids),
+    ]
+    for ranges in FILTERS.values():
+        for page in range(3):
+            calls.append(("filter_tracks", lambda r=ranges, p=page: backend.filter_tracks(r, columns, p * 1000, 1000)))
+        calls.append(("filter_tracks", lambda r=ranges: backend.filter_tracks(r, columns, 0, 1000, "energy", True)))
+    for cluster in backend.cluster_ids()[:3]:
+        calls.append(("cluster_tracks", lambda c=cluster: backend.cluster_tracks(c, columns, 0, 1000, "energy", True)))
+    return calls
+
+
+def benchmark(repeat=5):
+    from scripts import query_backend
+    from scripts.track_store import TrackStore
+
+    store = TrackStore()
+    for name in query_backend.BACKENDS:
+        uncached = query_backend.open_backend(name, store)
+        cache = ResultCache()
+        cached = query_backend.open_backend(name, store, cache)
+        uncached.warm(), cached.warm()
+        timings = collections.defaultdict(lambda: {"uncached": [], "cached": []})
+        for _ in range(repeat):
+            for label, backend in (("uncached", uncached), ("cached", cached)):
+                for kind, call in workload(backend):
+                    start = time.perf_counter()
+                    call()
+                    timings[kind][label].append((time.perf_counter() - start) * 1000)
+        print(f"{name} ({len(store):,} rows), {repeat} passes over the pages' queries; p50 ms per request:")
+        for kind, samples in timings.items():
+            # The first pass of the cached backend pays the misses; the rest are hits.
+            cold, warm = np.median(samples["uncached"]), np.median(samples["cached"][len(samples["cached"]) // repeat:])
+            print(f"  {kind:15s} {cold:9.2f} -> {warm:7.3f}  ({cold / max(warm, 1e-6):,.0f}x)")
+        print(cache.stats().round(2).to_string(index=False))
+        print(f"  cache holds {cache.bytes / 2**20:.1f} MB of {cache.max_bytes / 2**20:.0f} MB\n")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the query result cache.")
+    parser.add_argument("--benchmark", action="store_true", help="replay the pages' queries cold vs cached")
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark(args.repeat)
+    else:
+        parser.print_help()
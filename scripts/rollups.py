@@ -0,0 +1,222 @@
+"""
+Ingest-time aggregates for the Global Dashboard.
+
+`build_rollups` scans the store once and writes `data/store/rollups.json`
+(a few kilobytes): hero metrics, yearly feature means, fixed-bin histograms
+and top-K artists/albums. The artifact records the store version it was
+computed from, so a rebuilt store never serves stale charts.
+
+Artists are counted one by one: a track by "['A', 'B']" counts for both A
+and B, where the raw strings would make the pair an artist of its own. The
+counts match `scripts/artist_index.py`.
+
+Every rollup is mergeable: counts and means per year, histogram counts over
+fixed edges, and the full artist/album value counts behind the top-K lists
+(`rollup_counts.arrow`). `update_rollups` applies a refresh (rows added,
+old versions of updated rows removed) in time proportional to the delta.
+"""
+
+import json
+import os
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from scripts.track_lookup import split_artists
+from scripts.track_store import AUDIO_FEATURES, STORE_DIR, TrackStore, read_manifest
+
+ROLLUP_NAME = "rollups.json"
+COUNTS_NAME = "rollup_counts.arrow"
+ROLLUP_FORMAT = 3
+HISTOGRAM_BINS = 30
+TOP_K = 25
+TOP_K_COLUMNS = ("artists", "album")
+YEARLY_FEATURES = AUDIO_FEATURES + ["duration_min"]
+UNIT_FEATURES = [f for f in AUDIO_FEATURES if f not in ("loudness", "tempo")]
+ROLLUP_COLUMNS = ["explicit", "duration_min", "year", "artists", "album"] + AUDIO_FEATURES
+
+
+def _histogram_edges(values, feature):
+    if feature in UNIT_FEATURES:
+        return np.linspace(0.0, 1.0, HISTOGRAM_BINS + 1)
+    return np.linspace(np.floor(values.min()), np.ceil(values.max()), HISTOGRAM_BINS + 1)
+
+
+def value_counts(table):
+    """(column, value, count) rows for TOP_K_COLUMNS, the mergeable state behind the top-K lists."""
+    parts = []
+    for column in TOP_K_COLUMNS:
+        values = split_artists(table[column])[0] if column == "artists" else table[column]
+        counts = pc.value_counts(values)
+        parts.append(pa.table({
+            "column": pa.array([column] * len(counts)),
+            "value": counts.field("values"),
+            "count": counts.field("counts"),
+        }))
+    return pa.concat_tables(parts)
+
+
+def _top_k(counts, column, k=TOP_K):
+    counts = counts.filter(pc.equal(counts["column"], column))
+    # Ties broken by value, so a full build and an incremental update agree.
+    top = counts.take(pc.sort_indices(counts, [("count", "descending"), ("value", "ascending")])[:k])
+    return {"labels": top["value"].to_pylist(), "counts": top["count"].to_pylist()}
+
+
+def compute_rollups(table, version, counts=None):
+    counts = value_counts(table) if counts is None else counts
+    rows = table.num_rows
+    hero = {
+        "tracks": rows,
+        "explicit_ratio": pc.mean(table["explicit"].cast("int8")).as_py(),
+        "avg_duration_min": pc.mean(table["duration_min"]).as_py(),
+        "promoted_ratio": pc.mean(table["promoted"]).as_py() if "promoted" in table.column_names else None,
+    }
+
+    grouped = table.group_by("year").aggregate(
+        [("year", "count")] + [(feature, "mean") for feature in YEARLY_FEATURES]
+    ).sort_by("year")
+    yearly = {"year": grouped["year"].to_pylist(), "count": grouped["year_count"].to_pylist()}
+    for feature in YEARLY_FEATURES:
+        yearly[feature] = grouped[f"{feature}_mean"].to_pylist()
+
+    histograms = {}
+    for feature in AUDIO_FEATURES:
+        values = table[feature].to_numpy()
+        edges = _histogram_edges(values, feature)
+        bins, _ = np.histogram(values, bins=edges)
+        histograms[feature] = {"edges": edges.tolist(), "counts": bins.tolist()}
+
+    return {
+        "format": ROLLUP_FORMAT,
+        "version": version,
+        "hero": hero,
+        "yearly": yearly,
+        "histograms": histograms,
+        "top_artists": _top_k(counts, "artists"),
+        "top_albums": _top_k(counts, "album"),
+    }
+
+
+def _merge_counts(counts, added, removed):
+    """`counts` plus the value counts of `added` minus those of `removed`; values that drop to zero go."""
+    delta = [counts, value_counts(added)]
+    if removed.num_rows:
+        gone = value_counts(removed)
+        delta.append(gone.set_column(2, "count", pc.negate(gone["count"])))
+    merged = pa.concat_tables(delta).group_by(["column", "value"]).aggregate([("count", "sum")])
+    merged = merged.rename_columns(["column", "value", "count"])
+    return merged.filter(pc.greater(merged["count"], 0))
+
+
+def _merge_mean(mean, count, added, removed, new_count):
+    if new_count == 0:
+        return None
+    return ((mean or 0.0) * count + float(np.sum(added)) - float(np.sum(removed))) / new_count
+
+
+def update_rollups(rollups, counts, added, removed, version, full_column):
+    """
+    Rollups after `added` rows are inserted and `removed` rows dropped (an
+    updated track appears in both), without rescanning the store.
+    `full_column(feature)` returns a whole column of the new store; it is only
+    called when added values fall outside a histogram's edges and that
+    histogram has to be re-binned. Returns (rollups, counts).
+    """
+    old, new = rollups["hero"]["tracks"], rollups["hero"]["tracks"] + added.num_rows - removed.num_rows
+    hero = {
+        "tracks": new,
+        "explicit_ratio": _merge_mean(rollups["hero"]["explicit_ratio"], old,
+                                      added["explicit"].to_numpy(zero_copy_only=False),
+                                      removed["explicit"].to_numpy(zero_copy_only=False), new),
+        "avg_duration_min": _merge_mean(rollups["hero"]["avg_duration_min"], old, added["duration_min"].to_numpy(),
+                                        removed["duration_min"].to_numpy(), new),
+        "promoted_ratio": None,
+    }
+    if rollups["hero"]["promoted_ratio"] is not None and "promoted" in added.column_names:
+        hero["promoted_ratio"] = _merge_mean(rollups["hero"]["promoted_ratio"], old, added["promoted"].to_numpy(),
+                                             removed["promoted"].to_numpy(), new)
+
+    yearly = {column: list(values) for column, values in rollups["yearly"].items()}
+    added_years, removed_years = added["year"].to_numpy(), removed["year"].to_numpy()
+    for year in np.union1d(added_years, removed_years).tolist():
+        a, r = added_years == year, removed_years == year
+        if year not in yearly["year"]:
+            i = int(np.searchsorted(yearly["year"], year))
+            for column in yearly:
+                yearly[column].insert(i, year if column == "year" else 0 if column == "count" else None)
+        i = yearly["year"].index(year)
+        count = yearly["count"][i] + int(a.sum()) - int(r.sum())
+        for feature in YEARLY_FEATURES:
+            yearly[feature][i] = _merge_mean(yearly[feature][i], yearly["count"][i], added[feature].to_numpy()[a],
+                                             removed[feature].to_numpy()[r], count)
+        yearly["count"][i] = count
+    empty = [i for i, count in enumerate(yearly["count"]) if count == 0]
+    yearly = {column: [v for i, v in enumerate(values) if i not in empty] for column, values in yearly.items()}
+
+    histograms = {}
+    for feature, hist in rollups["histograms"].items():
+        edges, values = np.asarray(hist["edges"]), added[feature].to_numpy()
+        if len(values) and (values.min() < edges[0] or values.max() > edges[-1]):
+            values = full_column(feature)
+            edges = _histogram_edges(values, feature)
+            histograms[feature] = {"edges": edges.tolist(), "counts": np.histogram(values, bins=edges)[0].tolist()}
+            continue
+        bins = np.asarray(hist["counts"]) + np.histogram(values, bins=edges)[0]
+        bins -= np.histogram(removed[feature].to_numpy(), bins=edges)[0]
+        histograms[feature] = {"edges": hist["edges"], "counts": bins.tolist()}
+
+    counts = _merge_counts(counts, added, removed)
+    return {
+        "format": ROLLUP_FORMAT,
+        "version": version,
+        "hero": hero,
+        "yearly": yearly,
+        "histograms": histograms,
+        "top_artists": _top_k(counts, "artists"),
+        "top_albums": _top_k(counts, "album"),
+    }, counts
+
+
+def save_rollups(rollups, counts, store_dir=STORE_DIR):
+    # Write-then-rename: the dashboard may be reading the previous files.
+    with pa.OSFile(os.path.join(store_dir, COUNTS_NAME + ".tmp"), "wb") as sink:
+        with pa.ipc.new_file(sink, counts.schema) as writer:
+            writer.write_table(counts)
+    with open(os.path.join(store_dir, ROLLUP_NAME + ".tmp"), "w") as f:
+        json.dump(rollups, f)
+    for name in (COUNTS_NAME, ROLLUP_NAME):
+        os.replace(os.path.join(store_dir, name + ".tmp"), os.path.join(store_dir, name))
+
+
+def read_counts(store_dir=STORE_DIR):
+    return pa.ipc.open_file(pa.memory_map(os.path.join(store_dir, COUNTS_NAME), "r")).read_all()
+
+
+def rollup_table(table):
+    """The columns of `table` the rollups are computed from."""
+    return table.select([c for c in ROLLUP_COLUMNS + ["promoted"] if c in table.column_names])
+
+
+def build_rollups(store_dir=STORE_DIR):
+    version = read_manifest(store_dir)["version"]
+    # Through TrackStore, so `promoted` comes from its sidecar like on the pages.
+    table = rollup_table(TrackStore(store_dir).table)
+    counts = value_counts(table)
+    rollups = compute_rollups(table, version, counts)
+    save_rollups(rollups, counts, store_dir)
+    return rollups
+
+
+def load_rollups(store_dir=STORE_DIR):
+    """Return the rollups for the current store, rebuilding them if missing or stale."""
+    version = read_manifest(store_dir)["version"]
+    try:
+        with open(os.path.join(store_dir, ROLLUP_NAME)) as f:
+            rollups = json.load(f)
+        if rollups.get("format") == ROLLUP_FORMAT and rollups.get("version") == version:
+            return rollups
+    except FileNotFoundError:
+        pass
+    return build_rollups(store_dir)
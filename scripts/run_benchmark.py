@@ -1,35 +1,176 @@
-import psycopg2
+import argparse
+import csv
+import datetime
+import json
+import os
+import platform
+import subprocess
+import sys
 import time
-import pandas as pd
-
-QUERIES = {
-    "raw_query_1": "scripts/query_optimization/01_raw_queries.sql",
-    "indexed_query_1": "scripts/query_optimization/02_indexed_queries.sql",
-    "temp_table_query_1": "scripts/query_optimization/03_temp_table_queries.sql"
-}
-
-def run_and_time_query(conn, sql_file):
-    with open(sql_file, 'r') as f:
-        query = f.read()
-    with conn.cursor() as cur:
-        start = time.time()
-        cur.execute(query)
+
+import numpy as np
+
+from scripts.bench_engines import DASHBOARD_SQL, available_engines, sql_file_workloads
+from scripts.memory_usage import PeakMemory
+from scripts.synthetic_tracks import SCALE_FACTORS, synthetic_tracks
+from scripts.track_store import BASE_COLUMNS, STORE_DIR, open_store
+
+# Multi-engine benchmark for the query-optimization SQL files and the dashboard's
+# aggregations. Runs each workload with warm-up and repetitions on every engine
+# and scale, then writes diffable JSON + CSV:
+#
+#   python -m scripts.run_benchmark --scale 100k 1.2M --engines pandas polars duckdb sqlite
+#   python -m scripts.run_benchmark --baseline old.json   # exit 1 on regressions
+#
+# PostgreSQL joins the run when SIL_PG_DSN (or --pg-dsn) is set.
+
+RESULTS_PATH = "scripts/query_optimization/benchmark_results.json"
+NOISE_FLOOR_MS = 0.5
+
+
+def load_dataset(scale):
+    if scale == "store":
+        return open_store(BASE_COLUMNS)
+    return synthetic_tracks(SCALE_FACTORS[scale], with_derived=False)
+
+
+def measure(fn, warmup, repeat):
+    for _ in range(warmup):
+        fn()
+    samples = []
+    with PeakMemory() as memory:
+        for _ in range(repeat):
+            start = time.perf_counter()
+            fn()
+            samples.append((time.perf_counter() - start) * 1000)
+    ms = np.array(samples)
+    return {
+        "reps": repeat,
+        "p50_ms": float(np.percentile(ms, 50)),
+        "p95_ms": float(np.percentile(ms, 95)),
+        "p99_ms": float(np.percentile(ms, 99)),
+        "mean_ms": float(ms.mean()),
+        "min_ms": float(ms.min()),
+        "max_ms": float(ms.max()),
+        "peak_mem_mb": round(memory.peak_delta_mb, 2),
+    }
+
+
+def single_shot(fn):
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        fn()
+        elapsed = (time.perf_counter() - start) * 1000
+    return {"reps": 1, "p50_ms": elapsed, "p95_ms": elapsed, "p99_ms": elapsed, "mean_ms": elapsed,
+            "min_ms": elapsed, "max_ms": elapsed, "peak_mem_mb": round(memory.peak_delta_mb, 2)}
+
+
+def run_engine(engine, table, warmup, repeat):
+    """Yield (workload, kind, stats) for every workload the engine supports."""
+    yield "load", "load", single_shot(lambda: engine.load(table))
+    if engine.sql:
+        for stem, setup, selects in sql_file_workloads():
+            if setup:
+                yield f"{stem}:setup", "setup", single_shot(lambda: engine.setup(setup))
+            for name, select in selects:
+                yield name, "query", measure(lambda: engine.query(select), warmup, repeat)
+        for name, sql in DASHBOARD_SQL.items():
+            yield name, "query", measure(lambda: engine.query(sql), warmup, repeat)
+    else:
+        for name in engine.workloads:
+            yield name, "query", measure(lambda: engine.run(name), warmup, repeat)
+
+
+def environment():
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    versions = {}
+    for module in ("pandas", "polars", "duckdb", "pyarrow", "numpy"):
         try:
-            _ = cur.fetchall()
-        except:
+            versions[module] = __import__(module).__version__
+        except ImportError:
             pass
-        end = time.time()
-    return round(end - start, 4)
+    return {
+        "timestamp": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "git_commit": commit,
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "versions": versions,
+    }
+
+
+def write_results(results, meta, path):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, "w") as f:
+        json.dump({"meta": meta, "results": results}, f, indent=2)
+    csv_path = os.path.splitext(path)[0] + ".csv"
+    with open(csv_path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=list(results[0]))
+        writer.writeheader()
+        writer.writerows(results)
+    return csv_path
+
+
+def find_regressions(results, baseline_path, tolerance):
+    with open(baseline_path) as f:
+        baseline = {(r["scale"], r["engine"], r["workload"]): r for r in json.load(f)["results"]}
+    regressions = []
+    for r in results:
+        old = baseline.get((r["scale"], r["engine"], r["workload"]))
+        if old is None or r["kind"] != "query":
+            continue
+        if r["p50_ms"] > old["p50_ms"] * (1 + tolerance) and r["p50_ms"] - old["p50_ms"] > NOISE_FLOOR_MS:
+            regressions.append((r, old))
+    return regressions
+
 
 if __name__ == "__main__":
-    conn = psycopg2.connect(dbname="spotify_db", user="postgres", password="admin")
+    engines = available_engines()
+    parser = argparse.ArgumentParser(description="Benchmark SQL and dashboard workloads across engines.")
+    parser.add_argument("--scale", nargs="+", default=["store" if os.path.exists(STORE_DIR) else "100k"],
+                        choices=["store"] + list(SCALE_FACTORS))
+    parser.add_argument("--engines", nargs="+", default=list(engines))
+    parser.add_argument("--warmup", type=int, default=2)
+    parser.add_argument("--repeat", type=int, default=10)
+    parser.add_argument("--pg-dsn", help="PostgreSQL DSN (defaults to SIL_PG_DSN)")
+    parser.add_argument("--out", default=RESULTS_PATH)
+    parser.add_argument("--baseline", help="previous results JSON to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.25, help="allowed p50 slowdown vs baseline")
+    args = parser.parse_args()
+
+    engines = available_engines(args.pg_dsn)
+    unknown = [name for name in args.engines if name not in engines]
+    if unknown:
+        parser.error(f"unavailable engines: {unknown} (available: {list(engines)})")
 
     results = []
-    for label, path in QUERIES.items():
-        exec_time = run_and_time_query(conn, path)
-        print(f"{label} ran in {exec_time} sec")
-        results.append({"query": label, "exec_time_sec": exec_time})
-
-    df = pd.DataFrame(results)
-    df.to_csv("scripts/query_optimization/query_summary.csv", index=False)
-    print("Benchmark results saved to query_summary.csv")
\ No newline at end of file
+    for scale in args.scale:
+        table = load_dataset(scale)
+        print(f"== {scale}: {table.num_rows:,} rows")
+        for name in args.engines:
+            engine = engines[name]()
+            try:
+                for workload, kind, stats in run_engine(engine, table, args.warmup, args.repeat):
+                    results.append({"scale": scale, "rows": table.num_rows, "engine": name,
+                                    "workload": workload, "kind": kind, **stats})
+                    print(f"  {name:8s} {workload:28s} p50 {stats['p50_ms']:9.2f} ms  "
+                          f"p95 {stats['p95_ms']:9.2f} ms  peak +{stats['peak_mem_mb']:.1f} MB")
+            finally:
+                engine.close()
+        del table
+
+    csv_path = write_results(results, environment(), args.out)
+    print(f"Results written to {args.out} and {csv_path}")
+
+    if args.baseline:
+        regressions = find_regressions(results, args.baseline, args.tolerance)
+        for new, old in regressions:
+            print(f"REGRESSION {new['scale']} {new['engine']} {new['workload']}: "
+                  f"p50 {old['p50_ms']:.2f} -> {new['p50_ms']:.2f} ms")
+        if regressions:
+            sys.exit(1)
+        print("No regressions against baseline.")
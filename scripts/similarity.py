@@ -0,0 +1,388 @@
+"""
+"Sounds like this": nearest-neighbour search over the scaled audio features.
+
+An inverted-file (IVF) index in plain NumPy:
+
+- a coarse quantizer of NLIST centroids (mini-batch KMeans on a sample,
+  the same trainer as the mood clusters) partitions the catalogue;
+- the scaled float32 vectors are stored grouped by partition, with their
+  squared norms and the year / cluster / explicit attributes used for
+  constraints, as `.npy` files that are memory-mapped on load (opening
+  costs milliseconds and the OS page cache is shared between processes);
+- a query scans only the `nprobe` partitions nearest to it. Constraints are
+  applied inside the scan, and `nprobe` widens automatically while too few
+  tracks pass them.
+
+Batch queries are grouped by partition, so every partition probed by any
+seed is read once and scored against all of its seeds as one matrix product.
+
+Layout of `data/store/similarity/` (rebuilt per store version and clustering):
+
+    meta.json                       store version, clusters sidecar, scaler, nlist, build stats
+    centroids.npy                   (nlist, 9) float32
+    offsets.npy                     partition p holds positions [offsets[p], offsets[p + 1])
+    vectors.npy, norms.npy          scaled features and squared norms, by position
+    rows.npy, positions.npy         position -> store row and back
+    year.npy, cluster.npy, explicit.npy
+    ids.arrow                       sorted track ids with their store row
+
+    python -m scripts.similarity                        # build the index for the store
+    python -m scripts.similarity --benchmark            # latency / recall vs brute force
+"""
+
+import argparse
+import bisect
+import datetime
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from scripts import mood_clustering, mood_embedding
+from scripts.memory_usage import PeakMemory
+from scripts.track_store import AUDIO_FEATURES, STORE_DIR, TrackStore, data_version, sidecars
+
+INDEX_DIR = os.path.join(STORE_DIR, "similarity")
+NLIST = 1024
+NPROBE = 16
+K = 10
+TRAIN_ROWS = 65_536
+RANDOM_STATE = 27
+ARRAYS = ("centroids", "offsets", "vectors", "norms", "rows", "positions", "year", "cluster", "explicit")
+
+
+def _top_k(distances, k):
+    """Column indices of the k smallest distances per row, sorted."""
+    k = min(k, distances.shape[1])
+    part = np.argpartition(distances, k - 1, axis=1)[:, :k] if k < distances.shape[1] else \
+        np.tile(np.arange(distances.shape[1]), (len(distances), 1))
+    order = np.take_along_axis(distances, part, axis=1).argsort(axis=1, kind="stable")
+    return np.take_along_axis(part, order, axis=1)
+
+
+class _SortedStrings:
+    """Sequence view of an Arrow string array for `bisect`, without converting it to Python objects."""
+
+    def __init__(self, array):
+        self.array = array
+
+    def __len__(self):
+        return len(self.array)
+
+    def __getitem__(self, i):
+        return self.array[i].as_py()
+
+
+def build(table, index_dir=INDEX_DIR, nlist=NLIST, train_rows=TRAIN_ROWS, seed=RANDOM_STATE, store_version=None,
+          clusters_written_at=None):
+    """
+    Build the index for an Arrow table with `id`, AUDIO_FEATURES, `year`,
+    `cluster` and `explicit` (one row per store row) and write it to
+    `index_dir`, replacing any previous index atomically. Returns the meta.
+    `clusters_written_at` identifies the clusters sidecar the labels came from.
+    """
+    from sklearn.cluster import MiniBatchKMeans
+
+    start = time.perf_counter()
+    mean, scale = mood_embedding.scaler_stats(table)
+    tmp_dir = index_dir + ".tmp"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+
+    with PeakMemory() as memory:
+        scaled = mood_clustering.write_scaled(table, mean, scale, os.path.join(tmp_dir, "scaled.npy"))
+        nlist = min(nlist, max(1, table.num_rows // 39))
+        rng = np.random.default_rng(seed)
+        sample = np.sort(rng.choice(len(scaled), min(train_rows, len(scaled)), replace=False))
+        quantizer = MiniBatchKMeans(n_clusters=nlist, random_state=seed, batch_size=4096, n_init=1, max_iter=20)
+        centroids = quantizer.fit(scaled[sample]).cluster_centers_.astype(np.float32)
+        # Small chunks: the distance block is chunk_rows x nlist float64.
+        lists = mood_clustering.nearest(scaled, centroids, chunk_rows=16_384, dtype=np.int32)[0]
+
+        rows = np.argsort(lists, kind="stable").astype(np.int32)
+        positions = np.empty_like(rows)
+        positions[rows] = np.arange(len(rows), dtype=np.int32)
+        offsets = np.zeros(nlist + 1, dtype=np.int64)
+        np.cumsum(np.bincount(lists, minlength=nlist), out=offsets[1:])
+        vectors = np.lib.format.open_memmap(os.path.join(tmp_dir, "vectors.npy"), mode="w+", dtype=np.float32,
+                                            shape=scaled.shape)
+        for chunk in range(0, len(rows), mood_clustering.CHUNK_ROWS):
+            block = rows[chunk:chunk + mood_clustering.CHUNK_ROWS]
+            order = np.argsort(block)
+            out = np.empty((len(block), scaled.shape[1]), dtype=np.float32)
+            # Gathering in row order reads the memory map forwards.
+            out[order] = scaled[block[order]]
+            vectors[chunk:chunk + len(block)] = out
+        vectors.flush()
+        del scaled
+        os.remove(os.path.join(tmp_dir, "scaled.npy"))
+
+        arrays = {
+            "centroids": centroids,
+            "offsets": offsets,
+            "norms": (np.asarray(vectors, dtype=np.float32) ** 2).sum(axis=1),
+            "rows": rows,
+            "positions": positions,
+            "year": table["year"].to_numpy()[rows].astype(np.int16),
+            "cluster": table["cluster"].to_numpy()[rows].astype(np.int8),
+            "explicit": table["explicit"].to_numpy(zero_copy_only=False)[rows].astype(np.bool_),
+        }
+        del vectors
+        for name, array in arrays.items():
+            np.save(os.path.join(tmp_dir, name + ".npy"), array)
+
+        by_id = pc.sort_indices(table["id"])
+        ids = pa.table({"id": table["id"].take(by_id), "row": pc.cast(by_id, pa.int32())})
+        with pa.OSFile(os.path.join(tmp_dir, "ids.arrow"), "wb") as sink:
+            with pa.ipc.new_file(sink, ids.schema) as writer:
+                writer.write_table(ids.combine_chunks())
+
+    meta = {
+        "store_version": store_version,
+        "clusters_written_at": clusters_written_at,
+        "features": AUDIO_FEATURES,
+        "mean": np.asarray(mean).tolist(),
+        "scale": np.asarray(scale).tolist(),
+        "nlist": nlist,
+        "rows": table.num_rows,
+        "built_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        "build_s": round(time.perf_counter() - start, 2),
+        "peak_mem_mb": round(memory.peak_delta_mb, 1),
+        "disk_mb": round(sum(os.path.getsize(os.path.join(tmp_dir, f)) for f in os.listdir(tmp_dir)) / 2**20, 1),
+    }
+    with open(os.path.join(tmp_dir, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+    shutil.rmtree(index_dir, ignore_errors=True)
+    os.replace(tmp_dir, index_dir)
+    return meta
+
+
+def build_store_index(store_dir=STORE_DIR, index_dir=None, nlist=NLIST):
+    """Build the index over the store's current rows (cluster labels from the `clusters` sidecar when present)."""
+    store = TrackStore(store_dir)
+    table = store.table.select(["id"] + AUDIO_FEATURES + ["year", "cluster", "explicit"])
+    return build(table, index_dir or os.path.join(store_dir, "similarity"), nlist, store_version=store.version,
+                 clusters_written_at=_clusters_written_at(store_dir))
+
+
+def _clusters_written_at(store_dir):
+    return sidecars(store_dir).get("clusters", {}).get("written_at")
+
+
+def built_at(store_dir=STORE_DIR):
+    """Build timestamp of the store's index, or None if there is none; cheap enough to check on every rerun."""
+    try:
+        with open(os.path.join(store_dir, "similarity", "meta.json")) as f:
+            return json.load(f)["built_at"]
+    except FileNotFoundError:
+        return None
+
+
+class SimilarityIndex:
+    """Memory-mapped IVF index; see the module docstring for the layout."""
+
+    def __init__(self, index_dir=INDEX_DIR):
+        with open(os.path.join(index_dir, "meta.json")) as f:
+            self.meta = json.load(f)
+        for name in ARRAYS:
+            setattr(self, name, np.load(os.path.join(index_dir, name + ".npy"), mmap_mode="r"))
+        self.mean = np.array(self.meta["mean"], dtype=np.float32)
+        self.scale = np.array(self.meta["scale"], dtype=np.float32)
+        ids = pa.ipc.open_file(pa.memory_map(os.path.join(index_dir, "ids.arrow"), "r")).read_all()
+        self._ids, self._id_rows = _SortedStrings(ids["id"].combine_chunks()), ids["row"].combine_chunks()
+        self._centroid_norms = (np.asarray(self.centroids) ** 2).sum(axis=1)
+
+    @classmethod
+    def open(cls, store_dir=STORE_DIR):
+        """
+        The index of the store at `store_dir`, or None when it is missing or
+        was built for another version or clustering (its cluster labels are
+        frozen at build time).
+        """
+        index_dir = os.path.join(store_dir, "similarity")
+        if not os.path.exists(os.path.join(index_dir, "meta.json")):
+            return None
+        index = cls(index_dir)
+        current = (index.meta["store_version"] == data_version(store_dir)
+                   and index.meta.get("clusters_written_at") == _clusters_written_at(store_dir))
+        return index if current else None
+
+    def __len__(self):
+        return len(self.rows)
+
+    def row_of(self, track_id):
+        """Store row of `track_id` (binary search over the sorted ids); KeyError if unknown."""
+        i = bisect.bisect_left(self._ids, track_id)
+        if i == len(self._ids) or self._ids[i] != track_id:
+            raise KeyError(track_id)
+        return self._id_rows[i].as_py()
+
+    def vectors_of(self, rows):
+        """Scaled feature vectors of store rows."""
+        return np.asarray(self.vectors[np.asarray(self.positions)[np.asarray(rows)]])
+
+    def scale_features(self, features):
+        """Scale raw AUDIO_FEATURES rows into index space (for tracks that are not in the store)."""
+        return ((np.asarray(features, dtype=np.float32) - self.mean) / self.scale).astype(np.float32)
+
+    def _allowed(self, start, end, year, cluster, explicit):
+        mask = None
+        if year is not None:
+            lo, hi = year if isinstance(year, tuple) else (year, year)
+            values = self.year[start:end]
+            mask = (values >= lo) & (values <= hi)
+        if cluster is not None:
+            match = self.cluster[start:end] == cluster
+            mask = match if mask is None else mask & match
+        if explicit is not None:
+            match = self.explicit[start:end] == explicit
+            mask = match if mask is None else mask & match
+        return mask
+
+    def search(self, queries, k=K, nprobe=NPROBE, year=None, cluster=None, explicit=None, exclude=None):
+        """
+        k nearest store rows for every scaled query vector.
+
+        `year` is a year or an inclusive (lo, hi) range, `cluster` a cluster id
+        and `explicit` a bool; all optional. `exclude` holds one store row per
+        query to leave out (e.g. the seed itself). Returns (rows, squared
+        distances), both (n_queries, k); missing neighbours are -1 / inf.
+        """
+        queries = np.atleast_2d(np.asarray(queries, dtype=np.float32))
+        n = len(queries)
+        best_d = np.full((n, k), np.inf, dtype=np.float32)
+        best_p = np.full((n, k), -1, dtype=np.int64)
+        exclude_p = np.full(n, -1) if exclude is None else np.asarray(self.positions)[np.asarray(exclude)]
+        q_norms = (queries ** 2).sum(axis=1)
+        centroid_d = q_norms[:, None] - 2 * queries @ np.asarray(self.centroids).T + self._centroid_norms
+        ranked = np.argsort(centroid_d, axis=1)
+        pending, probed = np.arange(n), 0
+        nlist = len(self.centroids)
+
+        while len(pending):
+            nprobe = min(nprobe, nlist)
+            # Partitions probed in this round, grouped so each is read once for all its queries.
+            lists = ranked[pending, probed:nprobe]
+            owners = np.repeat(pending, lists.shape[1])
+            lists = lists.ravel()
+            order = np.argsort(lists, kind="stable")
+            lists, owners = lists[order], owners[order]
+            bounds = np.flatnonzero(np.r_[True, lists[1:] != lists[:-1], True])
+            for a, b in zip(bounds[:-1], bounds[1:]):
+                part, qs = lists[a], owners[a:b]
+                start, end = int(self.offsets[part]), int(self.offsets[part + 1])
+                if start == end:
+                    continue
+                pos = np.arange(start, end)
+                mask = self._allowed(start, end, year, cluster, explicit)
+                vectors, norms = self.vectors[start:end], self.norms[start:end]
+                if mask is not None:
+                    if not mask.any():
+                        continue
+                    pos, vectors, norms = pos[mask], vectors[mask], norms[mask]
+                d = q_norms[qs, None] - 2 * queries[qs] @ np.asarray(vectors).T + norms
+                d[pos[None, :] == exclude_p[qs, None]] = np.inf
+                merged_d = np.hstack([best_d[qs], d])
+                merged_p = np.hstack([best_p[qs], np.broadcast_to(pos, d.shape)])
+                keep = _top_k(merged_d, k)
+                best_d[qs] = np.take_along_axis(merged_d, keep, axis=1)
+                best_p[qs] = np.take_along_axis(merged_p, keep, axis=1)
+            probed = nprobe
+            # Constraints can leave fewer than k candidates: widen the probe for those queries only.
+            pending = pending[np.isinf(best_d[pending, -1])] if probed < nlist else pending[:0]
+            nprobe *= 4
+
+        rows = np.where(best_p >= 0, np.asarray(self.rows)[np.maximum(best_p, 0)], -1)
+        return rows, np.maximum(best_d, 0)
+
+    def similar(self, track_ids, k=K, nprobe=NPROBE, **constraints):
+        """k most similar store rows to each track id (excluding the track itself); returns (rows, distances)."""
+        seeds = np.array([self.row_of(track_id) for track_id in np.atleast_1d(track_ids)])
+        return self.search(self.vectors_of(seeds), k, nprobe, exclude=seeds, **constraints)
+
+
+def brute_force(matrix, queries, k=K, mask=None, exclude=None, chunk=64):
+    """Exact k-NN by full NumPy scan of `matrix` (rows in store order); returns (rows, squared distances)."""
+    norms = (matrix ** 2).sum(axis=1)
+    rows = np.empty((len(queries), k), dtype=np.int64)
+    dists = np.empty((len(queries), k), dtype=np.float32)
+    for s in range(0, len(queries), chunk):
+        q = queries[s:s + chunk]
+        d = (q ** 2).sum(axis=1)[:, None] - 2 * q @ matrix.T + norms
+        if mask is not None:
+            d[:, ~mask] = np.inf
+        if exclude is not None:
+            d[np.arange(len(q)), exclude[s:s + chunk]] = np.inf
+        top = _top_k(d, k)
+        rows[s:s + len(q)] = top
+        dists[s:s + len(q)] = np.take_along_axis(d, top, axis=1)
+    return rows, np.maximum(dists, 0)
+
+
+def benchmark(index, n_queries=200, k=K, seed=RANDOM_STATE):
+    """Print per-query latency, batch throughput and recall@k of the index vs brute-force NumPy."""
+    rng = np.random.default_rng(seed)
+    matrix = index.vectors_of(np.arange(len(index)))
+    seeds = rng.choice(len(index), n_queries, replace=False)
+    queries = matrix[seeds]
+    year = np.asarray(index.year)[np.asarray(index.positions)]
+    explicit = np.asarray(index.explicit)[np.asarray(index.positions)]
+    print(f"{len(index):,} tracks, nlist {index.meta['nlist']}, {index.meta['disk_mb']} MB on disk, "
+          f"built in {index.meta['build_s']}s")
+
+    scenarios = {
+        "unconstrained": ({}, None),
+        "year 2000-2009, clean": ({"year": (2000, 2009), "explicit": False},
+                                  (year >= 2000) & (year <= 2009) & ~explicit),
+    }
+    for label, (constraints, mask) in scenarios.items():
+        start = time.perf_counter()
+        exact, _ = brute_force(matrix, queries, k, mask=mask, exclude=seeds)
+        brute_ms = (time.perf_counter() - start) / n_queries * 1000
+        print(f"\n{label}: brute force {brute_ms:.2f} ms/query (batched)")
+        for nprobe in (4, 8, 16, 32, 64):
+            latencies = []
+            for q, s in zip(queries, seeds):
+                start = time.perf_counter()
+                index.search(q, k, nprobe, exclude=[s], **constraints)
+                latencies.append((time.perf_counter() - start) * 1000)
+            start = time.perf_counter()
+            found, _ = index.search(queries, k, nprobe, exclude=seeds, **constraints)
+            batch_s = time.perf_counter() - start
+            recall = np.mean([len(np.intersect1d(f, e)) / k for f, e in zip(found, exact)])
+            print(f"  nprobe {nprobe:3d}  p50 {np.percentile(latencies, 50):6.2f} ms  p95 {np.percentile(latencies, 95):6.2f} ms"
+                  f"  batch {n_queries / batch_s:8,.0f} q/s  recall@{k} {recall:.3f}")
+
+
+if __name__ == "__main__":
+    from scripts.synthetic_tracks import SCALE_FACTORS, synthetic_tracks
+
+    parser = argparse.ArgumentParser(description="Build or benchmark the similar-tracks index.")
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--nlist", type=int, default=NLIST)
+    parser.add_argument("--benchmark", action="store_true", help="latency / recall vs brute force")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--scale", choices=SCALE_FACTORS, help="build and benchmark on a synthetic catalogue")
+    args = parser.parse_args()
+
+    if args.scale:
+        table = synthetic_tracks(SCALE_FACTORS[args.scale]).select(["id"] + AUDIO_FEATURES + ["year", "cluster", "explicit"])
+        index_dir = os.path.join(args.store, "similarity-synthetic")
+        build(table, index_dir, args.nlist)
+    else:
+        index_dir = os.path.join(args.store, "similarity")
+        if not args.benchmark or SimilarityIndex.open(args.store) is None:
+            build_store_index(args.store, index_dir, args.nlist)
+
+    start = time.perf_counter()
+    index = SimilarityIndex(index_dir)
+    print(f"Index {index_dir}: {len(index):,} tracks, opened in {(time.perf_counter() - start) * 1000:.1f} ms "
+          f"(build {index.meta['build_s']}s, peak +{index.meta['peak_mem_mb']} MB, {index.meta['disk_mb']} MB on disk)")
+    if args.benchmark:
+        benchmark(index, args.queries)
+    if args.scale:
+        shutil.rmtree(index_dir)
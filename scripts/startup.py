@@ -0,0 +1,186 @@
+"""
+App startup: deferred heavy imports, background warm-up and a startup profile.
+
+`ui/app.py` routes through `st.navigation`, so the first visit to a page used
+to pay for every module the page imports plus every artifact it opens. Pages
+now import only what renders their first screen (XGBoost, scikit-learn and
+the LLM pipeline are imported where they are used), and the first session
+starts a `WarmUp` thread that imports the heavy modules and opens the track
+store, query backend, rollups, promotion model and similar-tracks index
+through the same `st.cache_resource` / `st.cache_data` entries the pages use.
+A page that asks for something still warming waits on the cache's per-key
+lock instead of loading it a second time.
+
+The profile renders every page headlessly (`streamlit.testing`) in a fresh
+interpreter running under `python -X importtime`: once cold, and once after
+the warm-up has finished, which is what a visitor sees once the server is up.
+It reports render times, the heaviest imports per page and the per-task
+warm-up times, and exits non-zero when a warmed page (or the cold landing
+page) takes longer than the budget, so it can gate CI.
+
+    python -m scripts.startup                     # profile every page against the default budget
+    python -m scripts.startup --budget-ms 1000 --pages app.py 3_promotion_model.py
+"""
+
+import argparse
+import json
+import logging
+import os
+import subprocess
+import sys
+import threading
+import time
+
+from scripts.track_store import PROJECT_ROOT
+
+UI_DIR = os.path.join(PROJECT_ROOT, "ui")
+PAGES = ["app.py", "0_global_dashboard.py", "1_track_explorer.py", "2_mood_clusters.py",
+         "3_promotion_model.py", "4_query_benchmark.py", "5_performance.py"]
+# Imported by the warm-up thread before anything is opened; each costs 0.2-1.5 s cold.
+HEAVY_MODULES = ("plotly.express", "xgboost", "sklearn")
+FIRST_PAGE_BUDGET_MS = 2000
+RENDER_TIMEOUT_S = 600
+WARM_UP_THREAD = "sil-warm-up"
+RENDER_MARKER = "--- render ---"
+
+
+class _SkipWarmUpThread(logging.Filter):
+    """Drops Streamlit's "missing ScriptRunContext" warning for cache calls made from the warm-up thread."""
+
+    def filter(self, record):
+        return record.threadName != WARM_UP_THREAD
+
+
+class WarmUp:
+    """Runs `(name, fn)` tasks in order on a daemon thread, recording each one's wall time and any error."""
+
+    def __init__(self, tasks):
+        self.tasks = list(tasks)
+        self.timings = {}
+        self.errors = {}
+        self._thread = threading.Thread(target=self._run, name=WARM_UP_THREAD, daemon=True)
+
+    def start(self):
+        for name in ("streamlit.runtime.scriptrunner_utils.script_run_context", "streamlit"):
+            logging.getLogger(name).addFilter(_SkipWarmUpThread())
+        self._thread.start()
+        return self
+
+    def _run(self):
+        for name, fn in self.tasks:
+            start = time.perf_counter()
+            try:
+                fn()
+            except Exception as exc:  # a missing artifact must not stop the remaining tasks
+                self.errors[name] = f"{type(exc).__name__}: {exc}"
+            self.timings[name] = (time.perf_counter() - start) * 1000
+
+    @property
+    def done(self):
+        return not self._thread.is_alive() and len(self.timings) == len(self.tasks)
+
+    def wait(self, timeout=None):
+        self._thread.join(timeout)
+        return self.done
+
+
+def preload(modules=HEAVY_MODULES):
+    """A warm-up task importing `modules`, so pages that import them later get them from sys.modules."""
+    import importlib
+
+    def task():
+        for module in modules:
+            importlib.import_module(module)
+
+    return task
+
+
+def parse_importtime(stderr, after=None):
+    """
+    Import ms per root package (the sum of its modules' own time), from
+    `python -X importtime` output; only imports logged after the `after` line when given.
+    """
+    lines = stderr.splitlines()
+    if after is not None and after in lines:
+        lines = lines[lines.index(after) + 1:]
+    totals = {}
+    for line in lines:
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        own, _, name = line[len("import time:"):].split("|")
+        root = name.strip().split(".")[0]
+        totals[root] = totals.get(root, 0.0) + int(own) / 1000
+    return totals
+
+
+def render(page, warm=False):
+    """Render `page` headlessly in this process; returns timings (ms), after running the warm-up first if `warm`."""
+    start = time.perf_counter()
+    from streamlit.testing.v1 import AppTest
+
+    result = {"page": page, "testing_import_ms": (time.perf_counter() - start) * 1000}
+    if warm:
+        sys.path.insert(0, UI_DIR)
+        import track_data
+
+        start = time.perf_counter()
+        warm_up = track_data.warm_up()
+        warm_up.wait()
+        result.update(warm_up_ms=(time.perf_counter() - start) * 1000, tasks=warm_up.timings, errors=warm_up.errors)
+
+    print(RENDER_MARKER, file=sys.stderr, flush=True)
+    start = time.perf_counter()
+    app = AppTest.from_file(os.path.join(UI_DIR, page), default_timeout=RENDER_TIMEOUT_S).run()
+    result["render_ms"] = (time.perf_counter() - start) * 1000
+    result["exceptions"] = [e.message for e in app.exception]
+    return result
+
+
+def profile_page(page, warm=False):
+    """`render` in a fresh interpreter under -X importtime; adds the ms per package imported by the page itself."""
+    command = [sys.executable, "-X", "importtime", "-m", "scripts.startup", "--render", page]
+    proc = subprocess.run(command + (["--warm"] if warm else []), cwd=PROJECT_ROOT,
+                          capture_output=True, text=True, timeout=RENDER_TIMEOUT_S)
+    if proc.returncode != 0:
+        raise RuntimeError(f"Rendering {page} failed:\n{proc.stderr[-2000:]}")
+    result = json.loads(proc.stdout.strip().splitlines()[-1])
+    result["imports"] = parse_importtime(proc.stderr, after=RENDER_MARKER)
+    return result
+
+
+def report(pages=PAGES, budget_ms=FIRST_PAGE_BUDGET_MS, top=4):
+    """Print the cold / warmed render profile of `pages`; returns the pages over `budget_ms`."""
+    over = []
+    print(f"{'page':24s} {'cold':>9s} {'warmed':>9s}   heaviest imports of the cold render (ms)")
+    for page in pages:
+        cold, warmed = profile_page(page), profile_page(page, warm=True)
+        heaviest = sorted(cold["imports"].items(), key=lambda item: -item[1])[:top]
+        print(f"{page:24s} {cold['render_ms']:7.0f}ms {warmed['render_ms']:7.0f}ms   "
+              + ", ".join(f"{name} {ms:.0f}" for name, ms in heaviest))
+        for label, result in (("cold", cold), ("warmed", warmed)):
+            if result["exceptions"]:
+                print(f"  {label} render raised: {result['exceptions'][0]}")
+        # The landing page is rendered before any warm-up can finish; every other page after it.
+        if (cold if page == PAGES[0] else warmed)["render_ms"] > budget_ms:
+            over.append(page)
+
+    print(f"\nBackground warm-up ({warmed['warm_up_ms']:.0f} ms in total):")
+    for name, ms in warmed["tasks"].items():
+        print(f"  {name:24s} {ms:7.0f} ms" + (f"   {warmed['errors'][name]}" if name in warmed["errors"] else ""))
+    print(f"\nBudget {budget_ms} ms for the cold landing page and warmed pages: "
+          + (f"OVER for {', '.join(over)}" if over else "OK"))
+    return over
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Profile page import and render times against a startup budget.")
+    parser.add_argument("--pages", nargs="+", default=PAGES, help="page files under ui/")
+    parser.add_argument("--budget-ms", type=float, default=FIRST_PAGE_BUDGET_MS)
+    parser.add_argument("--render", help=argparse.SUPPRESS)
+    parser.add_argument("--warm", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.render:
+        print(json.dumps(render(args.render, args.warm)))
+    else:
+        sys.exit(1 if report(args.pages, args.budget_ms) else 0)
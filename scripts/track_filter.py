@@ -0,0 +1,104 @@
+"""
+Indexed multi-predicate range filtering for the Track Explorer.
+
+Every indexed column gets a sort-order view. Columns that are already
+sorted in row order (the store is partitioned by year, so `year` is) use
+the identity permutation: a range on them is a contiguous slice of rows.
+The other columns keep an argsort permutation plus their sorted values, so a
+range is a contiguous span of that permutation.
+
+A query turns each predicate into a span with two binary searches, picks the
+cheapest driving span under a simple cost model (contiguous slices scan
+vectorized, permutation spans pay a random gather per row), and checks the
+remaining predicates only on the driving candidates.
+"""
+
+from collections import namedtuple
+
+import numpy as np
+
+FILTER_COLUMNS = ["year", "danceability", "energy", "tempo"]
+
+# Relative per-row, per-predicate costs measured on 1.2M rows.
+SCAN_COST = 1.0
+GATHER_COST = 10.0
+
+FilterResult = namedtuple("FilterResult", ["count", "rows", "plan"])
+
+
+class _ColumnIndex:
+    def __init__(self, values):
+        self.values = np.ascontiguousarray(values)
+        self.clustered = bool(len(values) < 2 or np.all(self.values[1:] >= self.values[:-1]))
+        if self.clustered:
+            self.order = None
+            self.sorted = self.values
+        else:
+            self.order = np.argsort(self.values, kind="stable").astype(np.int32)
+            self.sorted = self.values[self.order]
+
+    def span(self, lo, hi):
+        start = 0 if lo is None else int(np.searchsorted(self.sorted, lo, side="left"))
+        stop = len(self.sorted) if hi is None else int(np.searchsorted(self.sorted, hi, side="right"))
+        return start, max(start, stop)
+
+
+class TrackFilterIndex:
+    """Answer conjunctions of inclusive `lo <= column <= hi` predicates (either bound may be None)."""
+
+    def __init__(self, columns):
+        self._columns = {name: _ColumnIndex(values) for name, values in columns.items()}
+        self.num_rows = len(next(iter(self._columns.values())).values) if self._columns else 0
+
+    @classmethod
+    def from_frame(cls, frame, columns=FILTER_COLUMNS):
+        return cls({name: frame[name].to_numpy() for name in columns})
+
+    def _plan(self, ranges):
+        spans = {name: self._columns[name].span(*bounds) for name, bounds in ranges.items()}
+        best = ("scan", None, (0, self.num_rows), self.num_rows * len(ranges) * SCAN_COST)
+        for name, (start, stop) in spans.items():
+            others = len(ranges) - 1
+            if self._columns[name].clustered:
+                cost = (stop - start) * others * SCAN_COST
+                kind = "slice"
+            else:
+                cost = (stop - start) * (others + 1) * GATHER_COST
+                kind = "gather"
+            if cost < best[3]:
+                best = (kind, name, (start, stop), cost)
+        return best[:3]
+
+    def query(self, ranges, offset=0, limit=100):
+        """Return the match count and the row ids of one page of matches, in row order."""
+        ranges = {name: bounds for name, bounds in ranges.items() if bounds != (None, None)}
+        kind, driver, (start, stop) = self._plan(ranges)
+        residual = {name: bounds for name, bounds in ranges.items() if name != driver}
+
+        if kind == "gather":
+            candidates = self._columns[driver].order[start:stop]
+            for name, (lo, hi) in residual.items():
+                values = self._columns[name].values[candidates]
+                candidates = candidates[_between(values, lo, hi)]
+            count = len(candidates)
+            end = count if limit is None else min(offset + limit, count)
+            if end < count:
+                candidates = np.partition(candidates, end - 1)[:end] if end else candidates[:0]
+            rows = np.sort(candidates)[offset:end]
+        else:
+            mask = np.ones(stop - start, dtype=bool)
+            for name, (lo, hi) in residual.items():
+                mask &= _between(self._columns[name].values[start:stop], lo, hi)
+            matches = np.flatnonzero(mask)
+            count = len(matches)
+            end = count if limit is None else offset + limit
+            rows = matches[offset:end] + start
+        return FilterResult(count, rows, kind if driver is None else f"{kind}:{driver}")
+
+
+def _between(values, lo, hi):
+    if lo is None:
+        return values <= hi
+    if hi is None:
+        return values >= lo
+    return (values >= lo) & (values <= hi)
@@ -0,0 +1,161 @@
+"""
+Album / track lookup index for the promotion page.
+
+The page used to fill an album selectbox with `sorted(df["album"].unique())`
+(every album, shipped to the browser on each rerun) and to find the selected
+track with two full-column scans. This index is built once per store version
+(~1 s for 1.2M rows) and shared by every session:
+
+- rows sorted by (album, name), with one `[start, end)` range per album:
+  album -> its tracks is a binary search plus a slice, and
+  (album, name) -> row id is a second binary search inside that range;
+- a sorted, case-insensitive prefix index over album, track and artist
+  names: every distinct key maps to the rows that carry it, so
+  search-as-you-type is two binary searches plus a slice, and only the top
+  matches go to the browser.
+
+    python -m scripts.track_lookup --scale 1.2M    # build time and lookups vs pandas scans
+"""
+
+import argparse
+import time
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.compute as pc
+
+TOP_MATCHES = 50
+# Sorts after every character a prefix can be followed by, so [prefix, prefix + MAX_CHAR) spans all completions.
+MAX_CHAR = "\U0010ffff"
+
+
+def split_artists(artists):
+    """(artist, row id) pairs from the "['A', 'B']" strings of the `artists` column."""
+    artists = pa.chunked_array(artists).combine_chunks() if isinstance(artists, pa.ChunkedArray) else artists
+    inner = pc.utf8_slice_codeunits(artists, 2, -2)
+    # Names containing an apostrophe are double-quoted, so a separator may mix quote styles.
+    names = pc.split_pattern_regex(inner, r"['\"], ['\"]")
+    return pc.list_flatten(names), pc.list_parent_indices(names).to_numpy()
+
+
+class PrefixIndex:
+    """Sorted distinct lower-cased keys of a string column, each mapped to the rows holding it."""
+
+    def __init__(self, values, rows):
+        encoded = pc.utf8_lower(values).dictionary_encode()
+        keys = encoded.dictionary
+        by_key = pc.sort_indices(keys).to_numpy()
+        rank = np.empty(len(by_key), dtype=np.int64)
+        rank[by_key] = np.arange(len(by_key))
+        key_of = rank[encoded.indices.to_numpy(zero_copy_only=False)]
+
+        self.keys = keys.take(pa.array(by_key)).to_numpy(zero_copy_only=False)
+        self.rows = np.asarray(rows, dtype=np.int32)[np.argsort(key_of, kind="stable")]
+        self.offsets = np.zeros(len(self.keys) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(key_of, minlength=len(self.keys)), out=self.offsets[1:])
+
+    def search(self, prefix, limit=TOP_MATCHES):
+        """Rows of the first `limit` keys (in key order) starting with `prefix`, case-insensitively."""
+        prefix = prefix.lower()
+        lo = np.searchsorted(self.keys, prefix)
+        hi = min(np.searchsorted(self.keys, prefix + MAX_CHAR), lo + limit)
+        return self.rows[self.offsets[lo]:self.offsets[hi]]
+
+
+class TrackLookup:
+    """Album ranges, (album, name) -> row id, and typeahead search over a store's album/name/artists columns."""
+
+    def __init__(self, table):
+        album, name = table["album"].combine_chunks(), table["name"].combine_chunks()
+        self._name = name
+        self.order = pc.sort_indices(pa.table({"album": album, "name": name}),
+                                     [("album", "ascending"), ("name", "ascending")]).to_numpy().astype(np.int32)
+        sorted_albums = album.take(pa.array(self.order))
+        starts = np.flatnonzero(pc.not_equal(sorted_albums[1:], sorted_albums[:-1]).to_numpy(zero_copy_only=False)) + 1
+        self.album_starts = np.concatenate([[0], starts, [len(self.order)]]).astype(np.int64)
+        self.albums = sorted_albums.take(pa.array(self.album_starts[:-1])).to_numpy(zero_copy_only=False)
+        # Position of every row in the sorted order, to map search hits back to albums.
+        self._rank = np.empty(len(self.order), dtype=np.int32)
+        self._rank[self.order] = np.arange(len(self.order), dtype=np.int32)
+
+        all_rows = np.arange(len(self.order))
+        artists, artist_rows = split_artists(table["artists"].combine_chunks())
+        self.prefix = {
+            "album": PrefixIndex(album, all_rows),
+            "name": PrefixIndex(name, all_rows),
+            "artists": PrefixIndex(artists, artist_rows),
+        }
+
+    def __len__(self):
+        return len(self.order)
+
+    def album_range(self, album):
+        """[start, end) positions of `album` in the sorted order; KeyError if unknown."""
+        i = np.searchsorted(self.albums, album)
+        if i == len(self.albums) or self.albums[i] != album:
+            raise KeyError(album)
+        return int(self.album_starts[i]), int(self.album_starts[i + 1])
+
+    def _names(self, start, end):
+        return self._name.take(pa.array(self.order[start:end])).to_numpy(zero_copy_only=False)
+
+    def album_tracks(self, album):
+        """Distinct track names of `album`, sorted."""
+        names = self._names(*self.album_range(album))
+        return names[np.r_[True, names[1:] != names[:-1]]].tolist()
+
+    def row(self, album, name):
+        """Row id of the first track called `name` on `album`; KeyError if there is none."""
+        start, end = self.album_range(album)
+        names = self._names(start, end)
+        i = np.searchsorted(names, name)
+        if i == len(names) or names[i] != name:
+            raise KeyError((album, name))
+        return int(self.order[start + i])
+
+    def albums_of(self, rows):
+        """Album of each row id."""
+        return self.albums[np.searchsorted(self.album_starts, self._rank[rows], side="right") - 1]
+
+    def search_albums(self, query, limit=TOP_MATCHES):
+        """
+        Up to `limit` albums matching `query` as a prefix of the album, one of
+        its track names or one of its artists (in that priority); the first
+        `limit` albums when the query is empty.
+        """
+        query = query.strip()
+        if not query:
+            return self.albums[:limit].tolist()
+        found = []
+        for field in ("album", "name", "artists"):
+            hits = self.albums_of(self.prefix[field].search(query, limit))
+            found.extend(hits[np.sort(np.unique(hits, return_index=True)[1])])
+        return list(dict.fromkeys(found))[:limit]
+
+
+if __name__ == "__main__":
+    from scripts.synthetic_tracks import SCALE_FACTORS, synthetic_tracks
+
+    parser = argparse.ArgumentParser(description="Build the album/track lookup index and time it against pandas scans.")
+    parser.add_argument("--scale", choices=SCALE_FACTORS, default="1.2M")
+    args = parser.parse_args()
+
+    table = synthetic_tracks(SCALE_FACTORS[args.scale], with_derived=False).select(["album", "name", "artists"])
+    df = table.to_pandas()
+    start = time.perf_counter()
+    lookup = TrackLookup(table)
+    print(f"{len(lookup):,} rows, {len(lookup.albums):,} albums: index built in {time.perf_counter() - start:.2f}s")
+
+    album, name = df["album"].iloc[len(df) // 2], df["name"].iloc[len(df) // 2]
+
+    def report(label, fn, repeat=5):
+        start = time.perf_counter()
+        for _ in range(repeat):
+            fn()
+        print(f"  {label:44s} {(time.perf_counter() - start) / repeat * 1000:9.3f} ms")
+
+    report("pandas: sorted(album.unique())", lambda: sorted(df["album"].unique()))
+    report("pandas: album tracks + row (two scans)", lambda: (
+        sorted(df[df["album"] == album]["name"].unique()), df[(df["album"] == album) & (df["name"] == name)].iloc[0]))
+    report("index: search_albums('al') top 50", lambda: lookup.search_albums(album[:2]), repeat=100)
+    report("index: album_tracks + row", lambda: (lookup.album_tracks(album), lookup.row(album, name)), repeat=100)
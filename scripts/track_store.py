@@ -0,0 +1,530 @@
+"""
+Typed columnar store for the Spotify tracks catalogue.
+
+The store replaces the per-page `pd.read_csv` calls: the CSV is parsed once
+into uncompressed Arrow IPC files (one part per release year) which are then
+memory-mapped by every reader. Opening the store costs a few milliseconds,
+only the requested columns are ever touched, and all readers in a process
+share the same OS pages.
+
+Layout of `data/store/`:
+
+    manifest.json                        data version, schema and part list
+    tracks/year=YYYY/part-NNNN.arrow     Arrow IPC file per year partition
+    tracks/year=YYYY/part-NNNN.parquet   zstd Parquet mirror for SQL engines
+    tracks/delta/part-NNNN.*             rows appended by a refresh (scripts/refresh.py)
+    tracks/deleted-NNNN.parquet          (part, row) of the rows those refreshes superseded
+    sidecars/<name>.arrow                derived columns aligned row-for-row with the parts
+    sidecars/<name>.delta.arrow          the same for the delta parts
+    sidecars/<name>.parquet              the same keyed by id, for SQL engines
+    sidecars/<name>.json                 store version the sidecar was computed against
+    models/                              artifacts extending the CSV's clusters and t-SNE to new rows
+
+Derived columns of the source CSV (cluster, t-SNE coordinates, promoted) are
+not copied into the parts: they become narrow sidecars (int8 / float32 /
+int8, a few bytes per row) aligned with the parts and joined zero-copy on
+open, the same files the clustering, embedding and training pipelines
+rewrite when they recompute them. Their metadata points at artifacts fitted
+to the CSV's own values, so a refresh can derive them for new tracks.
+
+The store's rows are the parts' rows in manifest order minus the superseded
+ones; row ids everywhere (sidecars aside) count only those live rows.
+Refresh compaction rewrites the live rows as year parts again.
+"""
+
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import threading
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pacsv
+import pyarrow.parquet as pq
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+DATA_DIR = os.path.join(PROJECT_ROOT, "data")
+STORE_DIR = os.path.join(DATA_DIR, "store")
+SOURCE_CSV = os.path.join(DATA_DIR, "spotify_tracks_with_clusters_and_uplift.csv")
+MANIFEST_NAME = "manifest.json"
+SIDECAR_DIR = "sidecars"
+MODEL_DIR = "models"
+STORE_FORMAT = 2
+PARQUET_ROW_GROUP = 65536
+# Up to this many superseded rows the live table is zero-copy slices of the parts;
+# past it, a filtered copy is cheaper than one chunk per gap.
+SLICE_LIMIT = 1024
+
+# --- Column groups
+AUDIO_FEATURES = [
+    "danceability",
+    "energy",
+    "loudness",
+    "speechiness",
+    "acousticness",
+    "instrumentalness",
+    "liveness",
+    "valence",
+    "tempo",
+]
+MODEL_FEATURES = AUDIO_FEATURES + ["duration_min", "year"]
+
+# Audio features stay float64 so slider thresholds compare exactly as they did on the CSV.
+BASE_SCHEMA = pa.schema(
+    [
+        ("id", pa.string()),
+        ("name", pa.string()),
+        ("album", pa.string()),
+        ("artists", pa.string()),
+        ("explicit", pa.bool_()),
+    ]
+    + [(feature, pa.float64()) for feature in AUDIO_FEATURES]
+    + [
+        ("duration_min", pa.float64()),
+        ("year", pa.int16()),
+        ("release_date", pa.date32()),
+    ]
+)
+DERIVED_SCHEMA = pa.schema(
+    [
+        ("cluster", pa.int8()),
+        ("tsne_1", pa.float32()),
+        ("tsne_2", pa.float32()),
+        ("promoted", pa.int8()),
+    ]
+)
+BASE_COLUMNS = BASE_SCHEMA.names
+# Sidecars that DERIVED_SCHEMA columns are split into at ingest; named after the
+# pipelines that recompute them (mood_clustering, mood_embedding, train_promotion).
+DERIVED_SIDECARS = {"clusters": ["cluster"], "tsne": ["tsne_1", "tsne_2"], "promotion_labels": ["promoted"]}
+
+
+def file_sha256(path, chunk_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(chunk_size), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_manifest(store_dir=STORE_DIR):
+    with open(os.path.join(store_dir, MANIFEST_NAME)) as f:
+        return json.load(f)
+
+
+def data_version(store_dir=STORE_DIR):
+    """Short hash identifying the data currently in the store; use it to key caches."""
+    return read_manifest(store_dir)["version"]
+
+
+# --- Building
+def _csv_header(path):
+    with open(path, newline="", encoding="utf-8") as f:
+        return f.readline().strip().split(",")
+
+
+def read_source_csv(path):
+    """Parse a tracks CSV (cleaned, clustered or with uplift labels) into a typed Arrow table."""
+    header = _csv_header(path)
+    fields = [field for field in list(BASE_SCHEMA) + list(DERIVED_SCHEMA) if field.name in header]
+    missing = [name for name in BASE_COLUMNS if name not in header]
+    if missing:
+        raise ValueError(f"{path} is missing required columns: {missing}")
+
+    table = pacsv.read_csv(
+        path,
+        convert_options=pacsv.ConvertOptions(
+            column_types={field.name: field.type for field in fields},
+            include_columns=[field.name for field in fields],
+        ),
+    )
+    return table
+
+
+def _write_ipc(table, path):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with pa.OSFile(path, "wb") as sink:
+        with pa.ipc.new_file(sink, table.schema) as writer:
+            writer.write_table(table)
+
+
+class PartWriter:
+    """
+    Streams tables into one Arrow IPC part (plus Parquet mirror) per year.
+
+    Each `write` appends to the open per-year files, so memory is bounded by
+    the largest table passed in rather than by the whole dataset. Rows keep
+    their input order within a year.
+    """
+
+    def __init__(self, store_dir, part_number=0):
+        self.store_dir = store_dir
+        self.part_number = part_number
+        self.schema = None
+        self.rows = 0
+        self._parts = {}
+
+    def _open(self, year):
+        path = f"tracks/year={year}/part-{self.part_number:04d}.arrow"
+        full_path = os.path.join(self.store_dir, path)
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        sink = pa.OSFile(full_path, "wb")
+        parquet_path = path.replace(".arrow", ".parquet")
+        return {
+            "entry": {"path": path, "parquet": parquet_path, "year": year, "rows": 0},
+            "sink": sink,
+            "ipc": pa.ipc.new_file(sink, self.schema),
+            "parquet": pq.ParquetWriter(os.path.join(self.store_dir, parquet_path), self.schema, compression="zstd"),
+        }
+
+    def write(self, table):
+        if self.schema is None:
+            self.schema = table.schema
+        table = table.take(pc.sort_indices(table["year"]))
+        years = table["year"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, years[1:] != years[:-1]]) if len(years) else np.array([], dtype=int)
+        stops = np.r_[starts[1:], len(years)]
+        for start, stop in zip(starts, stops):
+            year = int(years[start])
+            part = self._parts.get(year) or self._parts.setdefault(year, self._open(year))
+            chunk = table.slice(start, stop - start)
+            part["ipc"].write_table(chunk)
+            # Row groups keep min/max stats small enough for DuckDB to skip most of a part.
+            part["parquet"].write_table(chunk, row_group_size=PARQUET_ROW_GROUP)
+            part["entry"]["rows"] += int(stop - start)
+        self.rows += table.num_rows
+
+    def close(self):
+        """Finish every part and return their manifest entries in year order."""
+        for part in self._parts.values():
+            part["ipc"].close()
+            part["sink"].close()
+            part["parquet"].close()
+        return [self._parts[year]["entry"] for year in sorted(self._parts)]
+
+
+def write_parts(table, store_dir, part_number=0):
+    """Write `table` as one Arrow IPC part (plus Parquet mirror) per year; return the manifest entries."""
+    writer = PartWriter(store_dir, part_number)
+    writer.write(table)
+    return writer.close()
+
+
+def write_delta_part(table, store_dir, part_number):
+    """Write `table` in row order as one unpartitioned part (plus Parquet mirror); return its manifest entry."""
+    path = f"tracks/delta/part-{part_number:04d}.arrow"
+    parquet_path = path.replace(".arrow", ".parquet")
+    _write_ipc(table, os.path.join(store_dir, path))
+    pq.write_table(table, os.path.join(store_dir, parquet_path), compression="zstd", row_group_size=PARQUET_ROW_GROUP)
+    return {"path": path, "parquet": parquet_path, "rows": table.num_rows}
+
+
+class StoreBuilder:
+    """
+    Builds a new store from tables written in any number of batches, then
+    replaces `store_dir` atomically; readers never see a half-written store.
+
+        with StoreBuilder(store_dir, source_path) as builder:
+            for table in tables:
+                builder.write(table)
+        builder.manifest
+    """
+
+    def __init__(self, store_dir, source_path):
+        self.store_dir = store_dir
+        self.source_path = source_path
+        self.tmp_dir = store_dir + ".tmp"
+        self.manifest = None
+
+    def __enter__(self):
+        shutil.rmtree(self.tmp_dir, ignore_errors=True)
+        self._writer = PartWriter(self.tmp_dir)
+        return self
+
+    def write(self, table):
+        self._writer.write(table)
+
+    def __exit__(self, exc_type, *exc):
+        parts = self._writer.close()
+        if exc_type is not None:
+            shutil.rmtree(self.tmp_dir, ignore_errors=True)
+            return False
+
+        source_hash = file_sha256(self.source_path)
+        self.manifest = {
+            "format": STORE_FORMAT,
+            "version": hashlib.sha256(f"{STORE_FORMAT}:{source_hash}".encode()).hexdigest()[:16],
+            "source": os.path.relpath(self.source_path, PROJECT_ROOT),
+            "source_sha256": source_hash,
+            "built_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+            "rows": self._writer.rows,
+            "schema": {field.name: str(field.type) for field in self._writer.schema},
+            "parts": parts,
+        }
+        with open(os.path.join(self.tmp_dir, MANIFEST_NAME), "w") as f:
+            json.dump(self.manifest, f, indent=2)
+
+        shutil.rmtree(self.store_dir, ignore_errors=True)
+        os.replace(self.tmp_dir, self.store_dir)
+        return False
+
+
+def build_store(source_csv=SOURCE_CSV, store_dir=STORE_DIR):
+    """
+    Build the store from `source_csv`, replacing any existing store atomically.
+    Derived columns present in the CSV are written as DERIVED_SIDECARS.
+    """
+    table = read_source_csv(source_csv)
+    # PartWriter groups rows by year (stable); sorting up front keeps the sidecars in part order.
+    table = table.take(pc.sort_indices(table["year"]))
+    with StoreBuilder(store_dir, source_csv) as builder:
+        builder.write(table.select(BASE_COLUMNS))
+    source = os.path.relpath(source_csv, PROJECT_ROOT)
+    artifacts = _ingest_artifacts(table, store_dir)
+    for name, columns in DERIVED_SIDECARS.items():
+        if all(column in table.column_names for column in columns):
+            write_sidecar(name, table.select(["id"] + columns), store_dir,
+                          meta={"source": source, **artifacts.get(name, {})})
+    return builder.manifest
+
+
+def _valid_rows(table, columns):
+    mask = None
+    for column in columns:
+        if table[column].null_count:
+            valid = pc.is_valid(table[column])
+            mask = valid if mask is None else pc.and_(mask, valid)
+    return table if mask is None else table.filter(mask)
+
+
+def _ingest_artifacts(table, store_dir):
+    """
+    Artifacts that extend the CSV's cluster labels (label centroids) and t-SNE
+    coordinates (landmarks) to tracks added later, saved under
+    `<store>/models/`. Refresh derives the delta rows from them, the way it
+    does for the pipelines' own artifacts. Returns {sidecar name: meta}.
+    """
+    from scripts import mood_clustering, mood_embedding
+
+    directory = os.path.join(store_dir, MODEL_DIR)
+    os.makedirs(directory, exist_ok=True)
+    metas, mean, scale = {}, None, None
+    if "cluster" in table.column_names:
+        labeled = _valid_rows(table, ["cluster"])
+        path = os.path.join(directory, os.path.basename(mood_clustering.ARTIFACT_PATH))
+        artifact = mood_clustering.artifact_from_labels(labeled, labeled["cluster"].to_numpy(), path)
+        mean, scale = np.array(artifact["mean"]), np.array(artifact["scale"])
+        metas["clusters"] = {"artifact": os.path.relpath(path, PROJECT_ROOT), "k": artifact["k"]}
+    if "tsne_1" in table.column_names and "tsne_2" in table.column_names:
+        placed = _valid_rows(table, ["tsne_1", "tsne_2"])
+        if mean is None:
+            scaler = mood_clustering.fit_scaler(placed)
+            mean, scale = scaler.mean_, scaler.scale_
+        strata = placed["cluster"].fill_null(-1).to_numpy() if "cluster" in placed.column_names else None
+        coords = np.column_stack([placed["tsne_1"].to_numpy(), placed["tsne_2"].to_numpy()])
+        embedding, rows = mood_embedding.from_coords(placed, coords, mean, scale, strata=strata)
+        path = os.path.join(directory, os.path.basename(mood_embedding.ARTIFACT_PATH))
+        embedding.save(path)
+        metas["tsne"] = {"artifact": os.path.relpath(path, PROJECT_ROOT), "landmarks": len(rows)}
+    return metas
+
+
+# --- Sidecars
+def write_sidecar(name, table, store_dir=STORE_DIR, meta=None, manifest=None):
+    """
+    Persist derived columns computed from the store (scores, embeddings...) as
+    `sidecars/<name>.*`. `table` must be aligned row-for-row with `open_store()`
+    and include the `id` column; it is dropped from the Arrow file and kept in
+    the Parquet copy, which is sorted by id so SQL point lookups skip row
+    groups on their min/max stats. The Arrow file is aligned with the parts,
+    so rows a refresh superseded get nulls. `manifest` is the store's by
+    default; a compaction passes the one it is about to commit.
+    """
+    manifest = manifest or read_manifest(store_dir)
+    if table.num_rows != manifest["rows"]:
+        raise ValueError(f"Sidecar {name!r} has {table.num_rows} rows, store has {manifest['rows']}")
+
+    directory = os.path.join(store_dir, SIDECAR_DIR)
+    base = os.path.join(directory, name)
+    deleted = deleted_rows(manifest, store_dir)
+    physical = table.drop_columns(["id"])
+    if len(deleted):
+        live = np.ones(manifest["rows"] + len(deleted), dtype=bool)
+        live[deleted] = False
+        index = np.zeros(len(live), dtype=np.int64)
+        index[live] = np.arange(manifest["rows"])
+        physical = physical.take(pa.array(index, mask=~live))
+    # Write-then-rename so running apps keep reading (and memory-mapping) the old files.
+    _write_ipc(physical, base + ".arrow.tmp")
+    pq.write_table(table.take(pc.sort_indices(table["id"])), base + ".parquet.tmp", compression="zstd",
+                   row_group_size=PARQUET_ROW_GROUP)
+    info = {
+        "name": name,
+        "store_version": manifest["version"],
+        "rows": table.num_rows,
+        "columns": {field.name: str(field.type) for field in table.schema if field.name != "id"},
+        "written_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        **(meta or {}),
+    }
+    with open(base + ".json.tmp", "w") as f:
+        json.dump(info, f, indent=2)
+    for ext in (".arrow", ".parquet", ".json"):
+        os.replace(base + ext + ".tmp", base + ext)
+    # The full write supersedes whatever refreshes appended.
+    for ext in (".delta.arrow", ".delta.parquet"):
+        if os.path.exists(base + ext):
+            os.remove(base + ext)
+    return info
+
+
+def stage_sidecar_delta(name, table, store_dir=STORE_DIR, info=None):
+    """
+    Append the rows of a refresh's delta part to a sidecar, as
+    `<name>.delta.*.tmp` files for the caller to rename: `table` holds `id`
+    and the sidecar's columns, aligned with the new part. The Arrow delta
+    stays aligned with every delta part since the last full write; the
+    Parquet delta keeps the latest row of each id and overrides the base
+    Parquet file. Returns the Arrow delta's row count.
+    """
+    base = os.path.join(store_dir, SIDECAR_DIR, name)
+    values, keyed = table.drop_columns(["id"]), table
+    if (info or {}).get("delta_rows"):
+        values = pa.concat_tables([_open_ipc(base + ".delta.arrow"), values])
+        old = pq.read_table(base + ".delta.parquet")
+        keyed = pa.concat_tables([old.filter(pc.invert(pc.is_in(old["id"], value_set=table["id"]))), table])
+    _write_ipc(values, base + ".delta.arrow.tmp")
+    pq.write_table(keyed.take(pc.sort_indices(keyed["id"])), base + ".delta.parquet.tmp", compression="zstd",
+                   row_group_size=PARQUET_ROW_GROUP)
+    return values.num_rows
+
+
+def sidecars(store_dir=STORE_DIR, version=None):
+    """Metadata of the sidecars computed against the current store version (or `version`), keyed by name."""
+    directory = os.path.join(store_dir, SIDECAR_DIR)
+    if not os.path.isdir(directory):
+        return {}
+    version = version or data_version(store_dir)
+    found = {}
+    for entry in sorted(os.listdir(directory)):
+        if entry.endswith(".json"):
+            with open(os.path.join(directory, entry)) as f:
+                info = json.load(f)
+            if info["store_version"] == version:
+                found[info["name"]] = info
+    return found
+
+
+def sidecar_path(name, store_dir=STORE_DIR, ext=".arrow"):
+    return os.path.join(store_dir, SIDECAR_DIR, name + ext)
+
+
+def _open_ipc(path):
+    return pa.ipc.open_file(pa.memory_map(path, "r")).read_all()
+
+
+def open_sidecar(name, store_dir=STORE_DIR, info=None):
+    """A sidecar's columns aligned with the parts (superseded rows included), delta rows appended."""
+    table = _open_ipc(sidecar_path(name, store_dir))
+    if (info or {}).get("delta_rows"):
+        table = pa.concat_tables([table, _open_ipc(sidecar_path(name, store_dir, ".delta.arrow"))])
+    return table
+
+
+# --- Reading
+def deleted_rows(manifest, store_dir=STORE_DIR):
+    """Sorted positions, over the concatenated parts, of the rows superseded by refreshes."""
+    deleted = manifest.get("deleted")
+    if not deleted:
+        return np.array([], dtype=np.int64)
+    table = pq.read_table(os.path.join(store_dir, deleted["path"]))
+    bounds = np.cumsum([0] + [part["rows"] for part in manifest["parts"]])
+    return np.sort(bounds[table["part"].to_numpy()] + table["row"].to_numpy())
+
+
+def drop_rows(table, rows):
+    """`table` without the sorted positions `rows`: zero-copy slices for a few, a filtered copy past SLICE_LIMIT."""
+    if not len(rows):
+        return table
+    if len(rows) > SLICE_LIMIT:
+        keep = np.ones(table.num_rows, dtype=bool)
+        keep[rows] = False
+        return table.filter(keep)
+    starts, stops = np.r_[0, rows + 1], np.r_[rows, table.num_rows]
+    return pa.concat_tables([table.slice(start, stop - start)
+                             for start, stop in zip(starts.tolist(), stops.tolist()) if stop > start])
+
+
+def open_store(columns=None, store_dir=STORE_DIR):
+    """Memory-map the store and return the requested columns of its live rows as an Arrow table."""
+    manifest = read_manifest(store_dir)
+    return drop_rows(open_parts(manifest["parts"], columns, store_dir), deleted_rows(manifest, store_dir))
+
+
+def open_parts(parts, columns=None, store_dir=STORE_DIR):
+    """Memory-map the given manifest part entries, in order, as one zero-copy Arrow table."""
+    tables = []
+    for part in parts:
+        source = pa.memory_map(os.path.join(store_dir, part["path"]), "r")
+        table = pa.ipc.open_file(source).read_all()
+        tables.append(table.select(columns) if columns is not None else table)
+    return pa.concat_tables(tables)
+
+
+class TrackStore:
+    """
+    Process-wide view of the store.
+
+    Each column is converted to pandas at most once and shared by every frame
+    handed out, so pages projecting overlapping columns do not duplicate data.
+    Frames are read-only by convention (pandas copy-on-write protects the
+    shared columns from accidental in-place edits). Columns of up-to-date
+    sidecars are joined onto the table, memory-mapped like the base parts;
+    a sidecar column replaces a base column of the same name.
+    """
+
+    def __init__(self, store_dir=STORE_DIR):
+        self.store_dir = store_dir
+        self.manifest = read_manifest(store_dir)
+        table = open_parts(self.manifest["parts"], store_dir=store_dir)
+        self.sidecars = sidecars(store_dir, self.version)
+        for name, info in self.sidecars.items():
+            sidecar = open_sidecar(name, store_dir, info)
+            for column in sidecar.column_names:
+                field, data = sidecar.schema.field(column), sidecar.column(column)
+                index = table.schema.get_field_index(column)
+                if index >= 0:
+                    table = table.set_column(index, field, data)
+                else:
+                    table = table.append_column(field, data)
+        # Sidecars are aligned with the parts, so superseded rows go after the join.
+        self.table = drop_rows(table, deleted_rows(self.manifest, store_dir))
+        self._columns = {}
+        self._lock = threading.Lock()
+
+    @property
+    def version(self):
+        return self.manifest["version"]
+
+    @property
+    def columns(self):
+        return self.table.column_names
+
+    def __len__(self):
+        return self.table.num_rows
+
+    def column(self, name):
+        with self._lock:
+            series = self._columns.get(name)
+            if series is None:
+                series = self.table.column(name).to_pandas()
+                series.name = name
+                self._columns[name] = series
+        return series
+
+    def frame(self, columns=None):
+        columns = self.columns if columns is None else [c for c in columns if c in self.table.column_names]
+        return pd.DataFrame({name: self.column(name) for name in columns}, copy=False)
@@ -0,0 +1,218 @@
+"""
+Scripted, reproducible training of the promotion model (replaces notebook 03).
+
+- Labels follow the notebook's rule ((valence > 0.6 and energy > 0.6) or
+  danceability > 0.75, with 5% of labels flipped as noise). The noise and
+  the train/validation/test split come from a seeded hash of each track id
+  instead of `np.random.rand`, so they are identical across runs and do not
+  shift when tracks are added. The labels are written to the
+  `promotion_labels` sidecar so the pages show what the model learned.
+- Features are streamed from the memory-mapped store in chunks through an
+  XGBoost `DataIter` into a `QuantileDMatrix`, so no float64 frame of the
+  whole catalogue is ever built.
+- Training uses the `hist` tree method on all cores with early stopping on
+  the validation split. Histogram training with a fixed seed and no
+  subsampling is deterministic: the same data produces the same trees
+  (the printed fingerprint is a hash of the model without its attributes).
+- The model is saved in XGBoost's native UBJSON format
+  (`models/promotion_model.ubj`), which stays loadable across versions,
+  unlike a pickle. The feature schema, the test metrics shown on the
+  promotion page and the training stats are stored as attributes in the
+  same file.
+
+    python -m scripts.train_promotion                 # train, evaluate, save; then re-run scripts.batch_scoring
+    python -m scripts.train_promotion --scale 1.2M    # time / memory on a synthetic catalogue
+"""
+
+import argparse
+import datetime
+import hashlib
+import json
+import os
+import time
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import xgboost as xgb
+
+from scripts import batch_scoring
+from scripts.memory_usage import PeakMemory
+from scripts.track_store import MODEL_FEATURES, PROJECT_ROOT, STORE_DIR, TrackStore, write_sidecar
+
+LABEL_SIDECAR = "promotion_labels"
+RANDOM_STATE = 42
+FLIP_RATE = 0.05
+TEST_FRACTION = 0.3
+VALID_FRACTION = 0.1
+CHUNK_ROWS = 262_144
+MAX_ROUNDS = 1000
+EARLY_STOPPING_ROUNDS = 20
+PARAMS = {
+    "objective": "binary:logistic",
+    "tree_method": "hist",
+    "max_bin": 256,
+    "eta": 0.1,
+    "max_depth": 6,
+    "eval_metric": ["logloss", "auc"],
+}
+CLASS_NAMES = {"0": "Not Promoted (0)", "1": "Promoted (1)", "macro avg": "Macro Avg", "weighted avg": "Weighted Avg"}
+
+
+def id_uniform(ids, seed, purpose):
+    """Uniform [0, 1) value per track id, fixed by (seed, purpose)."""
+    key = f"{purpose[:8]:<8}{seed % 10**8:08d}"
+    hashes = pd.util.hash_array(np.asarray(ids, dtype=object), hash_key=key, categorize=False)
+    return (hashes >> np.uint64(11)).astype(np.float64) / float(1 << 53)
+
+
+def synthesize_labels(table, seed=RANDOM_STATE, flip_rate=FLIP_RATE):
+    """The notebook's uplift-style `promoted` label (int8) for every row, with seeded per-id noise."""
+    valence, energy = table["valence"].to_numpy(), table["energy"].to_numpy()
+    rule = ((valence > 0.6) & (energy > 0.6)) | (table["danceability"].to_numpy() > 0.75)
+    flip = id_uniform(table["id"].to_numpy(zero_copy_only=False), seed, "labels") < flip_rate
+    return (rule ^ flip).astype(np.int8)
+
+
+def split_rows(ids, seed=RANDOM_STATE, test_fraction=TEST_FRACTION, valid_fraction=VALID_FRACTION):
+    """(train, valid, test) row indices from a seeded hash of the ids."""
+    u = id_uniform(ids, seed, "split")
+    test = u < test_fraction
+    valid = ~test & (u < test_fraction + valid_fraction)
+    return np.flatnonzero(~test & ~valid), np.flatnonzero(valid), np.flatnonzero(test)
+
+
+class StoreBatches(xgb.DataIter):
+    """Feeds `rows` of an Arrow table to XGBoost `chunk_rows` at a time as float32 feature matrices."""
+
+    def __init__(self, table, labels, rows, chunk_rows=CHUNK_ROWS):
+        self._table, self._labels, self._rows, self._chunk_rows = table, labels, rows, chunk_rows
+        self._start = 0
+        super().__init__()
+
+    def next(self, input_data):
+        if self._start >= len(self._rows):
+            return False
+        rows = self._rows[self._start:self._start + self._chunk_rows]
+        input_data(data=batch_scoring.feature_matrix(self._table.take(rows)), label=self._labels[rows],
+                   feature_names=MODEL_FEATURES)
+        self._start += self._chunk_rows
+        return True
+
+    def reset(self):
+        self._start = 0
+
+
+def evaluate(booster, table, labels, rows, threshold=0.5):
+    """Test-split metrics in the shape the promotion page displays."""
+    from sklearn.metrics import classification_report, roc_auc_score
+
+    scores = batch_scoring.score_table(booster, table.take(rows))
+    report = classification_report(labels[rows], (scores >= threshold).astype(np.int8), output_dict=True)
+    return {
+        "roc_auc": round(float(roc_auc_score(labels[rows], scores)), 4),
+        "threshold": threshold,
+        "test_rows": int(len(rows)),
+        "classes": {
+            label: {metric: round(report[key][metric], 4) for metric in ("precision", "recall", "f1-score")}
+            for key, label in CLASS_NAMES.items()
+        },
+    }
+
+
+def train(table, seed=RANDOM_STATE, n_jobs=None, chunk_rows=CHUNK_ROWS, max_rounds=MAX_ROUNDS):
+    """Label, split, train and evaluate on an Arrow table with `id` and MODEL_FEATURES; returns (booster, labels, info)."""
+    labels = synthesize_labels(table, seed)
+    train_rows, valid_rows, test_rows = split_rows(table["id"].to_numpy(zero_copy_only=False), seed)
+    params = {**PARAMS, "seed": seed, "nthread": n_jobs or os.cpu_count()}
+
+    with PeakMemory() as memory:
+        start = time.perf_counter()
+        dtrain = xgb.QuantileDMatrix(StoreBatches(table, labels, train_rows, chunk_rows), max_bin=params["max_bin"])
+        dvalid = xgb.QuantileDMatrix(StoreBatches(table, labels, valid_rows, chunk_rows), ref=dtrain)
+        booster = xgb.train(params, dtrain, num_boost_round=max_rounds, evals=[(dvalid, "valid")],
+                            early_stopping_rounds=EARLY_STOPPING_ROUNDS, verbose_eval=False)
+        # Keep only the trees up to the best round, so every consumer predicts with the early-stopped model.
+        best_iteration = booster.best_iteration
+        booster = booster[:best_iteration + 1]
+        train_s = time.perf_counter() - start
+
+    info = {
+        "metrics": evaluate(booster, table, labels, test_rows),
+        "training": {
+            "rows": {"train": int(len(train_rows)), "valid": int(len(valid_rows)), "test": int(len(test_rows))},
+            "rounds": best_iteration + 1,
+            "params": params,
+            "seed": seed,
+            "label_rule": f"((valence > 0.6) & (energy > 0.6)) | (danceability > 0.75), {FLIP_RATE:.0%} flipped",
+            "train_s": round(train_s, 2),
+            "peak_mem_mb": round(memory.peak_delta_mb, 1),
+            "trained_at": datetime.datetime.now(datetime.timezone.utc).isoformat(timespec="seconds"),
+        },
+    }
+    return booster, labels, info
+
+
+def save_model(booster, info, path=batch_scoring.MODEL_PATH):
+    """
+    Save in native format with the feature schema, metrics and training stats
+    as attributes; returns a fingerprint of the trees (stable across runs).
+    """
+    fingerprint = hashlib.sha256(booster.save_raw("ubj")).hexdigest()[:16]
+    info["training"]["fingerprint"] = fingerprint
+    booster.set_attr(
+        feature_schema=json.dumps({feature: "float32" for feature in MODEL_FEATURES}),
+        metrics=json.dumps(info["metrics"]),
+        training=json.dumps(info["training"]),
+    )
+    booster.save_model(path)
+    return fingerprint
+
+
+def time_load(path, repeat=5):
+    """Median wall time (ms) of `batch_scoring.load_model(path)`."""
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        batch_scoring.load_model(path)
+        times.append((time.perf_counter() - start) * 1000)
+    return float(np.median(times))
+
+
+if __name__ == "__main__":
+    from scripts.synthetic_tracks import SCALE_FACTORS, synthetic_tracks
+
+    parser = argparse.ArgumentParser(description="Train the promotion model from the track store.")
+    parser.add_argument("--store", default=STORE_DIR)
+    parser.add_argument("--model", default=batch_scoring.MODEL_PATH)
+    parser.add_argument("--seed", type=int, default=RANDOM_STATE)
+    parser.add_argument("--jobs", type=int, help="training threads (default: all cores)")
+    parser.add_argument("--scale", choices=SCALE_FACTORS, help="train on a synthetic catalogue (nothing is saved)")
+    args = parser.parse_args()
+
+    columns = ["id"] + MODEL_FEATURES
+    if args.scale:
+        table = synthetic_tracks(SCALE_FACTORS[args.scale], with_derived=False).select(columns)
+    else:
+        table = TrackStore(args.store).table.select(columns)
+
+    booster, labels, info = train(table, args.seed, args.jobs)
+    training, metrics = info["training"], info["metrics"]
+    print(f"Trained on {training['rows']['train']:,} rows ({training['rows']['valid']:,} validation) with "
+          f"{training['params']['nthread']} threads: {training['rounds']} rounds in {training['train_s']:.2f}s, "
+          f"peak +{training['peak_mem_mb']} MB")
+    print(f"Test ({metrics['test_rows']:,} rows): ROC AUC {metrics['roc_auc']:.4f}")
+    for label, values in metrics["classes"].items():
+        print(f"  {label:18s} " + "  ".join(f"{name} {value:.3f}" for name, value in values.items()))
+
+    if not args.scale:
+        fingerprint = save_model(booster, info, args.model)
+        write_sidecar(LABEL_SIDECAR, pa.table({"id": table["id"], "promoted": labels}), args.store,
+                      meta={"seed": args.seed, "rule": training["label_rule"]})
+        print(f"Saved {os.path.relpath(args.model, PROJECT_ROOT)} (fingerprint {fingerprint}, "
+              f"{os.path.getsize(args.model) / 1024:.0f} KB), labels -> sidecars/{LABEL_SIDECAR}")
+        load_times = {"native": time_load(args.model)}
+        if os.path.exists(batch_scoring.LEGACY_MODEL_PATH):
+            load_times["notebook pickle"] = time_load(batch_scoring.LEGACY_MODEL_PATH)
+        print("Load time: " + ", ".join(f"{name} {ms:.1f} ms" for name, ms in load_times.items()))
+        print("Re-score the catalogue with `python -m scripts.batch_scoring`.")
@@ -1,86 +1,101 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-import os 
 import time 
 
+from track_data import get_backend, get_rollups, get_store, track_store
+from density_chart import density_chart
+from result_table import export_buttons
+from scripts import exports
+from scripts.perf_log import stage
+
 st.set_page_config(page_title="🌍 Global Dashboard", layout="wide")
 st.title("🌍 Global Music Insights Dashboard")
 
 # Load Data
-@st.cache_data
-def load_data(): 
-    start = time.perf_counter() 
-    project_root = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
-    df = pd.read_csv(os.path.join(project_root, "data", "spotify_tracks_cleaned.csv")) 
-    load_time = time.perf_counter() - start 
-    return df, load_time 
-
-df, load_time = load_data()
+start = time.perf_counter() 
+with stage("data load"):
+    store = get_store()
+    summary = get_rollups()
+load_time = time.perf_counter() - start 
+hero = summary["hero"]
 
 # --- Hero Metrics
 st.subheader("📊 At a Glance")
-st.success(f"✅ Loaded {len(df):,} rows in **{load_time:.2f} seconds**") 
+st.success(f"✅ Loaded rollups for {hero['tracks']:,} tracks in **{load_time * 1000:.1f} ms**") 
 col1, col2, col3, col4 = st.columns(4)
-col1.metric("Total Tracks", f"{len(df):,}")
-col2.metric("% Explicit", f"{(df['explicit'].mean()*100):.2f}%")
-col3.metric("Avg Duration", f"{df['duration_min'].mean():.2f} min")
-if "promoted" in df.columns:
-    col4.metric("% Promoted", f"{df['promoted'].mean()*100:.2f}%")
+col1.metric("Total Tracks", f"{hero['tracks']:,}")
+col2.metric("% Explicit", f"{(hero['explicit_ratio']*100):.2f}%")
+col3.metric("Avg Duration", f"{hero['avg_duration_min']:.2f} min")
+if hero["promoted_ratio"] is not None:
+    col4.metric("% Promoted", f"{hero['promoted_ratio']*100:.2f}%")
 else:
     col4.metric("Promoted", "N/A")
 
 # --- Trends: Split into 3 Charts
 st.markdown("### 📈 Trends Over Time (Separated by Feature)")
-yearly = df.groupby("year")[["tempo", "valence", "energy"]].mean().reset_index()
+# Precomputed by default; tick the sidebar box to run the group-by live on a backend for A/B timing.
+if st.sidebar.checkbox("Live trend query", value=False):
+    backend = get_backend()
+    start = time.perf_counter()
+    with stage("aggregate"):
+        yearly = backend.yearly_means(["tempo", "valence", "energy"])
+    st.caption(f"Trends computed live by {backend.name} in {(time.perf_counter() - start) * 1000:.1f} ms")
+else:
+    yearly = pd.DataFrame(summary["yearly"])
 
-col1, col2, col3 = st.columns(3)
+with stage("trend figures"):
+    col1, col2, col3 = st.columns(3)
 
-with col1:
-    fig_tempo = px.line(yearly, x="year", y="tempo", markers=True, title="🎵 Avg Tempo by Year")
-    fig_tempo.update_layout(template="plotly_dark", height=300)
-    st.plotly_chart(fig_tempo, use_container_width=True)
+    with col1:
+        fig_tempo = px.line(yearly, x="year", y="tempo", markers=True, title="🎵 Avg Tempo by Year")
+        fig_tempo.update_layout(template="plotly_dark", height=300)
+        st.plotly_chart(fig_tempo, use_container_width=True)
 
-with col2:
-    fig_valence = px.line(yearly, x="year", y="valence", markers=True, title="😊 Avg Valence by Year")
-    fig_valence.update_layout(template="plotly_dark", height=300)
-    st.plotly_chart(fig_valence, use_container_width=True)
+    with col2:
+        fig_valence = px.line(yearly, x="year", y="valence", markers=True, title="😊 Avg Valence by Year")
+        fig_valence.update_layout(template="plotly_dark", height=300)
+        st.plotly_chart(fig_valence, use_container_width=True)
 
-with col3:
-    fig_energy = px.line(yearly, x="year", y="energy", markers=True, title="⚡ Avg Energy by Year")
-    fig_energy.update_layout(template="plotly_dark", height=300)
-    st.plotly_chart(fig_energy, use_container_width=True)
+    with col3:
+        fig_energy = px.line(yearly, x="year", y="energy", markers=True, title="⚡ Avg Energy by Year")
+        fig_energy.update_layout(template="plotly_dark", height=300)
+        st.plotly_chart(fig_energy, use_container_width=True)
 
-# --- Audio Distributions
+# --- Audio Distributions (pre-binned at ingest)
 st.markdown("### 🎵 Audio Feature Distributions")
 features = ["danceability", "energy", "valence"]
-for feat in features:
-    fig = px.histogram(df, x=feat, nbins=30, title=f"{feat.title()} Distribution")
-    fig.update_layout(template="plotly_dark")
-    st.plotly_chart(fig, use_container_width=True)
+with stage("distribution figures"):
+    for feat in features:
+        hist = summary["histograms"][feat]
+        edges = hist["edges"]
+        centers = [(lo + hi) / 2 for lo, hi in zip(edges[:-1], edges[1:])]
+        fig = px.bar(x=centers, y=hist["counts"], labels={"x": feat, "y": "count"}, title=f"{feat.title()} Distribution")
+        fig.update_layout(template="plotly_dark", bargap=0)
+        st.plotly_chart(fig, use_container_width=True)
 
 # --- Top Artists & Albums
 st.markdown("### 🧑‍🎤 Most Common Artists & Albums")
-top_artists = df['artists'].value_counts().nlargest(10)
-fig1 = px.bar(top_artists, title="Top 10 Artists")
-fig1.update_layout(template="plotly_dark")
-st.plotly_chart(fig1, use_container_width=True)
+with stage("top-K figures"):
+    top = summary["top_artists"]
+    top_artists = pd.Series(top["counts"], index=pd.Index(top["labels"], name="artists"), name="count").head(10)
+    fig1 = px.bar(top_artists, title="Top 10 Artists")
+    fig1.update_layout(template="plotly_dark")
+    st.plotly_chart(fig1, use_container_width=True)
 
-top_albums = df['album'].value_counts().nlargest(10)
-fig2 = px.bar(top_albums, title="Top 10 Albums")
-fig2.update_layout(template="plotly_dark")
-st.plotly_chart(fig2, use_container_width=True)
+    top = summary["top_albums"]
+    top_albums = pd.Series(top["counts"], index=pd.Index(top["labels"], name="album"), name="count").head(10)
+    fig2 = px.bar(top_albums, title="Top 10 Albums")
+    fig2.update_layout(template="plotly_dark")
+    st.plotly_chart(fig2, use_container_width=True)
 
 # --- Promotion Heatmap (if available)
-if "promoted" in df.columns:
+if "promoted" in store.columns:
     st.markdown("### 🎯 Promotion Hotspots (Valence vs Energy)")
-    fig3 = px.scatter(
-        df, x="valence", y="energy", color=df["promoted"].map({1: "Promoted", 0: "Not Promoted"}),
-        opacity=0.5, title="Promoted Track Clusters"
-    )
-    fig3.update_layout(template="plotly_dark")
-    st.plotly_chart(fig3, use_container_width=True)
+    density_chart(store, "valence", "energy", "promoted", ["Not Promoted", "Promoted"], ["#636EFA", "#1DB954"],
+                  key="promotion_hotspots", title="Promoted Track Clusters")
 
 # --- Download Section
 st.markdown("### 📥 Download Full Dataset")
-st.download_button("Download CSV", df.to_csv(index=False), "spotify_cleaned.csv")
\ No newline at end of file
+export_buttons(lambda: exports.table_batches(store.table.select(track_store.BASE_COLUMNS)), "spotify_cleaned",
+               key="full_export")
@@ -1,7 +1,8 @@
 import streamlit as st
-import pandas as pd
-import plotly.express as px
-import os
+
+from track_data import get_backend, get_store, track_store
+from result_table import export_buttons, paged_table
+from scripts.perf_log import stage
 
 st.set_page_config(page_title="🎵 Track Explorer")
 st.title("🎵 Track Explorer")
@@ -10,41 +11,38 @@ st.markdown("""
 Use the interactive filters below to explore Spotify tracks by **year**, **danceability**, **energy**, and **tempo**.
 """)
 
-@st.cache_data
-def load_data():
-    current_file = os.path.abspath(__file__)
-    base_dir = os.path.dirname(current_file)
-    project_root = os.path.abspath(os.path.join(base_dir, ".."))
-    data_path = os.path.join(project_root, "data", "spotify_tracks_cleaned.csv")
-    return pd.read_csv(data_path)
-
-df = load_data()
+with stage("data load"):
+    store = get_store()
+    backend = get_backend()
 
 # Main page filters (not sidebar)
 with st.expander("🎚️ Filter Tracks", expanded=True):
     col1, col2 = st.columns(2)
 
     with col1:
-        year_range = st.slider("Select Year Range", int(df["year"].min()), int(df["year"].max()), (2010, 2024))
+        year_range = st.slider("Select Year Range", int(store.column("year").min()), int(store.column("year").max()), (2010, 2024))
         min_danceability = st.slider("Minimum Danceability", 0.0, 1.0, 0.5, step=0.05)
 
     with col2:
         min_energy = st.slider("Minimum Energy", 0.0, 1.0, 0.5, step=0.05)
-        tempo_range = st.slider("Tempo Range (BPM)", int(df["tempo"].min()), int(df["tempo"].max()), (80, 180))
-
-# Apply filters
-filtered = df[
-    (df["year"].between(*year_range)) &
-    (df["danceability"] >= min_danceability) &
-    (df["energy"] >= min_energy) &
-    (df["tempo"].between(*tempo_range))
-]
-
-st.subheader(f"🎶 Showing {len(filtered)} tracks")
-st.dataframe(
-    filtered[["name", "artists", "year", "danceability", "energy", "tempo"]],
-    use_container_width=True
-)
+        tempo_range = st.slider("Tempo Range (BPM)", int(store.column("tempo").min()), int(store.column("tempo").max()), (80, 180))
+
+# Apply filters (pushed down to the selected query backend)
+ranges = {
+    "year": year_range,
+    "danceability": (min_danceability, None),
+    "energy": (min_energy, None),
+    "tempo": tempo_range,
+}
+columns = ["name", "artists", "year", "danceability", "energy", "tempo"]
+header = st.empty()
+with stage("filter"):
+    count, filter_ms = paged_table(
+        lambda offset, limit, sort, descending: backend.filter_tracks(ranges, columns, offset, limit, sort, descending),
+        columns, key="explorer",
+    )
+header.subheader(f"🎶 Showing {count:,} tracks")
+st.caption(f"{backend.name} query in {filter_ms:.1f} ms")
 
 st.markdown("### 📥 Download Filtered Data")
-st.download_button("⬇️ Download CSV", filtered.to_csv(index=False), "filtered_tracks.csv")
+export_buttons(lambda: backend.filter_batches(ranges, track_store.BASE_COLUMNS), "filtered_tracks", key="explorer_export")
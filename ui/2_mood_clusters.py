@@ -3,39 +3,49 @@ import pandas as pd
 import plotly.express as px
 import os
 
+from track_data import get_backend, get_store
+from density_chart import density_chart
+from result_table import paged_table
+from scripts import mood_clustering
+from scripts.perf_log import stage
+
 st.set_page_config(page_title="🔍 Mood Clusters")
 st.title("🔍 Mood-Based Clustering")
 
-@st.cache_data
-def load_data():
-    path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "spotify_tracks_with_clusters.csv"))
-    return pd.read_csv(path)
-
-df_full = load_data()
-
-# Sample for faster loading (used in plot only)
-df_sampled = df_full.sample(frac=0.2, random_state=42)
+with stage("data load"):
+    store = get_store()
+    backend = get_backend()
 
 st.markdown("""
 This section clusters Spotify tracks into **mood-based groups** using audio features like *valence*, *energy*, and *danceability*.  
 We use **KMeans clustering** and visualize the groups with **t-SNE**, a technique for dimensionality reduction that preserves local structure.
+t-SNE is fitted on a representative set of landmark tracks and every other track is placed next to its most similar landmarks, so new tracks get coordinates without a refit.
 
 🎯 **Why?**  
 To understand how songs naturally group based on mood and energy — uncovering patterns not visible in raw audio metrics.
 
 💡 **Note:**  
-To ensure performance, only **20% of tracks are shown** in the visual map below. All filters and summaries work on the full dataset.
+The map below shows **every track** as a density image; box-select a region to zoom in, and individual tracks (with names on hover) appear once only a few thousand are in view.
 """)
 
+if "cluster" not in store.columns:
+    st.info("No cluster labels for this store version yet. Label the tracks with `python -m scripts.mood_clustering`.")
+    st.stop()
+
 # Sidebar cluster selector
-cluster = st.sidebar.selectbox("🎨 Select Cluster", sorted(df_full["cluster"].unique()))
+cluster = st.sidebar.selectbox("🎨 Select Cluster", backend.cluster_ids())
 st.sidebar.markdown("---")
 
-# Filter full data by cluster
-filtered = df_full[df_full["cluster"] == cluster]
-
-st.subheader(f"🌈 Cluster {cluster} — {len(filtered)} tracks")
-st.dataframe(filtered[["name", "artists", "valence", "energy", "danceability"]])
+# Page through the full data of the cluster
+columns = ["name", "artists", "valence", "energy", "danceability"]
+header = st.empty()
+with stage("filter"):
+    count, query_ms = paged_table(
+        lambda offset, limit, sort, descending: backend.cluster_tracks(cluster, columns, offset, limit, sort, descending),
+        columns, key="cluster_tracks",
+    )
+header.subheader(f"🌈 Cluster {cluster} — {count:,} tracks")
+st.caption(f"{backend.name} query in {query_ms:.1f} ms")
 
 # t-SNE Plot using sampled data
 st.markdown("---")
@@ -44,13 +54,23 @@ st.markdown("### 🗺️ Mood Landscape (t-SNE Projection)")
 # Limit width using columns
 col1, col2, col3 = st.columns([0.1, 0.8, 0.1])
 with col2:
-    fig = px.scatter(
-        df_sampled,
-        x="tsne_1",
-        y="tsne_2",
-        color="cluster",
-        hover_data=["name", "artists"],
-        title="t-SNE Mood Clusters (sampled view)"
-    )
-    fig.update_layout(template="plotly_dark", height=500, width=600)
-    st.plotly_chart(fig, use_container_width=False)
+    clusters = backend.cluster_ids()
+    if "tsne_1" not in store.columns:
+        st.info("No t-SNE coordinates for this store version yet. Embed the tracks with `python -m scripts.mood_embedding`.")
+    else:
+        density_chart(store, "tsne_1", "tsne_2", "cluster", [str(c) for c in clusters], px.colors.qualitative.Plotly,
+                      key="mood_landscape", values=clusters, hover=["name", "artists"], title="t-SNE Mood Clusters")
+    if "landmarks" in store.sidecars.get("tsne", {}):
+        st.caption(f"t-SNE fitted on {store.sidecars['tsne']['landmarks']:,} landmark tracks; "
+                   "the rest are projected onto their nearest landmarks.")
+
+# Elbow sweep from the trained clustering artifact
+if os.path.exists(mood_clustering.ARTIFACT_PATH):
+    artifact = mood_clustering.load_artifact()
+    if artifact.get("sweep"):
+        with st.expander(f"📐 Choosing k (model trained {artifact['trained_at']}, k = {artifact['k']})"):
+            with stage("elbow figure"):
+                sweep = pd.DataFrame(artifact["sweep"])
+                fig = px.line(sweep, x="k", y="inertia", markers=True, title="Elbow Method for Optimal number of clusters",
+                              labels={"inertia": "SSE"}, template="plotly_dark")
+                st.plotly_chart(fig, use_container_width=True)
@@ -1,37 +1,27 @@
 import streamlit as st
+import numpy as np
 import pandas as pd
-import os
 import plotly.express as px
-import joblib
-from transformers import pipeline
+import time
+
+from track_data import get_backend, get_model, get_model_sha256, get_similarity_index, get_store, track_store
+from scripts import batch_scoring
+from scripts.perf_log import stage
 
 st.set_page_config(page_title="📈 Promotion Model", layout="wide")
 st.title("📈 Promotion Probability Predictor")
 
 # ----------------- Load Data and Model -----------------
-@st.cache_data
-def load_data():
-    path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "data", "spotify_tracks_with_clusters_and_uplift.csv"))
-    return pd.read_csv(path)
-
-df = load_data()
-
-model_path = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "models", "xgb_promotion_model.pkl"))
-model = joblib.load(model_path)
-
-features = [
-    'danceability', 
-    'energy', 
-    'loudness', 
-    'speechiness', 
-    'acousticness', 
-    'instrumentalness', 
-    'liveness', 
-    'valence', 
-    'tempo', 
-    'duration_min', 
-    'year'
-]
+with stage("data load"):
+    backend = get_backend()
+    store = get_store()
+    model = get_model()
+
+features = track_store.MODEL_FEATURES
+score_column = batch_scoring.SCORE_COLUMN
+# Precomputed scores only count if they came from the model loaded above (it may have been retrained since).
+score_model = store.sidecars.get(batch_scoring.SCORE_SIDECAR, {}).get("model_sha256")
+scored = score_column in store.columns and score_model == get_model_sha256()
 
 # ----------------- Description -----------------
 st.markdown("""
@@ -46,41 +36,117 @@ st.markdown("""
 
 # ----------------- Track Selection -----------------
 st.markdown("### 🎧 Select a Track")
+query = st.text_input("🔎 Search albums, tracks or artists", placeholder="Start typing a name...")
 col1, col2 = st.columns(2)
 
+start = time.perf_counter()
 with col1:
-    selected_album = st.selectbox("💿 Album", sorted(df["album"].unique()))
+    # Only the top matches are sent to the browser, not every album in the catalogue.
+    with stage("album search"):
+        albums = backend.search_albums(query)
+    if not albums:
+        st.warning(f"No album, track or artist starts with “{query}”.")
+        st.stop()
+    selected_album = st.selectbox("💿 Album", albums)
 with col2:
-    tracks_in_album = df[df["album"] == selected_album]["name"].unique()
-    target_track = st.selectbox("🎵 Track", sorted(tracks_in_album))
+    with stage("track lookup"):
+        tracks_in_album = backend.album_tracks(selected_album)
+    target_track = st.selectbox("🎵 Track", tracks_in_album)
 
-track_row = df[(df["album"] == selected_album) & (df["name"] == target_track)].iloc[0]
-input_features = track_row[features].values.reshape(1, -1)
+with stage("track lookup"):
+    track_row = backend.track_row(selected_album, target_track, ["id", "album", "name"] + features + ([score_column] if scored else []))
+st.caption(f"{backend.name} lookup in {(time.perf_counter() - start) * 1000:.1f} ms")
 
 # ----------------- Prediction -----------------
-pred_proba = model.predict_proba(input_features)[0, 1]
+if scored:
+    pred_proba = track_row[score_column]
+else:
+    if score_column in store.columns:
+        st.info("The precomputed scores are from a previous model, so scores are computed on the fly. "
+                "Rescore the catalogue with `python -m scripts.batch_scoring`.")
+    else:
+        st.info("Scores are computed on the fly. Precompute them for the whole catalogue with `python -m scripts.batch_scoring`.")
+    with stage("inference"):
+        pred_proba = model.predict_proba(track_row[features].values.reshape(1, -1))[0, 1]
 st.metric("📈 Promotion Likelihood", f"{pred_proba * 100:.2f}%")
 
+# ----------------- Similar Tracks -----------------
+st.markdown("---")
+st.subheader("🎧 Sounds Like This")
+index = get_similarity_index()
+if index is None:
+    st.info("Build the similar-tracks index with `python -m scripts.similarity`.")
+else:
+    year_min, year_max = int(store.column("year").min()), int(store.column("year").max())
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        similar_years = st.slider("📅 Years", year_min, year_max, (year_min, year_max), key="similar_years")
+    with col2:
+        similar_cluster = (st.selectbox("🎭 Cluster", ["Any"] + backend.cluster_ids(), key="similar_cluster")
+                           if "cluster" in store.columns else "Any")
+    with col3:
+        similar_explicit = st.selectbox("🔞 Lyrics", ["Any", "Explicit", "Clean"], key="similar_explicit")
+    with col4:
+        similar_k = st.slider("🔢 Neighbours", 5, 50, 10, step=5, key="similar_k")
+
+    constraints = {
+        "year": similar_years if similar_years != (year_min, year_max) else None,
+        "cluster": similar_cluster if similar_cluster != "Any" else None,
+        "explicit": {"Any": None, "Explicit": True, "Clean": False}[similar_explicit],
+    }
+    start = time.perf_counter()
+    with stage("similar tracks"):
+        rows, distances = index.similar(track_row["id"], similar_k, **constraints)
+    search_ms = (time.perf_counter() - start) * 1000
+    found = rows[0] >= 0
+    similar = store.frame(["name", "artists", "album", "year"]).iloc[rows[0][found]].reset_index(drop=True)
+    similar["distance"] = np.sqrt(distances[0][found])
+    st.caption(f"{len(similar)} nearest tracks in scaled audio-feature space · "
+               f"index search over {len(index):,} tracks in {search_ms:.1f} ms")
+    st.dataframe(similar, use_container_width=True)
+
+# ----------------- Top Promotable Tracks -----------------
+if scored:
+    st.markdown("---")
+    st.subheader("🏆 Most Promotable Tracks")
+
+    col1, col2, col3 = st.columns(3)
+    with col1:
+        top_year = st.selectbox("📅 Year", ["All"] + sorted(store.column("year").unique().tolist(), reverse=True))
+    with col2:
+        top_cluster = st.selectbox("🎭 Cluster", ["All"] + backend.cluster_ids()) if "cluster" in store.columns else "All"
+    with col3:
+        top_n = st.slider("🔢 Top N", 5, 100, 20, step=5)
+
+    filters = {name: value for name, value in (("year", top_year), ("cluster", top_cluster)) if value != "All"}
+    start = time.perf_counter()
+    with stage("top tracks"):
+        top = backend.top_tracks(score_column, top_n, filters, ["name", "artists", "album", "year"])
+    st.caption(f"{backend.name} top-{top_n} in {(time.perf_counter() - start) * 1000:.1f} ms · "
+               f"scores from `{store.sidecars[batch_scoring.SCORE_SIDECAR]['model']}`")
+    st.dataframe(top.rename(columns={score_column: "Promotion Likelihood"}), use_container_width=True)
+
 # ----------------- Feature Importance -----------------
 st.markdown("---")
 st.subheader("🧠 Global Feature Importance")
 
 st.markdown("These importances reflect the **overall model behavior**, not specific to the selected track.")
 
-importance_df = pd.DataFrame({
-    "Feature": features,
-    "Importance": model.feature_importances_
-}).sort_values("Importance", ascending=False)
-
-fig = px.bar(
-    importance_df,
-    x="Feature",
-    y="Importance",
-    title="XGBoost Feature Importances (Global)",
-    labels={"Importance": "Importance Score"},
-    template="plotly_dark"
-)
-st.plotly_chart(fig, use_container_width=True)
+with stage("importance figure"):
+    importance_df = pd.DataFrame({
+        "Feature": features,
+        "Importance": model.feature_importances_
+    }).sort_values("Importance", ascending=False)
+
+    fig = px.bar(
+        importance_df,
+        x="Feature",
+        y="Importance",
+        title="XGBoost Feature Importances (Global)",
+        labels={"Importance": "Importance Score"},
+        template="plotly_dark"
+    )
+    st.plotly_chart(fig, use_container_width=True)
 
 # TODO: Fix LLM Explanations
 '''
@@ -95,6 +161,8 @@ If you're seeing an error, make sure you're using a model that doesn't require g
 
 @st.cache_resource
 def load_llm():
+    from transformers import pipeline  # pulls in torch: import only when the explanation is shown
+
     return pipeline("text-generation", model="HuggingFaceH4/zephyr-7b-alpha")
 
 llm = load_llm()
@@ -124,23 +192,37 @@ st.markdown(f"> {explanation}")
 st.markdown("---")
 st.subheader("📊 Model Performance")
 
+metrics, training = batch_scoring.model_info(model)
+if metrics is None:
+    # The notebook's pickle carries no metrics; these are from its last run.
+    metrics = {
+        "roc_auc": 0.9188,
+        "classes": {
+            "Not Promoted (0)": {"precision": 0.95, "recall": 0.98, "f1-score": 0.97},
+            "Promoted (1)": {"precision": 0.95, "recall": 0.85, "f1-score": 0.90},
+            "Macro Avg": {"precision": 0.95, "recall": 0.92, "f1-score": 0.93},
+            "Weighted Avg": {"precision": 0.95, "recall": 0.95, "f1-score": 0.95},
+        },
+    }
+    st.caption("Metrics from the notebook run. Train a reproducible model with `python -m scripts.train_promotion`.")
+else:
+    st.caption(f"Test split of {metrics['test_rows']:,} tracks · {training['rounds']} rounds trained in "
+               f"{training['train_s']:.1f}s on {training['params']['nthread']} threads ({training['trained_at']}) · "
+               f"model `{training['fingerprint']}`")
+
 col1, col2 = st.columns(2)
 with col1:
     st.markdown("**📊 Precision / Recall / F1 Score**")
 
-    metrics_data = {
-        "Class": ["Not Promoted (0)", "Promoted (1)", "Macro Avg", "Weighted Avg"],
-        "Precision": [0.95, 0.95, 0.95, 0.95],
-        "Recall":    [0.98, 0.85, 0.92, 0.95],
-        "F1 Score":  [0.97, 0.90, 0.93, 0.95]
-    }
-
-    metrics_df = pd.DataFrame(metrics_data)
+    metrics_df = pd.DataFrame([
+        {"Class": label, "Precision": values["precision"], "Recall": values["recall"], "F1 Score": values["f1-score"]}
+        for label, values in metrics["classes"].items()
+    ])
     st.table(metrics_df)
 
 with col2:
     st.markdown("**AUC Score**")
-    st.metric(label="ROC AUC", value="0.9188")
+    st.metric(label="ROC AUC", value=f"{metrics['roc_auc']:.4f}")
 
 # ----------------- Footer -----------------
 st.markdown("""
@@ -1,9 +1,15 @@
 # File: dashboard/pages/4_⚡_Query_Benchmark.py
 
 import streamlit as st
+import pandas as pd
+import plotly.express as px
 import os
 from PIL import Image
 
+import track_data  # noqa: F401  (puts the project root on sys.path for `scripts`)
+from scripts import query_plans
+from scripts.perf_log import stage
+
 st.set_page_config(page_title="⚡ SQL Benchmarks")
 st.title("⚡ SQL Query Optimization: Benchmark Study")
 
@@ -11,115 +17,86 @@ st.title("⚡ SQL Query Optimization: Benchmark Study")
 st.markdown("""
 Optimizing SQL queries can significantly reduce processing time, especially when working with large datasets like Spotify's 1.2M track dataset.
 
-Here, we tested one **complex query** under three conditions:
+Here, we test one **complex query** under three conditions:
 - Without indexing
 - With multi-column indexing
 - With a temporary pre-filtered table
 
-We compare performance and inspect PostgreSQL's execution plans.
+The plans and timings below are **captured live** on a local engine against the current dataset, then cached per dataset version and query text.
 """)
 
+LABELS = {
+    "raw": "📉 Raw Query",
+    "indexed": "⚙️ Indexed Query",
+    "temp_table": "📦 Temp Table Query",
+}
+
+engine = st.sidebar.selectbox("🛠️ Engine", query_plans.available_engines())
+refresh = st.sidebar.button("🔄 Re-run benchmark")
+
+with st.spinner(f"Running the benchmark on {engine}..."), stage("benchmark capture"):
+    try:
+        captured = query_plans.capture(engine, refresh=refresh)
+    except FileNotFoundError:
+        st.error("Track store not found. Build it with `python -m scripts.csv_to_parquet`.")
+        st.stop()
+variants = {v["variant"]: v for v in captured["variants"]}
+
 # 📄 SQL Query
 st.subheader("📄 Query Used for Benchmarking")
 st.markdown("""
 > Find the top 5 years with the most high-energy, highly danceable explicit songs, and compute the average tempo and valence per year.
 """)
-query_code = """
-SELECT year,
-       COUNT(*) AS track_count,
-       ROUND(AVG(tempo)::NUMERIC, 2) AS avg_tempo,
-       ROUND(AVG(valence)::NUMERIC, 2) AS avg_valence
-FROM spotify_tracks
-WHERE explicit = true
-  AND energy > 0.8
-  AND danceability > 0.75
-GROUP BY year
-ORDER BY track_count DESC
-LIMIT 5;
-"""
-st.code(query_code, language="sql")
+st.code(variants["raw"]["query"], language="sql")
+
+# ⏱️ Timings
+st.subheader("⏱️ Execution Time")
+st.caption(
+    f"{engine} · {captured['rows_loaded']:,} rows · data version `{captured['data_version']}` · "
+    f"captured {captured['captured_at']} on {captured['host']}"
+)
+timings = pd.DataFrame([
+    {
+        "Variant": LABELS[name],
+        "p50 (ms)": v["timing"]["p50_ms"],
+        "p95 (ms)": v["timing"]["p95_ms"],
+        "Engine-reported (ms)": v["engine_ms"],
+    }
+    for name, v in variants.items()
+])
+st.table(timings.round(3))
+with stage("latency figure"):
+    fig = px.bar(timings, x="Variant", y="p50 (ms)", title="Median latency per variant", template="plotly_dark")
+    st.plotly_chart(fig, use_container_width=True)
 
 # 🧾 Full Query Plans (Text)
-st.subheader("🧾 PostgreSQL EXPLAIN ANALYZE Output")
-
-with st.expander("📉 Raw Query Plan (Execution Time: ~89.5 ms)"):
-    st.code("""
-Limit  (cost=41352.63..41352.65 rows=5 width=76) (actual time=84.238..89.437 rows=5 loops=1)
-  ->  Sort  (cost=41352.63..41352.87 rows=93 width=76) (actual time=84.237..89.436 rows=5 loops=1)
-        Sort Key: (count(*)) DESC
-        Sort Method: top-N heapsort  Memory: 25kB
-        ->  Finalize GroupAggregate  (cost=41315.94..41351.09 rows=93 width=76) (actual time=83.954..89.427 rows=34 loops=1)
-              Group Key: year
-              ->  Gather Merge  (cost=41315.94..41346.90 rows=186 width=76) (actual time=83.941..89.346 rows=94 loops=1)
-                    Workers Planned: 2
-                    Workers Launched: 2
-                    ->  Partial GroupAggregate  (cost=40315.92..40325.41 rows=93 width=76) (actual time=58.221..58.357 rows=31 loops=3)
-                          Group Key: year
-                          ->  Sort  (cost=40315.92..40317.63 rows=685 width=20) (actual time=58.215..58.260 rows=1115 loops=3)
-                                Sort Key: year
-                                Sort Method: quicksort  Memory: 108kB
-                                Worker 0:  Sort Method: quicksort  Memory: 54kB
-                                Worker 1:  Sort Method: quicksort  Memory: 90kB
-                                ->  Parallel Seq Scan on spotify_tracks  (cost=0.00..40283.66 rows=685 width=20) (actual time=0.340..57.947 rows=1115 loops=3)
-                                      Filter: (explicit AND (energy > '0.8'::double precision) AND (danceability > '0.75'::double precision))
-                                      Rows Removed by Filter: 399294
-Planning Time: 0.166 ms
-Execution Time: 89.501 ms
-""", language="sql")
-
-with st.expander("⚙️ Indexed Query Plan (Execution Time: ~2.75 ms)"):
-    st.code("""
-Limit  (cost=4015.14..4015.15 rows=5 width=76) (actual time=2.729..2.730 rows=5 loops=1)
-  ->  Sort  (cost=4015.14..4015.37 rows=93 width=76) (actual time=2.729..2.729 rows=5 loops=1)
-        Sort Key: (count(*)) DESC
-        Sort Method: top-N heapsort  Memory: 25kB
-        ->  HashAggregate  (cost=4011.27..4013.60 rows=93 width=76) (actual time=2.683..2.720 rows=34 loops=1)
-              Group Key: year
-              Batches: 1  Memory Usage: 32kB
-              ->  Index Scan using idx_explicit_energy_dance on spotify_tracks  (cost=0.43..3994.82 rows=1645 width=20) (actual time=0.023..2.085 rows=3344 loops=1)
-                    Index Cond: ((explicit = true) AND (energy > '0.8'::double precision) AND (danceability > '0.75'::double precision))
-Planning Time: 0.110 ms
-Execution Time: 2.757 ms
-""", language="sql")
-
-with st.expander("📦 Temp Table Query Plan (Execution Time: ~0.59 ms)"):
-    st.code("""
-Limit  (cost=149.12..149.13 rows=5 width=76) (actual time=0.559..0.560 rows=5 loops=1)
-  ->  Sort  (cost=149.12..149.62 rows=200 width=76) (actual time=0.559..0.559 rows=5 loops=1)
-        Sort Key: (count(*)) DESC
-        Sort Method: top-N heapsort  Memory: 25kB
-        ->  HashAggregate  (cost=140.80..145.80 rows=200 width=76) (actual time=0.505..0.545 rows=34 loops=1)
-              Group Key: year
-              Batches: 1  Memory Usage: 48kB
-              ->  Seq Scan on temp_explicit_energy_dance  (cost=0.00..86.40 rows=5440 width=20) (actual time=0.015..0.146 rows=3344 loops=1)
-Planning Time: 0.063 ms
-Execution Time: 0.586 ms
-""", language="sql")
-
-# 🔍 Visualizing PostgreSQL EXPLAIN Plans
-st.subheader("🧠 Query Execution Flow (PostgreSQL EXPLAIN)")
-
-assets_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "..", "assets"))
-
-with st.expander("📉 Raw Query Plan (Execution Time: 89.5 ms)"):
+st.subheader(f"🧾 {engine} Execution Plans")
+for name, v in variants.items():
+    with st.expander(f"{LABELS[name]} (p50: {v['timing']['p50_ms']:.2f} ms)"):
+        for statement in v["setup"]:
+            st.code(statement + ";", language="sql")
+        st.code(v["plan"], language="text")
+
+# 📸 Original PostgreSQL screenshots
+assets_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "assets"))
+with st.expander("📸 Original PostgreSQL study (archived screenshots)"):
     st.image(Image.open(os.path.join(assets_dir, "explain_plan_unoptimized.png")), use_container_width=True)
     st.caption("Raw query without indexing or temp tables.")
-
-with st.expander("⚙️ Indexed Query Plan (Execution Time: 2.75 ms)"):
     st.image(Image.open(os.path.join(assets_dir, "explain_plan_after_indexing.png")), use_container_width=True)
     st.caption("Indexed on explicit, energy, and danceability.")
-
-with st.expander("📦 Temp Table Query Plan (Execution Time: 0.59 ms)"):
     st.image(Image.open(os.path.join(assets_dir, "explain_plan_after_temp_table.png")), use_container_width=True)
     st.caption("Pre-filtered temp table reduced overhead dramatically.")
 
 # ✅ Conclusion
+raw_ms = variants["raw"]["timing"]["p50_ms"]
+indexed_ms = variants["indexed"]["timing"]["p50_ms"]
+temp_ms = variants["temp_table"]["timing"]["p50_ms"]
 st.markdown("---")
 st.subheader("📌 Key Takeaways")
-st.markdown("""
-- 🔎 **Indexing** significantly reduced query time from ~89ms to ~2.7ms.
-- 📦 **Temp tables** offered further optimization (~0.5ms), ideal when filtering logic is reused.
-- 🧠 PostgreSQL’s EXPLAIN plans provide insights into why optimizations work.
+st.markdown(f"""
+- 🔎 **Indexing** changed query time from ~{raw_ms:.2f} ms to ~{indexed_ms:.2f} ms ({raw_ms / indexed_ms:.1f}x) on {engine}.
+- 📦 **Temp tables** brought it to ~{temp_ms:.2f} ms ({raw_ms / temp_ms:.1f}x vs raw), ideal when filtering logic is reused.
+- 🧠 Execution plans show *why*: which access path the engine picked and how many rows it touched.
 
-This benchmark showcases the **real-world performance gains** of applying thoughtful database design.
+Columnar engines such as DuckDB often gain little from a B-tree index because their scans are already vectorized; row stores like SQLite and PostgreSQL benefit far more.
 """)
@@ -0,0 +1,107 @@
+import streamlit as st
+import pandas as pd
+import plotly.express as px
+import time
+
+from track_data import data_service, get_perf_log, get_result_cache, get_store, perf_log
+from scripts.memory_usage import memory_breakdown
+from scripts.perf_log import stage
+
+st.set_page_config(page_title="⏱️ Performance", layout="wide")
+st.title("⏱️ Page Performance")
+
+st.markdown("""
+Every page rerun is timed end to end, and pages time their **stages** (data load, filtering, aggregation,
+figure construction, model inference). Each stage also records how much the server's memory (RSS) grew while it ran.
+The numbers come from real sessions on this server and are kept for the newest reruns only.
+""")
+
+WINDOWS = {"Last hour": (3600, "1min"), "Last 24 hours": (86_400, "15min"), "Last 7 days": (604_800, "2h"), "All": (None, "1D")}
+
+window = st.sidebar.selectbox("🕒 Window", list(WINDOWS))
+seconds, bucket = WINDOWS[window]
+
+log = get_perf_log()
+with stage("data load"):
+    log.flush()  # include the reruns that just finished
+    since = time.time() - seconds if seconds else None
+    runs, stages = log.runs(since), log.stages(since)
+
+if runs.empty:
+    st.info("No reruns recorded yet. Browse the other pages (through `streamlit run ui/app.py`) and come back.")
+    st.stop()
+
+# ----------------- Pages -----------------
+with stage("aggregate"):
+    by_page = perf_log.percentiles(runs, "page", "total_ms")
+    by_page["mean RSS Δ (MB)"] = runs.groupby("page", sort=False)["rss_delta_mb"].mean().to_numpy()
+    by_page["stopped / errors"] = runs.groupby("page", sort=False)["status"].agg(
+        lambda status: f"{(status != 'ok').sum()} / {(~status.isin(['ok', 'StopException', 'RerunException'])).sum()}"
+    ).to_numpy()
+    runs["time"] = runs["ts"].dt.floor(bucket)
+    over_time = (runs.groupby(["time", "page"])["total_ms"].quantile([0.5, 0.95]).rename_axis(["time", "page", "q"])
+                 .reset_index().assign(q=lambda df: df["q"].map({0.5: "p50", 0.95: "p95"})))
+
+st.subheader("📄 Rerun latency per page (ms)")
+st.dataframe(by_page.round(1), use_container_width=True, hide_index=True)
+
+with stage("figure"):
+    fig = px.line(over_time, x="time", y="total_ms", color="page", line_dash="q", markers=True,
+                  labels={"total_ms": "rerun ms", "q": "percentile"}, title=f"Rerun latency per {bucket}",
+                  template="plotly_dark")
+    st.plotly_chart(fig, use_container_width=True)
+
+# ----------------- Stages -----------------
+st.subheader("🧩 Stages")
+page = st.selectbox("Page", by_page["page"].tolist(), key="perf_page")
+page_runs = runs[runs["page"] == page]
+page_stages = stages[stages["page"] == page]
+
+if page_stages.empty:
+    st.info(f"{page} has no instrumented stages; only its total rerun time is recorded.")
+else:
+    with stage("aggregate"):
+        per_run = perf_log.stage_totals(page_stages)
+        untracked = page_runs.set_index("id")["total_ms"] - per_run.groupby("run_id")["ms"].sum()
+        per_run = pd.concat([per_run, pd.DataFrame({"run_id": untracked.index, "page": page, "stage": "(rest of the page)",
+                                                    "ms": untracked.to_numpy(), "rss_delta_mb": 0.0})])
+        by_stage = perf_log.percentiles(per_run, "stage")
+        memory = per_run.groupby("stage", sort=False)["rss_delta_mb"]
+        by_stage["mean RSS Δ (MB)"] = memory.mean().to_numpy()
+        by_stage["max RSS Δ (MB)"] = memory.max().to_numpy()
+
+    st.dataframe(by_stage.round(2), use_container_width=True, hide_index=True)
+    with stage("figure"):
+        fig = px.bar(by_stage.melt(id_vars="stage", value_vars=["p50", "p90", "p99"], var_name="percentile", value_name="ms"),
+                     x="stage", y="ms", color="percentile", barmode="group", title=f"{page}: stage latency",
+                     template="plotly_dark")
+        st.plotly_chart(fig, use_container_width=True)
+
+# ----------------- Result cache -----------------
+st.subheader("🗃️ Query result cache")
+cache = get_result_cache()
+cache_stats = cache.stats()
+if cache_stats.empty:
+    st.info("No backend queries since the server started.")
+else:
+    st.dataframe(cache_stats.round(2), use_container_width=True, hide_index=True)
+    st.caption(f"Since the server started · {cache.bytes / 2**20:.1f} of {cache.max_bytes / 2**20:.0f} MB in use "
+               "(`SIL_RESULT_CACHE_MB`) · cleared when the data version changes")
+
+# ----------------- Process memory -----------------
+st.subheader("🧠 Server process memory")
+memory = memory_breakdown()
+col1, col2, col3 = st.columns(3)
+col1.metric("RSS", f"{memory['rss'] / 2**20:,.0f} MB")
+col2.metric("PSS (shared pages split)", f"{memory['pss'] / 2**20:,.0f} MB")
+col3.metric("Private (USS)", f"{memory['uss'] / 2**20:,.0f} MB")
+store = get_store()
+if isinstance(store, data_service.SharedStore):
+    st.caption(f"Track store attached from the shared segment `{store.path}`; its pages are shared with every "
+               "other server process on this host")
+else:
+    st.caption("Track store opened from its files; run `python -m scripts.data_service` to share one copy "
+               "between server processes")
+
+st.caption(f"{len(runs):,} reruns in the window · log `{log.path}` keeps the newest {log.max_runs:,} · "
+           "instrumentation costs about 10 µs per stage")
@@ -1,5 +1,10 @@
 import streamlit as st
 
+from track_data import get_perf_log, perf_log, warm_up
+
+# Once per server process: heavy imports, store, model and rollups load in the background.
+warm_up()
+
 pg = st.navigation( 
     [ 
         st.Page("home_page.py", title="Home", icon="🏠"),
@@ -7,7 +12,8 @@ pg = st.navigation(
         st.Page("1_track_explorer.py", title="Track Explorer", icon="🎵"), 
         st.Page("2_mood_clusters.py", title="Mood Clusters", icon="🔍"), 
         st.Page("3_promotion_model.py", title="Promotion Model", icon="📈"), 
-        st.Page("4_query_benchmark.py", title="Query Benchmark", icon="⚡")
+        st.Page("4_query_benchmark.py", title="Query Benchmark", icon="⚡"),
+        st.Page("5_performance.py", title="Performance", icon="⏱️"),
     ]
 ) 
 st.set_page_config(
@@ -15,4 +21,6 @@ st.set_page_config(
     page_icon="🎧",
     # layout="wide",
 ) 
-pg.run() 
+# Every rerun is timed; pages mark their stages with perf_log.stage.
+with perf_log.run(pg.title, get_perf_log()):
+    pg.run()
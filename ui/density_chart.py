@@ -0,0 +1,106 @@
+import time
+
+import numpy as np
+import plotly.express as px
+import plotly.graph_objects as go
+import streamlit as st
+
+from scripts import density
+from scripts.perf_log import timed
+
+ANCHORS = 16
+
+
+def _view_key(key):
+    return f"{key}_view"
+
+
+def _anchors(view):
+    # Invisible points across the view: Plotly only reports a box selection when a trace can be selected.
+    x0, x1, y0, y1 = view
+    gx, gy = np.meshgrid(np.linspace(x0, x1, ANCHORS), np.linspace(y0, y1, ANCHORS))
+    return go.Scatter(x=gx.ravel(), y=gy.ravel(), mode="markers", marker=dict(opacity=0), hoverinfo="skip",
+                      showlegend=False)
+
+
+# The full view is what every session sees first: bin it once per store version and sidecars, not per rerun.
+@st.cache_resource(max_entries=4, show_spinner=False)
+def _full_grid(_store, version, sidecars, x, y, group, values):
+    xs, ys = _store.column(x).to_numpy(), _store.column(y).to_numpy()
+    codes = density.group_codes(_store.column(group).to_numpy(), list(values))
+    full = density.extent(xs, ys)
+    return full, density.bin_points(xs, ys, codes, len(values), full)
+
+
+@timed("density figure")
+def density_chart(store, x, y, group, labels, colors, key, values=None, hover=(), title=None, height=500):
+    """
+    Scatter of `x` vs `y` for every track, coloured by `group`, drawn as a server-side density image.
+
+    `labels` name the `values` of `group` (0..len(labels)-1 by default); tracks
+    with other values or nulls are left out. `colors` are cycled as needed.
+
+    Box-select an area (or use the sliders) to zoom: only the points in view
+    are re-binned, and below RAW_POINT_LIMIT the raw points are drawn with
+    `hover` columns instead.
+    """
+    values = tuple(range(len(labels)) if values is None else values)
+    colors = density.palette(colors, len(labels))
+    sidecars = tuple((name, info["written_at"]) for name, info in store.sidecars.items())
+    full, full_grid = _full_grid(store, store.version, sidecars, x, y, group, values)
+    view = st.session_state.get(_view_key(key), full)
+
+    with st.expander("🔍 Viewport", expanded=False):
+        col1, col2 = st.columns(2)
+        x_range = col1.slider(x, full[0], full[1], (view[0], view[1]), key=f"{key}_x")
+        y_range = col2.slider(y, full[2], full[3], (view[2], view[3]), key=f"{key}_y")
+        if st.button("Reset zoom", key=f"{key}_reset"):
+            for suffix in ("_view", "_x", "_y"):
+                st.session_state.pop(key + suffix, None)
+            st.rerun()
+    view = (*x_range, *y_range)
+
+    start = time.perf_counter()
+    if view == full:
+        mask, in_view = None, int(full_grid.counts.sum())
+    else:
+        xs, ys = store.column(x).to_numpy(), store.column(y).to_numpy()
+        mask = density.in_view(xs, ys, view)
+        in_view = int(mask.sum())
+    if in_view <= density.RAW_POINT_LIMIT:
+        df = store.frame([x, y, group, *hover])
+        df = df[mask] if mask is not None else df
+        df = df.assign(**{group: df[group].map(dict(zip(values, labels)))}).dropna(subset=[group])
+        fig = px.scatter(df, x=x, y=y, color=group, hover_data=list(hover), title=title,
+                         color_discrete_map=dict(zip(labels, colors)))
+        mode = "raw points"
+    else:
+        if mask is None:
+            grid = full_grid
+        else:
+            codes = density.group_codes(store.column(group).to_numpy()[mask], list(values))
+            grid = density.bin_points(xs[mask], ys[mask], codes, len(labels), view)
+        fig = density.density_figure(grid, labels, colors, title=title)
+        fig.update_xaxes(title=x)
+        fig.update_yaxes(title=y)
+        mode = f"{grid.counts.shape[2]}×{grid.counts.shape[1]} density grid"
+    fig.add_trace(_anchors(view))
+    fig.update_layout(template="plotly_dark", height=height, dragmode="select")
+    build_ms = (time.perf_counter() - start) * 1000
+
+    event = st.plotly_chart(fig, use_container_width=True, on_select="rerun", selection_mode="box", key=f"{key}_chart")
+    st.caption(f"{in_view:,} tracks in view · {mode} · built in {build_ms:.0f} ms · box-select to zoom")
+
+    boxes = event.selection.box if event and event.selection else []
+    if boxes:
+        box = boxes[0]
+        new_view = (min(box["x"]), max(box["x"]), min(box["y"]), max(box["y"]))
+        # Clamp to the data range so the sliders stay valid.
+        new_view = (max(new_view[0], full[0]), min(new_view[1], full[1]),
+                    max(new_view[2], full[2]), min(new_view[3], full[3]))
+        if new_view != view and new_view[0] < new_view[1] and new_view[2] < new_view[3]:
+            st.session_state[_view_key(key)] = new_view
+            st.session_state.pop(f"{key}_x", None)
+            st.session_state.pop(f"{key}_y", None)
+            st.session_state.pop(f"{key}_chart", None)
+            st.rerun()
@@ -0,0 +1,57 @@
+import functools
+import math
+import time
+
+import streamlit as st
+
+from scripts import exports
+
+PAGE_SIZE = 1000
+
+
+def paged_table(query, columns, key, page_size=PAGE_SIZE):
+    """
+    One page of a backend result, with sort and page controls.
+
+    `query(offset, limit, sort, descending)` returns (count, frame); sorting
+    and slicing happen in the backend, so only `page_size` rows reach the page.
+    Returns (count, query ms).
+    """
+    col1, col2, col3 = st.columns([0.45, 0.3, 0.25])
+    sort = col1.selectbox("Sort by", ["(row order)"] + list(columns), key=f"{key}_sort")
+    sort = None if sort == "(row order)" else sort
+    descending = col2.radio("Order", ["Ascending", "Descending"], horizontal=True, key=f"{key}_order",
+                            disabled=sort is None) == "Descending"
+    page = col3.number_input("Page", min_value=1, value=1, step=1, key=f"{key}_page")
+
+    start = time.perf_counter()
+    count, rows = query((page - 1) * page_size, page_size, sort, descending)
+    if rows.empty and count:
+        # Filters narrowed the result below the current page: show the last one.
+        page = math.ceil(count / page_size)
+        count, rows = query((page - 1) * page_size, page_size, sort, descending)
+    query_ms = (time.perf_counter() - start) * 1000
+
+    first = (page - 1) * page_size
+    st.dataframe(rows, use_container_width=True)
+    st.caption(f"Rows {first + 1 if count else 0:,}–{first + len(rows):,} of {count:,} · "
+               f"page {page} of {max(math.ceil(count / page_size), 1):,}")
+    return count, query_ms
+
+
+def export_buttons(batches, file_stem, key):
+    """
+    Download buttons for every export format.
+
+    `batches()` returns an iterable of Arrow record batches or tables. It is
+    only called when a button is clicked; page reruns serialize nothing.
+    """
+    for col, (fmt, (label, mime)) in zip(st.columns(len(exports.FORMATS)), exports.FORMATS.items()):
+        col.download_button(
+            f"⬇️ {label}",
+            functools.partial(lambda fmt: exports.export_file(batches(), fmt), fmt),
+            f"{file_stem}.{fmt}",
+            mime=mime,
+            on_click="ignore",
+            key=f"{key}_{fmt}",
+        )
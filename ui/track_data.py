@@ -0,0 +1,133 @@
+import os
+import sys
+
+import streamlit as st
+
+PROJECT_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
+if PROJECT_ROOT not in sys.path:
+    sys.path.insert(0, PROJECT_ROOT)
+
+from scripts import (  # noqa: E402
+    batch_scoring, data_service, perf_log, query_backend, result_cache, rollups, similarity, startup, track_store,
+)
+
+
+# st.cache_resource hands every session the same object (no pickling or copies),
+# so all pages and sessions share one memory-mapped store per process.
+# Rewriting a sidecar (e.g. re-scoring) changes `sidecars` and reopens the store.
+# When `scripts.data_service` runs on the host, every process attaches to its
+# shared segment instead, so replicas share the pandas columns too.
+@st.cache_resource(max_entries=1, show_spinner="Opening track store...")
+def _open_store(version, sidecars):
+    return data_service.attach() or track_store.TrackStore()
+
+
+def _current_key():
+    """(version, sidecars) of the store on disk; FileNotFoundError until it is built."""
+    version = track_store.data_version()
+    sidecars = tuple((name, info["written_at"]) for name, info in track_store.sidecars().items())
+    return version, sidecars
+
+
+def _store_key():
+    try:
+        return _current_key()
+    except FileNotFoundError:
+        st.error("Track store not found. Build it with `python -m scripts.csv_to_parquet`.")
+        st.stop()
+
+
+def get_store():
+    return _open_store(*_store_key())
+
+
+@st.cache_resource(show_spinner=False)
+def get_result_cache():
+    """Query results shared by every session; backends of a new store version invalidate it."""
+    return result_cache.ResultCache()
+
+
+@st.cache_resource(max_entries=len(query_backend.BACKENDS), show_spinner=False)
+def _open_backend(name, version, sidecars):
+    return query_backend.open_backend(name, _open_store(version, sidecars), get_result_cache())
+
+
+def get_backend():
+    """Query backend chosen in the sidebar (defaults to SIL_QUERY_BACKEND) for A/B timing."""
+    name = st.sidebar.selectbox(
+        "🗄️ Query backend",
+        query_backend.BACKENDS,
+        index=query_backend.BACKENDS.index(query_backend.DEFAULT_BACKEND),
+        key="query_backend",
+    )
+    return _open_backend(name, *_store_key())
+
+
+# Keyed on the sidecars too: re-clustering makes the index's frozen cluster labels stale.
+@st.cache_resource(max_entries=1, show_spinner=False)
+def _open_similarity(version, sidecars, built_at):
+    return similarity.SimilarityIndex.open()
+
+
+def get_similarity_index():
+    """The memory-mapped similar-tracks index, or None until `python -m scripts.similarity` builds it."""
+    return _open_similarity(*_store_key(), similarity.built_at())
+
+
+# Keyed on the file's mtime, so a retrained model is picked up without a restart.
+@st.cache_resource(max_entries=1, show_spinner="Loading model...")
+def _load_model(path, modified):
+    return batch_scoring.load_model(path)
+
+
+def get_model():
+    path = batch_scoring.default_model_path()
+    return _load_model(path, os.path.getmtime(path))
+
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def _model_sha256(path, modified):
+    return track_store.file_sha256(path)
+
+
+def get_model_sha256():
+    """Hash of the model file `get_model` loads; precomputed scores are only valid for the same hash."""
+    path = batch_scoring.default_model_path()
+    return _model_sha256(path, os.path.getmtime(path))
+
+
+@st.cache_data(max_entries=1, show_spinner=False)
+def _load_rollups(version):
+    return rollups.load_rollups()
+
+
+def get_rollups():
+    version, _ = _store_key()
+    return _load_rollups(version)
+
+
+@st.cache_resource(show_spinner=False)
+def get_perf_log():
+    """The process-wide rerun timing log written by `app.py` and read by the Performance page."""
+    return perf_log.PerfLog()
+
+
+def _warm_backend():
+    version, sidecars = _current_key()
+    _open_backend(query_backend.DEFAULT_BACKEND, version, sidecars).warm()
+
+
+@st.cache_resource(show_spinner=False)
+def warm_up():
+    """
+    Started once per server process by `app.py`: imports the heavy modules and
+    fills the caches above on a background thread while the first page renders.
+    """
+    return startup.WarmUp([
+        ("imports", startup.preload()),
+        ("track store", lambda: _open_store(*_current_key())),
+        ("query backend", _warm_backend),
+        ("rollups", lambda: _load_rollups(_current_key()[0])),
+        ("promotion model", get_model),
+        ("similar-tracks index", lambda: _open_similarity(*_current_key(), similarity.built_at())),
+    ]).start()